@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+ARTIFACT_DIR = os.getenv('CARPOOL_ARTIFACT_DIR', 'artifacts')
+MEMORY_ITEMS = 32   # recently stored artifacts kept in memory, so reruns never wait on disk
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='artifact-writer')
+_lock = threading.Lock()
+_pending = {}
+_memory = OrderedDict()
+
+#*********************************** Key Functions ***************************************
+def content_key(*parts) -> str:
+    """Stable sha256 key over JSON-serializable parts (tuples and lists hash the same)."""
+    canonical = json.dumps(parts, sort_keys=True, default=list, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def plan_key(direction: str, locations, assignments, driver_paths, mode: str) -> str:
+    """Key for a rendered plan map; identical plans map to the same artifact."""
+    return content_key('map', direction, locations, assignments, driver_paths, mode)
+
+def artifact_path(key: str, kind: str, suffix: str) -> str:
+    """Location of an artifact on disk, sharded by key prefix."""
+    return os.path.join(ARTIFACT_DIR, kind, key[:2], f"{key}{suffix}")
+
+#*********************************** Store Functions ***************************************
+def _remember(key: str, data: bytes) -> None:
+    with _lock:
+        _memory[key] = data
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_ITEMS:
+            _memory.popitem(last=False)
+
+def _write(key: str, path: str, data) -> None:
+    if callable(data):
+        data = data()
+    _remember(key, data)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def save_async(key: str, data: bytes, kind: str, suffix: str):
+    """Store an artifact in the background; returns the write future, or None if it is already stored.
+
+    data may be the bytes or a callable producing them, so expensive serialization runs on the writer
+    thread too and is skipped entirely when the artifact is already stored or being written.
+    """
+    path = artifact_path(key, kind, suffix)
+    with _lock:
+        if path in _pending:
+            return _pending[path]
+        if os.path.exists(path):
+            return None
+        future = _executor.submit(_write, key, path, data)
+        _pending[path] = future
+
+    def done(_):
+        with _lock:
+            _pending.pop(path, None)
+    future.add_done_callback(done)
+    return future
+
+def load(key: str, kind: str, suffix: str) -> bytes:
+    """Fetch an artifact from memory or disk, or None when it was never stored; waits for an in-flight write."""
+    path = artifact_path(key, kind, suffix)
+    with _lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+        pending = _pending.get(path)
+    if pending is not None:
+        pending.result()
+        with _lock:
+            if key in _memory:
+                return _memory[key]
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        data = f.read()
+    _remember(key, data)
+    return data
+
+#*********************************** Map Functions ***************************************
+def save_map(mymap, key: str):
+    """Render a folium map to HTML and persist it under the plan key, both on the writer thread.
+
+    Call it after the map has been displayed: the render then never competes with the page's own.
+    """
+    return save_async(key, lambda: mymap.get_root().render().encode('utf-8'), 'maps', '.html')
+
+def load_map_html(key: str) -> str:
+    """Previously stored map HTML for a plan key, or None."""
+    data = load(key, 'maps', '.html')
+    return data.decode('utf-8') if data is not None else None
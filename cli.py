@@ -0,0 +1,103 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+
+import hubs
+import planner
+import profiling
+import replay
+import roster
+import run_store
+import streaming
+import trip_eval
+import to_home_google_api
+import to_office_google_api
+
+def main():
+    """Stream a carpool plan for a JSON roster to stdout as JSON lines, one event per line."""
+    parser = argparse.ArgumentParser(description="Run the carpooling algorithm on a roster file.")
+    parser.add_argument('roster', help="JSON file with 'locations' (same layout as helper), 'capacity' and optional 'constraints' and 'weights', or a CSV/Excel roster (see roster.py).")
+    parser.add_argument('--office', help="Office address, required for CSV/Excel rosters.")
+    parser.add_argument('--direction', choices=['to_home', 'to_office'], default='to_home')
+    parser.add_argument('--clusters', type=int, default=1, help="Geographic clusters per office (uses the planner).")
+    parser.add_argument('--workers', type=int, default=None, help="Planner process pool size.")
+    parser.add_argument('--optimize', type=float, default=0.0, help="Seconds of local search after the greedy to_home plan.")
+    parser.add_argument('--trip-times', action='store_true', help="Evaluate each driver's full trip with one waypoint request.")
+    parser.add_argument('--weights', type=json.loads, default=None, help='Matcher objective weights as JSON, e.g. \'{"walk": 1, "balance": 0.5}\' (see scoring.py).')
+    parser.add_argument('--hubs', action='store_true', help="Use precomputed meeting-point hubs (see hubs.py) for single-office solves.")
+    parser.add_argument('--save-run', action='store_true', help="Persist every finished plan to the run store.")
+    parser.add_argument('--profile', action='store_true', help="Write CPU samples, per-stage wall/CPU time and allocation stats under profiles/<run id>.")
+    parser.add_argument('--record', metavar='ARCHIVE', help="Capture every map API request and response of this run to a gzip archive.")
+    parser.add_argument('--replay', metavar='ARCHIVE', help="Serve map API calls from a recorded archive instead of the network.")
+    parser.add_argument('--replay-latency', choices=['original', 'zero'], default=replay.REPLAY_LATENCY, help="Replay with the recorded latencies or none.")
+    args = parser.parse_args()
+    if args.record and args.replay:
+        parser.error("--record and --replay are mutually exclusive")
+    if args.record:
+        replay.start_recording(args.record)
+    elif args.replay:
+        replay.start_replay(args.replay, args.replay_latency)
+    try:
+        run(args, parser)
+    finally:
+        archive = replay.stop()
+        if archive:
+            sys.stderr.write(f"Recorded API calls to {archive}\n")
+
+def run(args, parser):
+    """Load the roster, solve it and write the event stream."""
+    if os.path.splitext(args.roster)[1].lower() in ('.csv', '.xlsx', '.xls'):
+        if not args.office:
+            parser.error("--office is required for CSV/Excel rosters")
+        table = roster.ingest(args.roster)
+        sys.stderr.write(json.dumps(roster.summary(table)) + '\n')
+        locations, capacity = roster.to_locations(table, args.office)
+        lat_lons = roster.lat_lons(table)
+        constraints = None
+        roster_weights = None
+    else:
+        with open(args.roster) as f:
+            roster_file = json.load(f)
+        locations = roster_file['locations']
+        capacity = roster_file.get('capacity', {})
+        lat_lons = None
+        constraints = roster_file.get('constraints')
+        roster_weights = roster_file.get('weights')
+
+    if 'offices' in locations or args.clusters > 1:
+        events = planner.plan_stream(locations, capacity, args.direction, args.clusters, args.workers, constraints, lat_lons)
+    elif args.direction == 'to_home':
+        events = to_home_google_api.helper_stream(
+            locations, capacity, constraints, args.optimize, hubs.load_hubs() if args.hubs else None, args.weights or roster_weights, lat_lons
+        )
+    else:
+        events = to_office_google_api.helper_stream(locations, constraints, lat_lons, None, hubs.load_hubs() if args.hubs else None)
+
+    if args.trip_times and not ('offices' in locations or args.clusters > 1):
+        events = trip_eval.with_trip_times(args.direction, events)
+    run_id = run_store.new_run_id()
+    if args.profile:
+        events = profiling.profile_stream(events, run_id)
+
+    # The pipeline prints request errors; send them to stderr and keep stdout for events only
+    out = sys.stdout
+    saved = 0
+    with contextlib.redirect_stdout(sys.stderr):
+        for event in events:
+            if event['type'] == 'done' and args.save_run:
+                # The planner closes every office with its own done event; each is saved as its own run,
+                # the first under the id the profile shares
+                office_capacity = {driver: capacity.get(driver, 0) for driver in event['locations']['drivers']}
+                event['run_id'] = run_store.save_run(
+                    args.direction, event['locations'], office_capacity, event['assignments'], event['driver_paths'],
+                    event.get('road_distances'), event.get('companion_lat_lons'), event.get('timings'),
+                    run_id if saved == 0 else run_store.new_run_id()
+                )
+                saved += 1
+            out.write(streaming.event_to_json(event) + '\n')
+            out.flush()
+
+if __name__ == "__main__":
+    main()
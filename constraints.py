@@ -0,0 +1,104 @@
+import re
+from typing import Dict, List, Tuple
+
+import pruning
+
+AVG_DRIVING_KMPH = 25.0    # average city driving speed used to estimate when a driver reaches a path point
+MAX_ACCESS_KMPH = 40.0     # no companion reaches a meeting point faster than this, whatever the mode
+STOP_DWELL_MIN = 1.0       # minutes a driver loses per pickup or drop-off
+
+DEFAULTS = {
+    'earliest': None,         # rider: earliest meeting time (minutes after midnight or 'HH:MM')
+    'latest': None,           # rider: latest meeting time
+    'max_walk_km': None,      # rider: longest trip from home to the meeting point
+    'departure': None,        # driver: departure time from the start of the path
+    'max_detour_min': 6.0,    # driver: minutes lost to stops and waiting (dwell + the old 5 minute buffer)
+}
+
+#*********************************** Parsing Functions ***************************************
+def parse_time(value) -> float:
+    """Minutes after midnight from 'HH:MM' or a number, None stays None."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+def parse_duration_minutes(text) -> float:
+    """Minutes in a Directions duration text such as '1 hour 5 mins'; None for anything unparseable."""
+    if not isinstance(text, str):
+        return None
+    minutes = 0.0
+    found = False
+    for amount, unit in re.findall(r'(\d+(?:\.\d+)?)\s*(day|hour|min)', text):
+        found = True
+        minutes += float(amount) * {'day': 1440, 'hour': 60, 'min': 1}[unit]
+    return minutes if found else None
+
+#*********************************** Limit Functions ***************************************
+def limits_for(constraints: Dict, group: str, name: str) -> Dict:
+    """Effective limits for one rider ('riders') or driver ('drivers'), falling back to the defaults."""
+    merged = {**DEFAULTS, **(constraints or {}).get('defaults', {}), **(constraints or {}).get(group, {}).get(name, {})}
+    for key in ('earliest', 'latest', 'departure'):
+        merged[key] = parse_time(merged[key])
+    return merged
+
+def path_etas(path: List[Tuple[float, float]]) -> List[float]:
+    """Minutes after departure at which the driver passes each point of the path."""
+    return [km / AVG_DRIVING_KMPH * 60 for km in pruning.cumulative_km(path)]
+
+def max_wait_min(driver: Dict) -> float:
+    """Minutes a driver will wait at a pickup: the detour budget less the stop itself."""
+    return driver['max_detour_min'] - STOP_DWELL_MIN
+
+def within_window(minutes_after_departure: float, driver: Dict, rider: Dict) -> bool:
+    """Whether a meeting at that point of the driver's trip falls inside the rider's time window."""
+    if driver['departure'] is None:
+        return True
+    meeting = driver['departure'] + minutes_after_departure
+    if rider['earliest'] is not None and meeting < rider['earliest']:
+        return False
+    if rider['latest'] is not None and meeting > rider['latest']:
+        return False
+    return True
+
+#*********************************** Solver Functions ***************************************
+def filter_candidates(
+    aerial_distances: Dict[Tuple[str, str, Tuple[float, float]], List[Tuple[Tuple[float, float], float]]],
+    driver_paths: Dict[str, List[Tuple[float, float]]],
+    constraints: Dict
+) -> Dict[Tuple[str, str, Tuple[float, float]], List[Tuple[Tuple[float, float], float]]]:
+    """Drop candidate meeting nodes that break a walk limit or time window, using only precomputed values.
+
+    The aerial distance is a lower bound on the real trip, so a node whose aerial distance already
+    exceeds max_walk_km can be rejected without a routing call. Pairs left with no node are dropped.
+    """
+    if not constraints:
+        return aerial_distances
+
+    etas = {}
+    filtered = {}
+    for (driver_label, companion_name, companion_lat_lon), top_nodes in aerial_distances.items():
+        driver = limits_for(constraints, 'drivers', driver_label)
+        rider = limits_for(constraints, 'riders', companion_name)
+        if driver_label not in etas:
+            path = driver_paths[driver_label]
+            etas[driver_label] = dict(zip(path, path_etas(path)))
+
+        feasible = [
+            (lat_lon, distance) for lat_lon, distance in top_nodes
+            if (rider['max_walk_km'] is None or distance <= rider['max_walk_km'])
+            and within_window(etas[driver_label][lat_lon], driver, rider)
+        ]
+        if feasible:
+            filtered[(driver_label, companion_name, companion_lat_lon)] = feasible
+    return filtered
+
+def fits(constraints: Dict, driver_label: str, companion_name: str, road_distance, used_detour: float, pair_detour: float = STOP_DWELL_MIN) -> bool:
+    """Whether seating a companion keeps the real trip distance and the driver's total detour within limits."""
+    if not constraints:
+        return True
+    rider = limits_for(constraints, 'riders', companion_name)
+    driver = limits_for(constraints, 'drivers', driver_label)
+    if rider['max_walk_km'] is not None and (not isinstance(road_distance, (int, float)) or road_distance > rider['max_walk_km']):
+        return False
+    return used_detour + pair_detour <= driver['max_detour_min']
@@ -0,0 +1,147 @@
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+import constraints as constraints_mod
+
+CANDIDATE_SLOTS = 5   # candidate meeting nodes stored per entry (pruning.route_candidates keeps five)
+
+#*********************************** Build Functions ***************************************
+def is_matrix(costs) -> bool:
+    """Whether costs is already a cost matrix rather than a {(driver, companion): (distance, duration, node)} dict."""
+    return isinstance(costs, dict) and 'indptr' in costs
+
+def build(road_distances: Dict[Tuple[str, str], Tuple], drivers: List[str] = None, companions: List[str] = None) -> Dict:
+    """Integer-indexed CSR cost matrix over the scored (pruned) driver-companion pairs.
+
+    Rows are drivers and columns companions; each stored entry has typed columns distance_km,
+    duration_min, feasible, node_lat and node_lon, plus duration_text for display. Unreachable or
+    failed pairs keep their entry with distance inf and feasible False. Pairs whose driver or
+    companion is not in the given label lists are left out.
+    """
+    drivers = list(drivers) if drivers is not None else sorted({driver for driver, _ in road_distances})
+    companions = list(companions) if companions is not None else sorted({companion for _, companion in road_distances})
+    driver_index = {driver: i for i, driver in enumerate(drivers)}
+    companion_index = {companion: i for i, companion in enumerate(companions)}
+
+    rows = sorted(
+        (driver_index[driver], companion_index[companion], cost)
+        for (driver, companion), cost in road_distances.items()
+        if driver in driver_index and companion in companion_index
+    )
+    row = np.fromiter((r for r, _, _ in rows), dtype=np.int32, count=len(rows))
+    indptr = np.zeros(len(drivers) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row, minlength=len(drivers)), out=indptr[1:])
+
+    distance = np.full(len(rows), np.inf)
+    duration = np.full(len(rows), np.nan)
+    node_lat = np.full(len(rows), np.nan)
+    node_lon = np.full(len(rows), np.nan)
+    duration_text = []
+    for i, (_, _, (dist, text, node)) in enumerate(rows):
+        if isinstance(dist, (int, float)) and not isinstance(dist, bool):
+            distance[i] = dist
+        minutes = constraints_mod.parse_duration_minutes(text)
+        if minutes is not None:
+            duration[i] = minutes
+        if node is not None:
+            node_lat[i], node_lon[i] = node
+        duration_text.append(text if isinstance(text, str) else None)
+
+    return {
+        'drivers': drivers,
+        'companions': companions,
+        'driver_index': driver_index,
+        'companion_index': companion_index,
+        'indptr': indptr,
+        'indices': np.fromiter((c for _, c, _ in rows), dtype=np.int32, count=len(rows)),
+        'rows': row,
+        'distance_km': distance,
+        'duration_min': duration,
+        'duration_text': duration_text,
+        'node_lat': node_lat,
+        'node_lon': node_lon,
+        'feasible': np.isfinite(distance) & ~np.isnan(node_lat),
+    }
+
+def from_candidates(
+    aerial_distances: Dict[Tuple[str, str, Tuple[float, float]], List[Tuple[Tuple[float, float], float]]],
+    drivers: List[str] = None,
+    companions: List[str] = None
+) -> Dict:
+    """Cost matrix over the candidate pairs, built once at the candidate stage before any meeting point is scored.
+
+    Entries start unscored (distance inf, not feasible). Each entry's candidate nodes are stored as
+    (entries, slots) columns cand_lat, cand_lon and cand_km (aerial km), NaN-padded; the meeting-point
+    stage reads them by position (see candidates) and writes its result back with set_entry.
+    """
+    matrix = build({(driver, companion): (None, None, None) for driver, companion, _ in aerial_distances}, drivers, companions)
+    slots = max([CANDIDATE_SLOTS] + [len(nodes) for nodes in aerial_distances.values()])
+    columns = np.full((len(matrix['indices']), slots, 3), np.nan)
+    for (driver, companion, _), nodes in aerial_distances.items():
+        position = entry(matrix, driver, companion)
+        if position >= 0 and nodes:
+            columns[position, :len(nodes)] = [(lat_lon[0], lat_lon[1], km) for lat_lon, km in nodes]
+    matrix['cand_lat'], matrix['cand_lon'], matrix['cand_km'] = columns[:, :, 0], columns[:, :, 1], columns[:, :, 2]
+    return matrix
+
+def set_entry(matrix: Dict, position: int, distance, duration_text, node) -> None:
+    """Store a scored (distance_km, duration_text, node) triple in an entry, the way build stores it."""
+    numeric = isinstance(distance, (int, float)) and not isinstance(distance, bool)
+    minutes = constraints_mod.parse_duration_minutes(duration_text)
+    matrix['distance_km'][position] = distance if numeric else np.inf
+    matrix['duration_min'][position] = np.nan if minutes is None else minutes
+    matrix['duration_text'][position] = duration_text if isinstance(duration_text, str) else None
+    matrix['node_lat'][position], matrix['node_lon'][position] = node if node is not None else (np.nan, np.nan)
+    matrix['feasible'][position] = np.isfinite(matrix['distance_km'][position]) and node is not None
+
+def ensure(costs) -> Dict:
+    """Accept either a cost matrix or a road-distances dict and return a cost matrix."""
+    return costs if is_matrix(costs) else build(costs)
+
+#*********************************** Lookup Functions ***************************************
+def entry(matrix: Dict, driver: str, companion: str) -> int:
+    """Position of a pair in the entry columns, or -1 when the pair was pruned."""
+    row = matrix['driver_index'].get(driver)
+    column = matrix['companion_index'].get(companion)
+    if row is None or column is None:
+        return -1
+    start, end = matrix['indptr'][row], matrix['indptr'][row + 1]
+    position = start + np.searchsorted(matrix['indices'][start:end], column)
+    return int(position) if position < end and matrix['indices'][position] == column else -1
+
+def node(matrix: Dict, position: int):
+    """Meeting node of an entry as a (lat, lon) tuple, or None."""
+    if np.isnan(matrix['node_lat'][position]):
+        return None
+    return (float(matrix['node_lat'][position]), float(matrix['node_lon'][position]))
+
+def candidates(matrix: Dict, position: int) -> List[Tuple[Tuple[float, float], float]]:
+    """An entry's candidate meeting nodes as ((lat, lon), aerial km), in the order the candidate stage stored them."""
+    kept = ~np.isnan(matrix['cand_km'][position])
+    return [
+        ((lat, lon), km)
+        for lat, lon, km in zip(matrix['cand_lat'][position][kept].tolist(), matrix['cand_lon'][position][kept].tolist(), matrix['cand_km'][position][kept].tolist())
+    ]
+
+def pair(matrix: Dict, position: int) -> Tuple[str, str]:
+    return matrix['drivers'][matrix['rows'][position]], matrix['companions'][matrix['indices'][position]]
+
+def lookup(matrix: Dict, driver: str, companion: str):
+    """(distance_km, duration_text, node) for a pair, the same triple road_distances holds, or None."""
+    position = entry(matrix, driver, companion)
+    if position < 0:
+        return None
+    return (float(matrix['distance_km'][position]), matrix['duration_text'][position], node(matrix, position))
+
+def items(matrix: Dict) -> Iterator[Tuple[Tuple[str, str], Tuple]]:
+    """Iterate entries as ((driver, companion), (distance_km, duration_text, node)) in row order."""
+    for position in range(len(matrix['indices'])):
+        yield pair(matrix, position), (float(matrix['distance_km'][position]), matrix['duration_text'][position], node(matrix, position))
+
+def to_road_distances(matrix: Dict) -> Dict[Tuple[str, str], Tuple]:
+    return dict(items(matrix))
+
+def by_distance(matrix: Dict) -> np.ndarray:
+    """Entry positions ordered by distance (stable, so ties keep row order)."""
+    return np.argsort(matrix['distance_km'], kind='stable')
@@ -0,0 +1,147 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import replay
+
+try:  # HTTP/2 needs httpx with the h2 extra; without it the pooled requests session is used
+    import h2  # noqa: F401
+    import httpx
+except ImportError:
+    httpx = None
+
+CONNECT_TIMEOUT = float(os.getenv('CARPOOL_HTTP_CONNECT_TIMEOUT', '3.05'))
+READ_TIMEOUT = float(os.getenv('CARPOOL_HTTP_READ_TIMEOUT', '10'))
+POOL_SIZE = int(os.getenv('CARPOOL_HTTP_POOL_SIZE', '32'))   # keep-alive connections per host
+RETRIES = 2                                                  # retries on connection errors, 429 and 5xx
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+BACKOFF_FACTOR = 0.3                                         # seconds before the first status retry, doubling after
+HEADERS = {'Accept-Encoding': 'gzip, deflate', 'User-Agent': 'carpoolAlgoApp (gzip)'}
+
+_lock = threading.Lock()
+_local = threading.local()
+_client = None
+_calls = 0
+_scope = contextvars.ContextVar('carpool_call_scope', default=None)
+_cancel = contextvars.ContextVar('carpool_cancel', default=None)
+
+class Cancelled(Exception):
+    """Raised by API calls made after the enclosing cancellable() scope's event was set."""
+
+#*********************************** Client Functions ***************************************
+def _build_client():
+    if httpx is not None:
+        transport = httpx.HTTPTransport(http2=True, retries=RETRIES, limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE))
+        return httpx.Client(transport=transport, headers=HEADERS, timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT))
+    session = requests.Session()
+    retry = Retry(total=RETRIES, backoff_factor=BACKOFF_FACTOR, status_forcelist=RETRY_STATUSES, allowed_methods=('GET',), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(HEADERS)
+    return session
+
+def client():
+    """The process-wide pooled HTTP client (created on first use, shared by every thread)."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
+
+def _count() -> None:
+    global _calls
+    scope = _scope.get()
+    with _lock:
+        _calls += 1
+        if scope is not None:
+            scope[0] += 1
+    _local.calls = getattr(_local, 'calls', 0) + 1
+
+def call_count() -> int:
+    """API calls made by this process so far."""
+    return _calls
+
+def thread_call_count() -> int:
+    """API calls made by the current thread so far."""
+    return getattr(_local, 'calls', 0)
+
+@contextmanager
+def counting():
+    """Count API calls made inside the block, including from pool threads started through submit(); yields a one-item list."""
+    calls = [0]
+    token = _scope.set(calls)
+    try:
+        yield calls
+    finally:
+        _scope.reset(token)
+
+@contextmanager
+def cancellable(event):
+    """Make API calls inside the block, including from pool threads started through submit(), raise Cancelled once event is set."""
+    token = _cancel.set(event)
+    try:
+        yield event
+    finally:
+        _cancel.reset(token)
+
+def check_cancelled() -> None:
+    """Raise Cancelled if the current cancellable() scope was cancelled; long loops call this between steps."""
+    event = _cancel.get()
+    if event is not None and event.is_set():
+        raise Cancelled()
+
+def submit(executor, fn: Callable, *args, **kwargs):
+    """executor.submit that carries the caller's call-counting and cancellation scopes into the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+#*********************************** Request Functions ***************************************
+def get_json(url: str, params: Dict = None, timeout: float = None) -> Dict:
+    """GET a JSON API over the shared pool.
+
+    Failures surface as requests exceptions whatever the transport: Timeout, ConnectionError,
+    HTTPError for non-2xx responses (after retrying 429 and 5xx), or InvalidJSONError for a body
+    that is not JSON. API-level statuses in the body ('ZERO_RESULTS', ...) are left
+    to the caller. In record or replay mode (see replay.py) the call is captured or served from an archive.
+    Inside a cancelled cancellable() scope the call raises Cancelled without being made.
+    """
+    check_cancelled()
+    _count()
+    return replay.intercept(url, params, lambda: _fetch(url, params, timeout))
+
+def _parse(response, url: str) -> Dict:
+    try:
+        return response.json()
+    except ValueError as exc:
+        raise requests.exceptions.InvalidJSONError(f"Invalid JSON from {url}: {exc}") from exc
+
+def _fetch(url: str, params: Dict = None, timeout: float = None) -> Dict:
+    timeout = (CONNECT_TIMEOUT, timeout or READ_TIMEOUT)
+    if httpx is not None:
+        # httpx's transport retries only failed connections; 429 and 5xx are retried here with backoff
+        try:
+            for attempt in range(RETRIES + 1):
+                response = client().get(url, params=params, timeout=httpx.Timeout(timeout[1], connect=timeout[0]))
+                if response.status_code not in RETRY_STATUSES or attempt == RETRIES:
+                    break
+                time.sleep(BACKOFF_FACTOR * 2 ** attempt)
+            response.raise_for_status()
+        except httpx.TimeoutException as exc:
+            raise requests.exceptions.Timeout(f"{url}: {exc}") from exc
+        except httpx.HTTPStatusError as exc:
+            raise requests.exceptions.HTTPError(f"{exc.response.status_code} for {url}") from exc
+        except httpx.TransportError as exc:
+            raise requests.exceptions.ConnectionError(f"{url}: {exc}") from exc
+        return _parse(response, url)
+
+    response = client().get(url, params=params, timeout=timeout)
+    response.raise_for_status()
+    return _parse(response, url)
@@ -0,0 +1,245 @@
+import argparse
+import math
+import os
+from collections import Counter
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+import constraints as constraints_mod
+import pruning
+import road_graph
+import run_store
+
+HUB_PATH = os.getenv('CARPOOL_HUB_PATH', os.path.join('artifacts', 'hubs.npz'))
+HUB_RADIUS_KM = 0.3          # meeting points closer than this merge into one hub
+MIN_SUPPORT = 2              # past meetings (or passing routes) a hub needs to be kept
+WALK_CATCHMENT_MIN = 12.0    # riders who can walk to a hub within this many minutes use it
+HUB_ON_PATH_KM = 0.15        # a driver serves a hub when their path passes this close
+SYNTHETIC_SPACING_KM = 0.5   # spacing of synthetic candidates along stored routes
+ROAD_FACTOR = 1.3            # road distance over aerial distance when no road graph is available
+KM_PER_DEG = 6371 * math.pi / 180   # great-circle km per degree of latitude, the scale aerial_km measures in
+CELL_MARGIN = 1.05                  # grid cells slightly larger than the widest catchment, so no in-range hub falls outside the 3x3 search
+
+#*********************************** Mining Functions ***************************************
+def past_meeting_points(direction: str = None) -> Counter:
+    """How often each meeting point was used across the stored runs."""
+    counts = Counter()
+    for run in run_store.list_runs(direction):
+        for pairs in run_store.load_run(run['run_id'])['assignments'].values():
+            counts.update(tuple(node) for _, node in pairs if node is not None)
+    return counts
+
+def synthetic_demand(driver_paths: Dict[str, List[Tuple[float, float]]]) -> Counter:
+    """Demand model without history: points every SYNTHETIC_SPACING_KM along each route, weighted by how many routes pass."""
+    counts = Counter()
+    for path in driver_paths.values():
+        if not path:
+            continue
+        cumulative = pruning.cumulative_km(path)
+        marks = np.arange(0.0, cumulative[-1], SYNTHETIC_SPACING_KM)
+        for i in sorted(set(np.searchsorted(cumulative, marks).tolist())):
+            point = path[min(i, len(path) - 1)]
+            # Snap to a coarse grid so nearby routes vote for the same point
+            counts[(round(point[0], 3), round(point[1], 3))] += 1
+    return counts
+
+def cluster(counts: Counter, radius_km: float = HUB_RADIUS_KM, min_support: int = MIN_SUPPORT) -> List[Tuple[Tuple[float, float], int]]:
+    """Greedy clustering, busiest points first: each point joins the first hub within radius_km or starts one."""
+    hubs = []
+    for point, count in counts.most_common():
+        for hub in hubs:
+            if aerial_km(hub[0], point) <= radius_km:
+                hub[1] += count
+                break
+        else:
+            hubs.append([point, count])
+    return [(tuple(point), support) for point, support in hubs if support >= min_support]
+
+def aerial_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    return pruning.cumulative_km([a, b])[1]
+
+def catchment_km(minutes) -> np.ndarray:
+    """Aerial reach of a walking-time catchment; no walk covers more ground than this, so it bounds the lookup."""
+    return np.asarray(minutes, dtype=np.float32) / 60 * road_graph.WALKING_KMPH
+
+#*********************************** Build Functions ***************************************
+def drive_minutes(points: np.ndarray) -> np.ndarray:
+    """Hub-to-hub driving minutes: Dijkstra over the compiled road graph when one is configured, else an aerial estimate."""
+    n = len(points)
+    minutes = np.zeros((n, n), dtype=np.float32)
+    if road_graph.available():
+        graph = road_graph.get_graph()
+        nodes = [road_graph.nearest_node(graph, lat, lon) for lat, lon in points]
+        for i, source in enumerate(nodes):
+            seconds = road_graph.travel_times_from(graph, source, nodes)
+            minutes[i] = [seconds[target] / 60 for target in nodes]
+        return minutes
+
+    for i in range(n):
+        for j in range(i + 1, n):
+            km = aerial_km(tuple(points[i]), tuple(points[j])) * ROAD_FACTOR
+            minutes[i, j] = minutes[j, i] = km / constraints_mod.AVG_DRIVING_KMPH * 60
+    return minutes
+
+def build_hubs(direction: str = None, driver_paths: Dict[str, List[Tuple[float, float]]] = None) -> Dict[str, np.ndarray]:
+    """Mine hubs from stored plans (or, given driver_paths, from the synthetic demand model) and precompute drive times."""
+    counts = synthetic_demand(driver_paths) if driver_paths is not None else past_meeting_points(direction)
+    hubs = cluster(counts)
+    points = np.array([point for point, _ in hubs], dtype=np.float64).reshape(-1, 2)
+    catchment_min = np.full(len(hubs), WALK_CATCHMENT_MIN, dtype=np.float32)
+    return {
+        'lat': points[:, 0],
+        'lon': points[:, 1],
+        'support': np.array([support for _, support in hubs], dtype=np.int32),
+        'catchment_min': catchment_min,
+        'catchment_km': catchment_km(catchment_min),
+        'drive_minutes': drive_minutes(points),
+    }
+
+def save_hubs(hubs: Dict[str, np.ndarray], path: str = HUB_PATH) -> str:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    np.savez_compressed(path, **hubs)
+    return path
+
+def cell_size(hubs: Dict[str, np.ndarray]) -> Tuple[float, float]:
+    """Grid cell (degrees of latitude, degrees of longitude) spanning the widest catchment in both directions.
+
+    A degree of longitude shrinks with cos(latitude), so the longitude side is sized at the hub
+    farthest from the equator, where it is widest.
+    """
+    reach_km = float(hubs['catchment_km'].max()) * CELL_MARGIN if len(hubs['catchment_km']) else float(catchment_km(WALK_CATCHMENT_MIN))
+    lat_deg = reach_km / KM_PER_DEG
+    max_lat = min(float(np.abs(hubs['lat']).max()) + lat_deg, 89.0) if len(hubs['lat']) else 0.0
+    return lat_deg, reach_km / (KM_PER_DEG * math.cos(math.radians(max_lat)))
+
+def cell_of(hubs: Dict, lat_lon: Tuple[float, float]) -> Tuple[int, int]:
+    lat_deg, lon_deg = hubs['cell_deg']
+    return math.floor(lat_lon[0] / lat_deg), math.floor(lat_lon[1] / lon_deg)
+
+def load_hubs(path: str = HUB_PATH) -> Dict:
+    """Load precomputed hubs and build the grid lookup used at solve time; None when none were built."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        hubs = {name: data[name] for name in data.files}
+    # Artifacts built before catchments were timed carry only the aerial radius
+    if 'catchment_min' not in hubs:
+        hubs['catchment_min'] = hubs['catchment_km'] / road_graph.WALKING_KMPH * 60
+    hubs['cell_deg'] = cell_size(hubs)
+    cells = {}
+    for i, (lat, lon) in enumerate(zip(hubs['lat'], hubs['lon'])):
+        cells.setdefault(cell_of(hubs, (lat, lon)), []).append(i)
+    hubs['cells'] = cells
+    return hubs
+
+#*********************************** Solve-Time Functions ***************************************
+def hubs_near(hubs: Dict, lat_lon: Tuple[float, float]) -> List[int]:
+    """Hubs whose walking catchment contains a point, from the 3x3 grid cells around it."""
+    row, column = cell_of(hubs, lat_lon)
+    found = []
+    for d_row in (-1, 0, 1):
+        for d_column in (-1, 0, 1):
+            for i in hubs['cells'].get((row + d_row, column + d_column), ()):
+                if aerial_km(lat_lon, (hubs['lat'][i], hubs['lon'][i])) <= hubs['catchment_km'][i]:
+                    found.append(i)
+    return found
+
+def hub_etas(hubs: Dict, served: Dict[int, Tuple[int, Tuple[float, float]]], etas: List[float]) -> Dict[int, float]:
+    """Minutes after departure at which a driver reaches each hub it passes.
+
+    The first hub on the route is timed from the path ETAs; every later one adds the precomputed
+    hub-to-hub drive time to the previous hub. Artifacts without drive times use the path ETAs throughout.
+    """
+    order = sorted(served, key=lambda i: served[i][0])
+    if 'drive_minutes' not in hubs:
+        return {i: etas[served[i][0]] for i in order}
+    arrival = {order[0]: etas[served[order[0]][0]]}
+    for previous, i in zip(order, order[1:]):
+        leg = float(hubs['drive_minutes'][previous, i])
+        arrival[i] = arrival[previous] + leg if math.isfinite(leg) else etas[served[i][0]]
+    return arrival
+
+def hub_road_distances(
+    hubs: Dict,
+    driver_paths: Dict[str, List[Tuple[float, float]]],
+    companion_lat_lons: Dict[str, Tuple[float, float]],
+    candidate_pairs: Set[Tuple[str, str]],
+    walk,
+    constraints: Dict = None,
+    direction: str = 'to_home'
+) -> Dict[Tuple[str, str], Tuple]:
+    """Meeting points through hubs: one walking query per (companion, hub), shared by every driver passing that hub.
+
+    walk(hub_lat_lon, companion_lat_lon) returns (distance_km, duration_text) like get_directions_companion.
+    A pair is resolved when the driver's path passes one of the companion's catchment hubs; its node is the
+    path point closest to the best such hub. A hub only counts when the walk fits its catchment minutes and
+    the rider's walk limit, and the driver's arrival there (see hub_etas) falls in the rider's time window;
+    to_office riders must also reach it by then plus the wait the driver allows, as in the regular search.
+    Pairs without such a hub are left to the regular search.
+    """
+    # Path point closest to each hub a driver passes, and when the driver gets there
+    served = {}
+    arrival = {}
+    for driver, path in driver_paths.items():
+        if not path:
+            continue
+        lats = np.array([lat for lat, _ in path])
+        lons = np.array([lon for _, lon in path])
+        for i in range(len(hubs['lat'])):
+            dy = (lats - hubs['lat'][i]) * pruning.KM_PER_DEG_LAT
+            dx = (lons - hubs['lon'][i]) * pruning.KM_PER_DEG_LON * math.cos(math.radians(hubs['lat'][i]))
+            d2 = dx * dx + dy * dy
+            closest = int(np.argmin(d2))
+            if d2[closest] <= HUB_ON_PATH_KM ** 2:
+                served.setdefault(driver, {})[i] = (closest, path[closest])
+        if driver in served:
+            arrival[driver] = hub_etas(hubs, served[driver], constraints_mod.path_etas(path))
+
+    walks = {}
+    road_distances = {}
+    for driver_label, companion in candidate_pairs:
+        options = [i for i in hubs_near(hubs, companion_lat_lons[companion]) if i in served.get(driver_label, {})]
+        driver = constraints_mod.limits_for(constraints, 'drivers', driver_label)
+        rider = constraints_mod.limits_for(constraints, 'riders', companion)
+        best = None
+        for i in options:
+            if (i, companion) not in walks:
+                walks[(i, companion)] = walk((float(hubs['lat'][i]), float(hubs['lon'][i])), companion_lat_lons[companion])
+            distance, duration = walks[(i, companion)]
+            minutes = constraints_mod.parse_duration_minutes(duration)
+            if not isinstance(distance, (int, float)) or minutes is None or minutes > hubs['catchment_min'][i]:
+                continue
+            if rider['max_walk_km'] is not None and distance > rider['max_walk_km']:
+                continue
+            driver_minutes = arrival[driver_label][i]
+            if not constraints_mod.within_window(driver_minutes, driver, rider):
+                continue
+            if direction == 'to_office' and minutes > driver_minutes + constraints_mod.max_wait_min(driver):
+                continue
+            if best is None or distance < best[0]:
+                best = (distance, duration, served[driver_label][i][1])
+        if best is not None:
+            road_distances[(driver_label, companion)] = best
+    return road_distances
+
+#*********************************** Offline Entry Point ***************************************
+def main():
+    """Rebuild the hub artifact from stored runs (offline stage)."""
+    parser = argparse.ArgumentParser(description="Precompute meeting-point hubs from past plans.")
+    parser.add_argument('--direction', choices=['to_home', 'to_office'], default=None)
+    parser.add_argument('--synthetic', action='store_true', help="Use stored driver routes as a synthetic demand model instead of past meetings.")
+    parser.add_argument('--out', default=HUB_PATH)
+    args = parser.parse_args()
+
+    driver_paths = None
+    if args.synthetic:
+        driver_paths = {}
+        for run in run_store.list_runs(args.direction):
+            for driver, path in run_store.load_run(run['run_id'])['driver_paths'].items():
+                driver_paths[f"{run['run_id']}/{driver}"] = path
+    hubs = build_hubs(args.direction, driver_paths)
+    print(f"{len(hubs['lat'])} hubs written to {save_hubs(hubs, args.out)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator
+
+import http_client
+
+JOB_WORKERS = int(os.getenv('CARPOOL_JOB_WORKERS', '4'))   # solves running at once across all sessions
+JOB_TTL_SECONDS = 3600                                      # finished jobs are forgotten after this long
+
+# Streamlit imports this module once per server process, so every session shares one pool
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='carpool-job')
+_lock = threading.Lock()
+_jobs = {}
+
+#*********************************** Job Functions ***************************************
+def _run(job: Dict, generator_fn: Callable[..., Iterator[Dict]], args, kwargs) -> None:
+    with _lock:
+        if job['cancel'].is_set():
+            job['status'] = 'cancelled'
+            job['finished_at'] = time.time()
+            return
+        job['status'] = 'running'
+        job['started_at'] = time.time()
+
+    # Both scopes follow the solve into its fetch and trip pools: api_calls covers them too, and once
+    # Cancel is pressed their next API call raises instead of waiting for the stage to finish
+    with http_client.counting() as calls, http_client.cancellable(job['cancel']):
+        _consume(job, generator_fn(*args, **kwargs), calls)
+
+def _consume(job: Dict, events: Iterator[Dict], calls) -> None:
+    try:
+        for event in events:
+            with _lock:
+                if event['type'] == 'stage':
+                    job['stages'].append((event['stage'], event['seconds']))
+                elif event['type'] == 'assignment':
+                    job['assignments'][event['driver']] = event['companions']
+                elif event['type'] == 'done':
+                    job['result'] = event
+                job['api_calls'] = calls[0]
+            # Between events, closing the generator stops the solve; within a stage the next API call stops it
+            if job['cancel'].is_set():
+                events.close()
+                with _lock:
+                    job['status'] = 'cancelled'
+                return
+        with _lock:
+            job['status'] = 'done' if job['result'] is not None else 'failed'
+    except http_client.Cancelled:
+        with _lock:
+            job['status'] = 'cancelled'
+    except Exception as exc:
+        with _lock:
+            job['status'] = 'failed'
+            job['error'] = exc
+    finally:
+        with _lock:
+            job['finished_at'] = time.time()
+
+def submit(generator_fn: Callable[..., Iterator[Dict]], *args, **kwargs) -> str:
+    """Run an event generator (helper_stream, plan_stream, ...) on the shared pool; returns the job id."""
+    _forget_expired()
+    job_id = uuid.uuid4().hex
+    job = {
+        'id': job_id,
+        'status': 'queued',
+        'submitted_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+        'stages': [],
+        'assignments': {},
+        'api_calls': 0,
+        'result': None,
+        'error': None,
+        'cancel': threading.Event(),
+    }
+    with _lock:
+        _jobs[job_id] = job
+    _executor.submit(_run, job, generator_fn, args, kwargs)
+    return job_id
+
+def status(job_id: str) -> Dict:
+    """Snapshot of a job: status, finished stages, API calls, partial assignments and the done event; None if unknown."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        snapshot = {key: value for key, value in job.items() if key != 'cancel'}
+        snapshot['stages'] = list(job['stages'])
+        snapshot['assignments'] = dict(job['assignments'])
+        return snapshot
+
+def cancel(job_id: str) -> None:
+    """Ask a queued or running job to stop; it ends with status 'cancelled'."""
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is not None:
+        job['cancel'].set()
+
+def forget(job_id: str) -> None:
+    with _lock:
+        _jobs.pop(job_id, None)
+
+def _forget_expired() -> None:
+    cutoff = time.time() - JOB_TTL_SECONDS
+    with _lock:
+        for job_id in [job_id for job_id, job in _jobs.items() if job['finished_at'] and job['finished_at'] < cutoff]:
+            del _jobs[job_id]
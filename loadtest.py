@@ -0,0 +1,161 @@
+import argparse
+import contextlib
+import json
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+import http_client
+import jobs
+import replay
+import trip_eval
+
+POLL_SECONDS = 0.05                 # how often a simulated session polls its job (the app's fragment polls every second)
+PERCENTILES = (50, 95, 99)
+VECTOR_MAP_DRIVER_THRESHOLD = 25    # same map mode switch as main.py
+
+#*********************************** Measurement Functions ***************************************
+def rss_mb() -> float:
+    """Current resident set size in MB (Linux /proc), falling back to the peak from getrusage."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return peak_rss_mb()
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+def latency_stats(seconds: List[float]) -> Dict[str, float]:
+    """p50/p95/p99, mean and max of a list of latencies, in seconds."""
+    if not seconds:
+        return {}
+    values = np.asarray(seconds, dtype=np.float64)
+    stats = {f"p{q}": float(np.percentile(values, q)) for q in PERCENTILES}
+    stats.update(mean=float(values.mean()), max=float(values.max()), count=len(values))
+    return stats
+
+#*********************************** Session Functions ***************************************
+def solve_events(direction: str, locations: Dict, capacity: Dict[str, int]):
+    # Imported lazily: both helpers read st.secrets at import time
+    if direction == 'to_home':
+        import to_home_google_api
+        return to_home_google_api.helper_stream(locations, capacity)
+    import to_office_google_api
+    return to_office_google_api.helper_stream(locations)
+
+def render_map(direction: str, result: Dict) -> int:
+    """Build and serialize the results map the way the page does; returns the HTML size in bytes."""
+    from plotFrom import plot as plot_from_office
+    from plotTo import plot as plot_to_office
+    plot = plot_from_office if direction == 'to_home' else plot_to_office
+    mode = 'vector' if len(result['driver_paths']) > VECTOR_MAP_DRIVER_THRESHOLD else 'detailed'
+    mymap = plot(result['locations'], result['assignments'], result['driver_paths'], mode=mode, costs=result.get('cost_matrix'))
+    return len(mymap.get_root().render())
+
+def simulated_session(direction: str, locations: Dict, capacity: Dict[str, int], iterations: int, render: bool) -> List[Dict]:
+    """One dispatcher: submit a solve to the shared job pool, poll it to completion, then render the map."""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        job_id = jobs.submit(trip_eval.with_trip_times, direction, solve_events(direction, locations, capacity))
+        while True:
+            snapshot = jobs.status(job_id)
+            if snapshot['status'] not in ('queued', 'running'):
+                break
+            time.sleep(POLL_SECONDS)
+        jobs.forget(job_id)
+        sample = {
+            'status': snapshot['status'],
+            'queued_seconds': (snapshot['started_at'] or snapshot['finished_at']) - snapshot['submitted_at'],
+            'solve_seconds': time.perf_counter() - started,
+            'api_calls': snapshot['api_calls'],
+        }
+        if render and snapshot['status'] == 'done':
+            render_started = time.perf_counter()
+            with http_client.counting() as calls:
+                sample['map_bytes'] = render_map(direction, snapshot['result'])
+            sample['render_seconds'] = time.perf_counter() - render_started
+            sample['api_calls'] += calls[0]
+        sample['total_seconds'] = time.perf_counter() - started
+        samples.append(sample)
+    return samples
+
+def run_load(direction: str, locations: Dict, capacity: Dict[str, int], users: int, iterations: int = 1, render: bool = True) -> Dict:
+    """Run `users` concurrent simulated sessions of `iterations` solves each and summarize latency, throughput, memory and API volume."""
+    rss_before = rss_mb()
+    calls_before = http_client.call_count()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users, thread_name_prefix='loadtest-user') as executor:
+        futures = [executor.submit(simulated_session, direction, locations, capacity, iterations, render) for _ in range(users)]
+        per_user = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+    rss_after = rss_mb()
+
+    samples = [sample for user in per_user for sample in user]
+    completed = [sample for sample in samples if sample['status'] == 'done']
+    return {
+        'users': users,
+        'iterations': iterations,
+        'job_workers': jobs.JOB_WORKERS,
+        'replay': replay.mode(),
+        'elapsed_seconds': elapsed,
+        'completed': len(completed),
+        'failed': len(samples) - len(completed),
+        'throughput_per_minute': len(completed) / elapsed * 60 if elapsed else 0.0,
+        'latency_seconds': {
+            'total': latency_stats([sample['total_seconds'] for sample in completed]),
+            'queued': latency_stats([sample['queued_seconds'] for sample in completed]),
+            'solve': latency_stats([sample['solve_seconds'] for sample in completed]),
+            'render': latency_stats([sample['render_seconds'] for sample in completed if 'render_seconds' in sample]),
+        },
+        'memory_mb': {'rss_before': rss_before, 'rss_after': rss_after, 'growth': rss_after - rss_before, 'peak': peak_rss_mb()},
+        'api_calls': {
+            'total': http_client.call_count() - calls_before,
+            'per_user': [sum(sample['api_calls'] for sample in user) for user in per_user],
+            'per_solve': latency_stats([float(sample['api_calls']) for sample in completed]).get('mean', 0.0),
+        },
+    }
+
+#*********************************** Entry Point ***************************************
+def main():
+    """Load-test the solve and render paths with concurrent simulated sessions against a recorded archive."""
+    parser = argparse.ArgumentParser(description="Load-test the carpool solve and map paths headlessly.")
+    parser.add_argument('roster', help="JSON roster with 'locations' and 'capacity' (same layout as cli.py).")
+    parser.add_argument('--archive', default=replay.ARCHIVE_PATH, help="Recorded API archive to replay (see replay.py).")
+    parser.add_argument('--record-first', action='store_true', help="Run one live session first and record it into --archive.")
+    parser.add_argument('--direction', choices=['to_home', 'to_office'], default='to_home')
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 4, 8], help="Concurrent sessions; several values run one stage each.")
+    parser.add_argument('--iterations', type=int, default=2, help="Solves per simulated session.")
+    parser.add_argument('--latency', choices=['original', 'zero'], default='original', help="Replay with recorded API latencies or none.")
+    parser.add_argument('--no-render', action='store_true', help="Skip building the results map.")
+    args = parser.parse_args()
+
+    with open(args.roster) as f:
+        roster_file = json.load(f)
+    locations, capacity = roster_file['locations'], roster_file.get('capacity', {})
+
+    # The pipeline prints request errors; send them to stderr and keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.record_first:
+            with replay.recording(args.archive):
+                simulated_session(args.direction, locations, capacity, 1, not args.no_render)
+        replay.start_replay(args.archive, args.latency)
+        try:
+            reports = [
+                run_load(args.direction, locations, capacity, users, args.iterations, not args.no_render)
+                for users in args.users
+            ]
+        finally:
+            replay.stop()
+    json.dump(reports, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+if __name__ == "__main__":
+    main()
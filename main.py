@@ -1,6 +1,7 @@
 import streamlit as st
 import folium
 from streamlit_folium import st_folium
+import streamlit.components.v1 as components
 import requests
 import os
 from dotenv import load_dotenv
@@ -12,6 +13,15 @@ from typing import Dict, Tuple, Any
 # Make sure these files are present and contain the specified functions.
 import to_office_google_api
 import to_home_google_api
+import artifact_store
+import hubs
+import roster
+import trip_eval
+import http_client
+import jobs
+import profiling
+import run_store
+import warm_start
 from plotTo import plot as plot_to_office
 from plotFrom import plot as plot_from_office
 
@@ -21,6 +31,12 @@ load_dotenv()
 # Fallback for Streamlit Cloud deployment if using secrets:
 API_KEY = st.secrets['api_key'] # Make sure this matches your secret name
 
+# Fleets larger than this are drawn as simplified vector layers to keep the map payload small
+VECTOR_MAP_DRIVER_THRESHOLD = 25
+
+# How often a page polls its background solve for progress
+JOB_POLL_SECONDS = 1.0
+
 ADMIN_EMAIL = "admin@admin.com"
 ADMIN_PASSWORD = "admin"
 
@@ -52,6 +68,10 @@ DEFAULT_FROM_OFFICE_DRIVERS = [
     ("Kishore K", "HopeFarm, Bangalore", 2)
 ]
 
+# Participant rosters are typed DataFrames in session state, edited through st.data_editor
+DRIVER_COLUMNS = {'Name': 'string', 'Location': 'string', 'Capacity': 'Int64'}
+COMPANION_COLUMNS = {'Name': 'string', 'Location': 'string'}
+
 # --- UI Styling Functions ---
 
 def set_custom_css():
@@ -116,9 +136,11 @@ def set_custom_css():
 
 # --- Helper Functions ---
 
+@st.cache_data(show_spinner=False, max_entries=4096)
 def get_lat_lon(address: str, api_key: str) -> Tuple[float, float]:
     """
     Converts an address to latitude and longitude using Google Geocoding API.
+    Results are cached, so map previews only geocode rows that changed since the last rerun.
     """
     if not api_key:
         raise ValueError("Google Maps API Key is not set. Please set it in your .env file or Streamlit secrets.")
@@ -127,9 +149,7 @@ def get_lat_lon(address: str, api_key: str) -> Tuple[float, float]:
     params = {'address': address, 'key': api_key}
     
     try:
-        response = requests.get(url, params=params, timeout=10) # Added timeout
-        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-        result = response.json()
+        result = http_client.get_json(url, params) # Pooled client with strict timeouts; raises HTTPError for 4xx or 5xx
 
         if result['status'] == 'OK':
             location = result['results'][0]['geometry']['location']
@@ -145,6 +165,86 @@ def get_lat_lon(address: str, api_key: str) -> Tuple[float, float]:
         raise requests.exceptions.RequestException(f"Failed to connect to Google Geocoding API: {e}. Check network and API key.")
 
 
+@st.cache_resource
+def load_hub_index():
+    """Precomputed meeting-point hubs shared by every session, or None until `python hubs.py` has been run."""
+    return hubs.load_hubs()
+
+def submit_solve(direction: str, events, locations: Dict[str, Any], capacity: Dict[str, int]) -> Dict[str, Any]:
+    """Start a solve on the shared job pool, profiled when the admin toggle is on; returns the job record to poll."""
+    run_id = run_store.new_run_id()
+    if st.session_state.get('profiling'):
+        job_id = jobs.submit(profiling.profile_stream, trip_eval.with_trip_times(direction, events), run_id)
+    else:
+        job_id = jobs.submit(trip_eval.with_trip_times, direction, events)
+    return {
+        'id': job_id,
+        'run_id': run_id,
+        'direction': direction,
+        'locations': locations,
+        'capacity': capacity,
+    }
+
+def solve_error_message(error: Exception) -> str:
+    """User-facing message for an exception raised inside a background solve."""
+    if isinstance(error, requests.exceptions.RequestException):
+        return f"Network or API request error: {error}. Please check your internet connection or Google Maps API key settings."
+    if isinstance(error, KeyError):
+        return f"Location input error: {error}. One or more addresses could not be geocoded. Please verify the entered addresses."
+    return f"An unexpected error occurred during algorithm execution: {error}. Please report this issue."
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def solve_progress(job_key: str):
+    """
+    Polls the background solve stored under st.session_state[job_key]: stages done, API calls made and
+    each driver's assignment as soon as it is final, with a cancel button. Only this fragment reruns
+    while the job is in flight; once it finishes the run is persisted and the app moves to the results.
+    """
+    job = st.session_state[job_key]
+    snapshot = jobs.status(job['id'])
+    if snapshot is None:
+        del st.session_state[job_key]
+        st.warning("The running job is no longer available (the server may have restarted). Please start the algorithm again.")
+        return
+
+    if snapshot['status'] in ('queued', 'running'):
+        stages = ", ".join(stage.replace('_', ' ') for stage, _ in snapshot['stages']) or "none yet"
+        elapsed = time.time() - (snapshot['started_at'] or snapshot['submitted_at'])
+        st.caption(f"Job `{job['id'][:8]}` {snapshot['status']} for {elapsed:.0f}s · stages done: {stages} · API calls: {snapshot['api_calls']}")
+        if snapshot['assignments']:
+            rows = [
+                {"Driver": driver, "Assigned Companions": ", ".join(name for name, _ in companions) or "None"}
+                for driver, companions in snapshot['assignments'].items()
+            ]
+            st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+        if st.button("⏹️ Cancel", key=f"cancel_{job_key}", use_container_width=True):
+            jobs.cancel(job['id'])
+        return
+
+    del st.session_state[job_key]
+    jobs.forget(job['id'])
+    if snapshot['status'] == 'cancelled':
+        st.warning("The carpooling algorithm was cancelled.")
+        return
+    if snapshot['status'] == 'failed':
+        st.error(solve_error_message(snapshot['error']) if snapshot['error'] else "The algorithm finished without a result. Please report this issue.")
+        st.session_state.show_results = False # Keep results hidden on error
+        return
+
+    result = snapshot['result']
+    total_time = snapshot['finished_at'] - snapshot['started_at']
+    st.session_state.run_id = run_store.save_run(
+        job['direction'], job['locations'], job['capacity'], result['assignments'], result['driver_paths'],
+        result['road_distances'], result['companion_lat_lons'], {**result['timings'], 'total': total_time}, job['run_id']
+    )
+    st.session_state.cost_matrix = result.get('cost_matrix') # map tooltips read from the solve's costs
+    st.session_state.companion_lat_lons = result['companion_lat_lons'] # maps place companions without geocoding again
+    st.session_state.trip_times = result.get('trip_times', {})
+    st.session_state.algorithm_output = (result['locations'], result['assignments'], result['driver_paths'], total_time)
+    st.session_state.show_results = True
+    st.rerun()
+
+
 def initialize_session_state():
     """Initializes all necessary session state variables for the app."""
     if "logged_in" not in st.session_state:
@@ -157,32 +257,25 @@ def initialize_session_state():
         st.session_state.show_results = False
     if "algorithm_output" not in st.session_state:
         st.session_state.algorithm_output = None
+    if "profiling" not in st.session_state:
+        st.session_state.profiling = False
     
     # Initialize 'To Office' specific defaults
     if "companion_name" not in st.session_state:
         st.session_state.companion_name = DEFAULT_TO_OFFICE_COMPANION[0]
         st.session_state.companion_location = DEFAULT_TO_OFFICE_COMPANION[1]
         st.session_state.office_location_to = DEFAULT_OFFICE_LOCATION
-        st.session_state.num_drivers_to = 2 # Default to showing 2 drivers initially
-        for i, (name, loc, cap) in enumerate(DEFAULT_TO_OFFICE_DRIVERS):
-            st.session_state[f'driver_{i+1}_name_to'] = name
-            st.session_state[f'driver_{i+1}_location_to'] = loc
-            st.session_state[f'driver_{i+1}_capacity_to'] = cap
+        set_roster('drivers_to', roster_frame(DEFAULT_TO_OFFICE_DRIVERS[:2], DRIVER_COLUMNS)) # Default to showing 2 drivers initially
     if "show_map_to" not in st.session_state:
         st.session_state.show_map_to = False
 
     # Initialize 'From Office' specific defaults
-    if "num_companions_from" not in st.session_state:
+    if "companions_from" not in st.session_state:
         st.session_state.office_location_from = DEFAULT_OFFICE_LOCATION
-        st.session_state.num_companions_from = 3 # Default to showing 3 companions
-        st.session_state.num_drivers_from = 2 # Default to showing 2 drivers
-        for i, (name, loc) in enumerate(DEFAULT_FROM_OFFICE_COMPANIONS):
-            st.session_state[f'companion_{i+1}_name_from'] = name
-            st.session_state[f'companion_{i+1}_location_from'] = loc
-        for i, (name, loc, cap) in enumerate(DEFAULT_FROM_OFFICE_DRIVERS):
-            st.session_state[f'driver_{i+1}_name_from'] = name
-            st.session_state[f'driver_{i+1}_location_from'] = loc
-            st.session_state[f'driver_{i+1}_capacity_from'] = cap
+        set_roster('companions_from', roster_frame(DEFAULT_FROM_OFFICE_COMPANIONS[:3], COMPANION_COLUMNS)) # Default to showing 3 companions
+        set_roster('drivers_from', roster_frame(DEFAULT_FROM_OFFICE_DRIVERS[:2], DRIVER_COLUMNS)) # Default to showing 2 drivers
+        st.session_state.roster_places_from = {}
+        st.session_state.roster_lat_lons_from = {}
     if "show_map_from" not in st.session_state:
         st.session_state.show_map_from = False
 
@@ -191,28 +284,65 @@ def reset_to_office_fields():
     st.session_state.companion_name = DEFAULT_TO_OFFICE_COMPANION[0]
     st.session_state.companion_location = DEFAULT_TO_OFFICE_COMPANION[1]
     st.session_state.office_location_to = DEFAULT_OFFICE_LOCATION
-    st.session_state.num_drivers_to = 2
     st.session_state.show_map_to = False
-    for i, (name, loc, cap) in enumerate(DEFAULT_TO_OFFICE_DRIVERS):
-        st.session_state[f'driver_{i+1}_name_to'] = name
-        st.session_state[f'driver_{i+1}_location_to'] = loc
-        st.session_state[f'driver_{i+1}_capacity_to'] = cap
+    set_roster('drivers_to', roster_frame(DEFAULT_TO_OFFICE_DRIVERS[:2], DRIVER_COLUMNS))
 
 def reset_from_office_fields():
     """Resets 'From Office' demo input fields to their default values."""
     st.session_state.office_location_from = DEFAULT_OFFICE_LOCATION
-    st.session_state.num_companions_from = 3
-    st.session_state.num_drivers_from = 2
     st.session_state.show_map_from = False
-    for i, (name, loc) in enumerate(DEFAULT_FROM_OFFICE_COMPANIONS):
-        st.session_state[f'companion_{i+1}_name_from'] = name
-        st.session_state[f'companion_{i+1}_location_from'] = loc
-    for i, (name, loc, cap) in enumerate(DEFAULT_FROM_OFFICE_DRIVERS):
-        st.session_state[f'driver_{i+1}_name_from'] = name
-        st.session_state[f'driver_{i+1}_location_from'] = loc
-        st.session_state[f'driver_{i+1}_capacity_from'] = cap
+    set_roster('companions_from', roster_frame(DEFAULT_FROM_OFFICE_COMPANIONS[:3], COMPANION_COLUMNS))
+    set_roster('drivers_from', roster_frame(DEFAULT_FROM_OFFICE_DRIVERS[:2], DRIVER_COLUMNS))
+    st.session_state.roster_places_from = {}
+    st.session_state.roster_lat_lons_from = {}
+
+# --- Roster Model ---
 
-# --- Streamlit Page Functions ---
+def roster_frame(rows, columns: Dict[str, str]) -> pd.DataFrame:
+    """A typed roster table from (name, location[, capacity]) rows."""
+    return pd.DataFrame(list(rows), columns=list(columns)).astype(columns)
+
+def set_roster(key: str, frame: pd.DataFrame):
+    """Replace a roster (defaults, reset, upload). The editor is re-keyed so it starts from the new rows."""
+    st.session_state[key] = frame
+    st.session_state[f'{key}_version'] = st.session_state.get(f'{key}_version', 0) + 1
+    st.session_state[f'{key}_edited'] = frame
+
+def roster_changed(key: str, map_flag: str):
+    """
+    on_change hook of a roster editor. The editor state holds only the diff (edited, added and deleted
+    rows); the map preview is hidden only when a location or the set of rows actually changed.
+    """
+    delta = st.session_state[f"{key}_editor_{st.session_state[f'{key}_version']}"]
+    rows_changed = delta.get('added_rows') or delta.get('deleted_rows')
+    locations_changed = any('Location' in change for change in delta.get('edited_rows', {}).values())
+    if rows_changed or locations_changed:
+        st.session_state[map_flag] = False
+
+def roster_editor(key: str, map_flag: str) -> pd.DataFrame:
+    """Editable grid over a roster table; returns the edited table, kept in session state as f'{key}_edited'."""
+    column_config = {
+        'Name': st.column_config.TextColumn("Name", required=True),
+        'Location': st.column_config.TextColumn("Location", required=True, help="e.g., 'Marathahalli Bridge, Bangalore'"),
+        'Capacity': st.column_config.NumberColumn("Capacity", min_value=1, max_value=10, step=1, default=2, help="Seats available."),
+    }
+    edited = st.data_editor(
+        st.session_state[key], key=f"{key}_editor_{st.session_state[f'{key}_version']}", num_rows="dynamic",
+        hide_index=True, use_container_width=True, column_config=column_config, on_change=roster_changed, args=(key, map_flag)
+    )
+    st.session_state[f'{key}_edited'] = edited
+    return edited
+
+def roster_places(frame: pd.DataFrame) -> Dict[str, str]:
+    """Name -> location for the complete rows of a roster table."""
+    valid = frame.dropna(subset=['Name', 'Location'])
+    valid = valid[(valid['Name'].str.strip() != '') & (valid['Location'].str.strip() != '')]
+    return dict(zip(valid['Name'], valid['Location']))
+
+def roster_capacity(frame: pd.DataFrame) -> Dict[str, int]:
+    """Name -> seats for the named rows of a driver roster (missing capacity counts as one seat)."""
+    valid = frame.dropna(subset=['Name'])
+    return dict(zip(valid['Name'], valid['Capacity'].fillna(1).astype(int)))
 
 def login_page():
     """Displays the admin login page."""
@@ -361,22 +491,7 @@ def demo_to_office_page():
 
         with st.container(border=True):
             st.subheader("🚗 Available Drivers")
-            st.session_state.num_drivers_to = st.slider(
-                "Number of Drivers to Include", 1, 5, value=st.session_state.num_drivers_to, key="to_num_drivers", help="Select how many drivers you want to configure."
-            )
-
-            # Use st.expander for each driver's details to reduce visual clutter
-            for i in range(1, st.session_state.num_drivers_to + 1):
-                with st.expander(f"**Driver {i} Details**"):
-                    st.session_state[f'driver_{i}_name_to'] = st.text_input(
-                        f"Name", key=f'driver_{i}_name_input_to', value=st.session_state[f'driver_{i}_name_to'], help=f"Enter name for Driver {i}"
-                    )
-                    st.session_state[f'driver_{i}_location_to'] = st.text_input(
-                        f"Location", key=f'driver_{i}_location_input_to', value=st.session_state[f'driver_{i}_location_to'], help=f"e.g., 'Marathahalli Bridge, Bangalore'"
-                    )
-                    st.session_state[f'driver_{i}_capacity_to'] = st.number_input(
-                        f"Capacity (Seats available)", min_value=1, max_value=10, value=st.session_state[f'driver_{i}_capacity_to'], key=f'driver_{i}_capacity_input_to', help=f"Number of passengers Driver {i} can carry."
-                    )
+            roster_editor('drivers_to', 'show_map_to')
         
         st.markdown("---") # Separator before action buttons
         col_buttons_input = st.columns(2)
@@ -399,12 +514,10 @@ def demo_to_office_page():
                     all_points = [(office_lat, office_lon), (companion_lat, companion_lon)]
                     driver_locations_map = []
 
-                    for i in range(1, st.session_state.num_drivers_to + 1):
-                        driver_loc_str = st.session_state[f'driver_{i}_location_to']
-                        if driver_loc_str:
-                            driver_lat, driver_lon = get_lat_lon(driver_loc_str, API_KEY)
-                            all_points.append((driver_lat, driver_lon))
-                            driver_locations_map.append((driver_lat, driver_lon, st.session_state[f'driver_{i}_name_to']))
+                    for driver_name, driver_loc_str in roster_places(st.session_state.drivers_to_edited).items():
+                        driver_lat, driver_lon = get_lat_lon(driver_loc_str, API_KEY)
+                        all_points.append((driver_lat, driver_lon))
+                        driver_locations_map.append((driver_lat, driver_lon, driver_name))
                     
                     if all_points:
                         min_lat = min(p[0] for p in all_points)
@@ -437,44 +550,16 @@ def demo_to_office_page():
         # Start Algorithm Button - placed in map column for better grouping
         st.markdown("<div class='red-button' style='text-align: center;'>", unsafe_allow_html=True)
         if st.button("▶️ Start Carpooling Algorithm", key="start_algo_to_main", use_container_width=True, help="Run the optimization algorithm to find the best carpool assignments."):
-            with st.spinner("Running the carpooling algorithm... This might take a moment."):
-                locations = {
-                    "office": st.session_state.office_location_to,
-                    "drivers": {
-                        st.session_state[f'driver_{i}_name_to']: st.session_state[f'driver_{i}_location_to']
-                        for i in range(1, st.session_state.num_drivers_to + 1)
-                        if st.session_state[f'driver_{i}_name_to'] and st.session_state[f'driver_{i}_location_to']
-                    },
-                    "companions": {
-                        st.session_state.companion_name: st.session_state.companion_location
-                    }
-                }
-                driver_capacities = {
-                    st.session_state[f'driver_{i}_name_to']: st.session_state[f'driver_{i}_capacity_to']
-                    for i in range(1, st.session_state.num_drivers_to + 1)
-                    if st.session_state[f'driver_{i}_name_to']
-                }
-
-                try:
-                    start_time = time.time()
-                    # Assuming to_office_google_api.helper expects locations and capacities
-                    geocoded_locs, assignments, driver_paths = to_office_google_api.helper(locations)
-                    end_time = time.time()
-                    total_time = end_time - start_time
-
-                    st.session_state.algorithm_output = (geocoded_locs, assignments, driver_paths, total_time)
-                    st.session_state.show_results = True
-                    st.success("Algorithm completed successfully! Navigating to results...")
-                    time.sleep(1) # Small delay for success message to be seen
-                    st.rerun()
-
-                except requests.exceptions.RequestException as req_err:
-                    st.error(f"Network or API request error: {req_err}. Please check your internet connection or Google Maps API key settings.")
-                except KeyError as ke_err:
-                    st.error(f"Location input error: {ke_err}. One or more addresses could not be geocoded. Please verify the entered addresses.")
-                except Exception as e:
-                    st.error(f"An unexpected error occurred during algorithm execution: {e}. Please report this issue.")
-                st.session_state.show_results = False # Keep results hidden on error
+            locations = {
+                "office": st.session_state.office_location_to,
+                "drivers": roster_places(st.session_state.drivers_to_edited),
+                "companions": {st.session_state.companion_name: st.session_state.companion_location}
+            }
+            driver_capacities = roster_capacity(st.session_state.drivers_to_edited)
+            # The solve runs on the shared job pool; this page only polls it
+            st.session_state.solve_job_to = submit_solve("to_office", to_office_google_api.helper_stream(locations), locations, driver_capacities)
+        if st.session_state.get('solve_job_to'):
+            solve_progress('solve_job_to')
         st.markdown("</div>", unsafe_allow_html=True) # End centering div
 
     st.markdown("---") # Final separator before navigation
@@ -506,37 +591,48 @@ def demo_from_office_page():
         st.markdown("<br>", unsafe_allow_html=True)
 
         with st.container(border=True):
-            st.subheader("👥 Companions Going Home")
-            st.session_state.num_companions_from = st.slider(
-                "Number of Companions to Include", 1, 5, value=st.session_state.num_companions_from, key="from_num_companions", help="Select how many companions are seeking a ride."
+            st.subheader("📄 Bulk Roster Upload")
+            upload = st.file_uploader(
+                "Roster file (CSV or Excel)", type=["csv", "xlsx", "xls"], key="roster_upload_from",
+                help="Columns: name, role (driver/companion), address, capacity. Replaces the participants in the tables below."
             )
-            for i in range(1, st.session_state.num_companions_from + 1):
-                with st.expander(f"**Companion {i} Details**"):
-                    st.session_state[f'companion_{i}_name_from'] = st.text_input(
-                        f"Name", key=f'companion_{i}_name_input_from', value=st.session_state[f'companion_{i}_name_from'], help=f"Enter name for Companion {i}"
-                    )
-                    st.session_state[f'companion_{i}_location_from'] = st.text_input(
-                        f"Drop-off Location", key=f'companion_{i}_location_input_from', value=st.session_state[f'companion_{i}_location_from'], help=f"e.g., 'Zolo Arena, Bangalore'"
-                    )
+            if upload is None:
+                st.session_state.roster_from = None
+                st.session_state.roster_file_from = None
+            elif st.session_state.get('roster_file_from') != (upload.name, upload.size):
+                with st.spinner("Geocoding the unique addresses in the roster..."):
+                    table = roster.ingest(upload)
+                st.session_state.roster_from = table
+                st.session_state.roster_file_from = (upload.name, upload.size)
+                valid = table[table['error'].isna()]
+                drivers = valid[valid['role'] == 'driver']
+                companions = valid[valid['role'] == 'companion']
+                set_roster('drivers_from', roster_frame(zip(drivers['name'], drivers['address'], drivers['capacity']), DRIVER_COLUMNS))
+                set_roster('companions_from', roster_frame(zip(companions['name'], companions['address']), COMPANION_COLUMNS))
+                st.session_state.roster_places_from = roster.places(table)
+                st.session_state.roster_lat_lons_from = roster.lat_lons(table, key='address')
+                st.session_state.show_map_from = False
+            if st.session_state.get('roster_from') is not None:
+                counts = roster.summary(st.session_state.roster_from)
+                st.caption(
+                    f"{counts['drivers']} drivers and {counts['companions']} companions from {counts['rows']} rows · "
+                    f"{counts['unique_addresses']} unique addresses geocoded · {counts['rejected']} rows rejected"
+                )
+                rejected = st.session_state.roster_from[st.session_state.roster_from['error'].notna()]
+                if len(rejected):
+                    st.dataframe(rejected[['name', 'role', 'address', 'error']], hide_index=True, use_container_width=True)
+
+        st.markdown("<br>", unsafe_allow_html=True)
+
+        with st.container(border=True):
+            st.subheader("👥 Companions Going Home")
+            roster_editor('companions_from', 'show_map_from')
         
         st.markdown("<br>", unsafe_allow_html=True)
 
         with st.container(border=True):
             st.subheader("🚗 Available Drivers")
-            st.session_state.num_drivers_from = st.slider(
-                "Number of Drivers to Include", 1, 5, value=st.session_state.num_drivers_from, key="from_num_drivers", help="Select how many drivers are available."
-            )
-            for i in range(1, st.session_state.num_drivers_from + 1):
-                with st.expander(f"**Driver {i} Details**"):
-                    st.session_state[f'driver_{i}_name_from'] = st.text_input(
-                        f"Name", key=f'driver_{i}_name_input_from', value=st.session_state[f'driver_{i}_name_from'], help=f"Enter name for Driver {i}"
-                    )
-                    st.session_state[f'driver_{i}_location_from'] = st.text_input(
-                        f"Home Location", key=f'driver_{i}_location_input_from', value=st.session_state[f'driver_{i}_location_from'], help=f"e.g., 'Nallur Halli Metro Station, Bangalore'"
-                    )
-                    st.session_state[f'driver_{i}_capacity_from'] = st.number_input(
-                        f"Capacity (Seats available)", min_value=1, max_value=10, value=st.session_state[f'driver_{i}_capacity_from'], key=f'driver_{i}_capacity_input_from', help=f"Number of passengers Driver {i} can carry."
-                    )
+            roster_editor('drivers_from', 'show_map_from')
         
         st.markdown("---")
         col_buttons_input = st.columns(2)
@@ -557,20 +653,17 @@ def demo_from_office_page():
                     all_points = [(office_lat, office_lon)]
                     
                     companion_locations_map = []
-                    for i in range(1, st.session_state.num_companions_from + 1):
-                        companion_loc_str = st.session_state[f'companion_{i}_location_from']
-                        if companion_loc_str:
-                            lat, lon = get_lat_lon(companion_loc_str, API_KEY)
-                            all_points.append((lat, lon))
-                            companion_locations_map.append((lat, lon, st.session_state[f'companion_{i}_name_from']))
+                    known = st.session_state.roster_lat_lons_from
+                    for companion_name, companion_loc_str in roster_places(st.session_state.companions_from_edited).items():
+                        lat, lon = known.get(companion_loc_str) or get_lat_lon(companion_loc_str, API_KEY)
+                        all_points.append((lat, lon))
+                        companion_locations_map.append((lat, lon, companion_name))
 
                     driver_locations_map = []
-                    for i in range(1, st.session_state.num_drivers_from + 1):
-                        driver_loc_str = st.session_state[f'driver_{i}_location_from']
-                        if driver_loc_str:
-                            lat, lon = get_lat_lon(driver_loc_str, API_KEY)
-                            all_points.append((lat, lon))
-                            driver_locations_map.append((lat, lon, st.session_state[f'driver_{i}_name_from']))
+                    for driver_name, driver_loc_str in roster_places(st.session_state.drivers_from_edited).items():
+                        lat, lon = known.get(driver_loc_str) or get_lat_lon(driver_loc_str, API_KEY)
+                        all_points.append((lat, lon))
+                        driver_locations_map.append((lat, lon, driver_name))
                     
                     if all_points:
                         min_lat = min(p[0] for p in all_points)
@@ -603,46 +696,26 @@ def demo_from_office_page():
         st.markdown("<br>", unsafe_allow_html=True)
         # Start Algorithm Button
         st.markdown("<div class='red-button' style='text-align: center;'>", unsafe_allow_html=True)
+        st.checkbox("Warm start from the previous run", key="warm_start_from", help="Reuse yesterday's routes, meeting points and seats; only changed participants are re-solved.")
         if st.button("▶️ Start Carpooling Algorithm", key="start_algo_from_main", use_container_width=True, help="Run the optimization algorithm to find the best carpool assignments."):
-            with st.spinner("Running the carpooling algorithm... This might take a moment."):
-                locations = {
-                    "office": st.session_state.office_location_from,
-                    "drivers": {
-                        st.session_state[f'driver_{i}_name_from']: st.session_state[f'driver_{i}_location_from']
-                        for i in range(1, st.session_state.num_drivers_from + 1)
-                        if st.session_state[f'driver_{i}_name_from'] and st.session_state[f'driver_{i}_location_from']
-                    },
-                    "companions": {
-                        st.session_state[f'companion_{i}_name_from']: st.session_state[f'companion_{i}_location_from']
-                        for i in range(1, st.session_state.num_companions_from + 1)
-                        if st.session_state[f'companion_{i}_name_from'] and st.session_state[f'companion_{i}_location_from']
-                    }
-                }
-                capacity = {
-                    st.session_state[f'driver_{i}_name_from']: st.session_state[f'driver_{i}_capacity_from']
-                    for i in range(1, st.session_state.num_drivers_from + 1)
-                    if st.session_state[f'driver_{i}_name_from']
-                }
-
-                try:
-                    start_time = time.time()
-                    geocoded_locs, assignments, driver_paths = to_home_google_api.helper(locations, capacity)
-                    end_time = time.time()
-                    total_time = end_time - start_time
-
-                    st.session_state.algorithm_output = (geocoded_locs, assignments, driver_paths, total_time)
-                    st.session_state.show_results = True
-                    st.success("Algorithm completed successfully! Navigating to results...")
-                    time.sleep(1)
-                    st.rerun()
-
-                except requests.exceptions.RequestException as req_err:
-                    st.error(f"Network or API request error: {req_err}. Please check your internet connection or Google Maps API key settings.")
-                except KeyError as ke_err:
-                    st.error(f"Location input error: {ke_err}. One or more addresses could not be geocoded. Please verify the entered addresses.")
-                except Exception as e:
-                    st.error(f"An unexpected error occurred during algorithm execution: {e}. Please report this issue.")
-                st.session_state.show_results = False
+            # Uploaded rosters are already geocoded; edited or typed-in locations are geocoded by the solve
+            places = st.session_state.roster_places_from
+            known = st.session_state.roster_lat_lons_from
+            companions = roster_places(st.session_state.companions_from_edited)
+            locations = {
+                "office": st.session_state.office_location_from,
+                "drivers": {name: places.get(loc, loc) for name, loc in roster_places(st.session_state.drivers_from_edited).items()},
+                "companions": {name: places.get(loc, loc) for name, loc in companions.items()},
+            }
+            companion_lat_lons = {name: known[loc] for name, loc in companions.items() if loc in known}
+            capacity = roster_capacity(st.session_state.drivers_from_edited)
+            if st.session_state.get("warm_start_from"):
+                events = warm_start.plan_warm_stream(locations, capacity)
+            else:
+                events = to_home_google_api.helper_stream(locations, capacity, hub_index=load_hub_index(), companion_lat_lons=companion_lat_lons)
+            st.session_state.solve_job_from = submit_solve("to_home", events, locations, capacity)
+        if st.session_state.get('solve_job_from'):
+            solve_progress('solve_job_from')
         st.markdown("</div>", unsafe_allow_html=True)
 
     st.markdown("---")
@@ -657,9 +730,21 @@ def display_results_to_office(locations: Dict[str, Any], assignments: Dict[str,
     st.subheader("🗺️ Optimized Routes Map")
     st.container(border=True).info("Below is the map visualizing the optimized routes. Drivers' paths are shown picking up companions and proceeding to the office.")
     
-    m = plot_to_office(locations, assignments, driver_paths)
-    if m is not None:
+    map_mode = "vector" if len(driver_paths) > VECTOR_MAP_DRIVER_THRESHOLD else "detailed"
+    map_key = artifact_store.plan_key("to_office", locations, assignments, driver_paths, map_mode)
+    cached_html = artifact_store.load_map_html(map_key)
+    m = None
+    if cached_html is None:
+        with profiling.profiled(st.session_state.get('run_id', map_key[:12]), 'map', enabled=st.session_state.get('profiling', False)):
+            m = plot_to_office(
+                locations, assignments, driver_paths, mode=map_mode, costs=st.session_state.get('cost_matrix'),
+                companion_lat_lons=st.session_state.get('companion_lat_lons')
+            )
+    if cached_html is not None:
+        components.html(cached_html, height=650) # Identical plan already rendered, serve it from the store
+    elif m is not None:
         st_folium(m, width=2000, height=650) # Increased map size
+        artifact_store.save_map(m, map_key)
     else:
         st.error("Map could not be generated. Ensure the `plot_to_office` function works correctly and returns a Folium map object.")
 
@@ -678,6 +763,8 @@ def display_results_to_office(locations: Dict[str, Any], assignments: Dict[str,
     else:
         st.warning("No carpooling assignments were generated. This might indicate that no suitable matches were found, or the algorithm encountered an issue.")
 
+    display_trip_times()
+
     st.markdown("---")
     st.subheader("⏱️ Algorithm Performance")
     st.write(f"**Time taken to run the optimization algorithm:** `{algorithm_time:.4f}` seconds")
@@ -692,9 +779,21 @@ def display_results_from_office(locations: Dict[str, Any], assignments: Dict[str
     st.subheader("🗺️ Optimized Routes Map")
     st.container(border=True).info("Below is the map visualizing the optimized routes. Drivers' paths are shown picking up from office and dropping off companions at their homes.")
     
-    m = plot_from_office(locations, assignments, driver_paths)
-    if m is not None:
+    map_mode = "vector" if len(driver_paths) > VECTOR_MAP_DRIVER_THRESHOLD else "detailed"
+    map_key = artifact_store.plan_key("to_home", locations, assignments, driver_paths, map_mode)
+    cached_html = artifact_store.load_map_html(map_key)
+    m = None
+    if cached_html is None:
+        with profiling.profiled(st.session_state.get('run_id', map_key[:12]), 'map', enabled=st.session_state.get('profiling', False)):
+            m = plot_from_office(
+                locations, assignments, driver_paths, mode=map_mode, costs=st.session_state.get('cost_matrix'),
+                companion_lat_lons=st.session_state.get('companion_lat_lons')
+            )
+    if cached_html is not None:
+        components.html(cached_html, height=650) # Identical plan already rendered, serve it from the store
+    elif m is not None:
         st_folium(m, width=2000, height=650) # Increased map size
+        artifact_store.save_map(m, map_key)
     else:
         st.error("Map could not be generated. Ensure the `plot_from_office` function works correctly and returns a Folium map object.")
 
@@ -713,11 +812,39 @@ def display_results_from_office(locations: Dict[str, Any], assignments: Dict[str
     else:
         st.warning("No carpooling assignments were generated. This might indicate that no suitable matches were found, or the algorithm encountered an issue.")
 
+    display_trip_times()
+
     st.markdown("---")
     st.subheader("⏱️ Algorithm Performance")
     st.write(f"**Time taken to run the optimization algorithm:** `{algorithm_time:.4f}` seconds")
     st.info("The algorithm's performance can vary based on the number of participants and the complexity of routes. This metric indicates the computational efficiency.")
 
+def display_trip_times():
+    """Shows each driver's full trip time with every pickup or drop-off, from the solve's waypoint evaluation."""
+    trip_times = st.session_state.get('trip_times')
+    if not trip_times:
+        return
+    st.markdown("---")
+    st.subheader("🕒 Trip Times")
+    rows = [
+        {
+            "Driver": driver,
+            "Stops (in order)": ", ".join(trip['stops']),
+            "Legs": " → ".join(text for text in trip['leg_text']),
+            "Total (min)": round(trip['total_min']),
+        }
+        for driver, trip in trip_times.items()
+    ]
+    st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+
+def admin_controls():
+    """Sidebar tools for the logged-in admin: opt-in profiling of solves and map rendering."""
+    with st.sidebar:
+        st.subheader("🛠️ Admin")
+        st.toggle("🔬 Profile solves and maps", key="profiling", help="Writes CPU samples (flamegraph-ready .folded), per-stage wall/CPU time and allocation stats under profiles/<run id>.")
+        if st.session_state.profiling and st.session_state.get('run_id'):
+            st.caption(f"Last run's profiles: `{profiling.profile_dir(st.session_state.run_id)}`")
+
 def navigation_buttons(back_target: str = None):
     """
     Displays navigation buttons for going back and logging out.
@@ -762,6 +889,9 @@ def main():
 
     initialize_session_state()
 
+    if st.session_state.logged_in:
+        admin_controls()
+
     # Define the page flow using session state
     if not st.session_state.logged_in:
         login_page()
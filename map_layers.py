@@ -0,0 +1,194 @@
+import json
+from typing import Dict, List, Tuple
+
+import folium
+import numpy as np
+from branca.element import MacroElement, Template
+from folium.plugins import FastMarkerCluster
+
+import polyline_codec
+
+MAX_ROUTE_VERTICES = 20000   # vertex budget for the detailed route layer, regardless of fleet size
+COARSE_FRACTION = 0.2        # share of that budget used by the zoomed-out layer
+DETAIL_ZOOM = 13             # zoom level at which the detailed layer replaces the coarse one
+COORD_DECIMALS = 5           # ~1 m precision is plenty for a route overview
+
+MARKER_KINDS = {'driver': 0, 'companion': 1, 'meeting': 2}
+
+# Rendered scripts pass through Jinja a second time and sit inside <script>, so braces and '<' in the
+# route strings (encoded polylines use '{' and '}') are written as JS unicode escapes
+SCRIPT_ESCAPES = str.maketrans({'{': '\\u007b', '}': '\\u007d', '<': '\\u003c'})
+
+# Draws every participant from compact [lat, lon, kind, label] rows instead of one folium.Marker each
+MARKER_CALLBACK = """
+function (row) {
+    var colors = ['blue', 'green', 'orange'];
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 6, color: colors[row[2]], fillColor: colors[row[2]], fillOpacity: 0.8, weight: 1
+    });
+    marker.bindTooltip(row[3]);
+    return marker;
+}
+"""
+
+# Builds one feature group from [encoded polyline, color, weight, dash, tooltip] rows, decoding in the browser
+ENCODED_ROUTES = """
+{% macro script(this, kwargs) %}
+var {{ this.get_name() }} = (function() {
+    function decode(str) {
+        var index = 0, lat = 0, lng = 0, points = [];
+        while (index < str.length) {
+            var deltas = [];
+            for (var k = 0; k < 2; k++) {
+                var shift = 0, result = 0, b;
+                do {
+                    b = str.charCodeAt(index++) - 63;
+                    result |= (b & 0x1f) << shift;
+                    shift += 5;
+                } while (b >= 0x20);
+                deltas.push((result & 1) ? ~(result >> 1) : (result >> 1));
+            }
+            lat += deltas[0];
+            lng += deltas[1];
+            points.push([lat / {{ this.factor }}, lng / {{ this.factor }}]);
+        }
+        return points;
+    }
+    var group = L.featureGroup();
+    {{ this.routes }}.forEach(function(row) {
+        L.polyline(decode(row[0]), {color: row[1], weight: row[2], opacity: 0.8, dashArray: row[3]})
+            .bindTooltip(row[4], {sticky: true})
+            .addTo(group);
+    });
+    return group;
+})();
+{% endmacro %}
+"""
+
+ZOOM_TOGGLE = """
+{% macro script(this, kwargs) %}
+(function() {
+    var map = {{ this.map_name }};
+    var coarse = {{ this.coarse_name }};
+    var fine = {{ this.fine_name }};
+    function update() {
+        var detailed = map.getZoom() >= {{ this.detail_zoom }};
+        var show = detailed ? fine : coarse;
+        var hide = detailed ? coarse : fine;
+        if (map.hasLayer(hide)) { map.removeLayer(hide); }
+        if (!map.hasLayer(show)) { map.addLayer(show); }
+    }
+    map.on('zoomend', update);
+    update();
+})();
+{% endmacro %}
+"""
+
+#*********************************** Simplification Functions ***************************************
+def simplify(coords: List[Tuple[float, float]], tolerance: float) -> np.ndarray:
+    """Douglas-Peucker simplification of a lat-lon polyline; tolerance is in degrees."""
+    points = np.asarray(coords, dtype=np.float64)
+    if len(points) <= 2 or tolerance <= 0:
+        return points
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return points[keep]
+
+def simplify_to_budget(paths: Dict[str, List[Tuple[float, float]]], max_vertices: int) -> Dict[str, np.ndarray]:
+    """Simplify all paths with one shared tolerance, coarsening until the total vertex count fits the budget."""
+    tolerance = 0.00001
+    while True:
+        simplified = {label: simplify(path, tolerance) for label, path in paths.items() if path}
+        if sum(len(path) for path in simplified.values()) <= max_vertices or tolerance > 1:
+            return simplified
+        tolerance *= 2
+
+#*********************************** Layer Functions ***************************************
+def encoded_routes(paths: Dict[str, np.ndarray], colors: Dict[str, str], walk_legs: List[Tuple[str, Tuple[float, float], Tuple[float, float]]]) -> List[List]:
+    """Every driver route and companion walking leg as [encoded polyline, color, weight, dash, tooltip] rows.
+
+    Encoded polylines are several times smaller than GeoJSON coordinate lists at the same ~1 m precision.
+    """
+    rows = [
+        [polyline_codec.encode(path, COORD_DECIMALS), colors[label], 4, None, f"{label}'s Route"]
+        for label, path in paths.items()
+    ]
+    rows.extend(
+        [polyline_codec.encode([start, end], COORD_DECIMALS), 'black', 2, '5', f"{companion} ↔ Meeting Point"]
+        for companion, start, end in walk_legs
+    )
+    return rows
+
+def route_layer(rows: List[List]) -> MacroElement:
+    """A single Leaflet feature group drawn from encoded_routes rows; the zoom toggle adds it to the map."""
+    layer = MacroElement()
+    layer._template = Template(ENCODED_ROUTES)
+    layer.routes = json.dumps(rows, ensure_ascii=False).translate(SCRIPT_ESCAPES)
+    layer.factor = 10 ** COORD_DECIMALS
+    return layer
+
+def add_vector_layers(
+    mymap: folium.Map,
+    driver_paths: Dict[str, List[Tuple[float, float]]],
+    companion_coords: Dict[str, Tuple[float, float]],
+    assignments: Dict[str, List[Tuple[str, Tuple[float, float]]]],
+    driver_end_index: int,
+    colors: List[str],
+    max_vertices: int = MAX_ROUTE_VERTICES
+) -> None:
+    """Render routes as zoom-dependent encoded-polyline layers and every participant through one marker cluster.
+
+    driver_end_index picks the driver's own end of each path for the driver marker: 0 for the start
+    (to office), -1 for the destination (from office).
+    """
+    route_colors = {driver: colors[i % len(colors)] for i, driver in enumerate(driver_paths)}
+    walk_legs = []
+    markers = []
+
+    for driver, coords in driver_paths.items():
+        if coords:
+            lat, lon = coords[driver_end_index]
+            markers.append([lat, lon, MARKER_KINDS['driver'], f"Driver: {driver}"])
+    for driver, companion_list in assignments.items():
+        for companion, meeting_point in companion_list:
+            if meeting_point is None:
+                continue
+            companion_coord = companion_coords[companion]
+            walk_legs.append((companion, companion_coord, meeting_point))
+            markers.append([companion_coord[0], companion_coord[1], MARKER_KINDS['companion'], f"Companion: {companion}"])
+            markers.append([meeting_point[0], meeting_point[1], MARKER_KINDS['meeting'], f"Meeting Point for {companion} ({driver})"])
+
+    fine = route_layer(encoded_routes(simplify_to_budget(driver_paths, max_vertices), route_colors, walk_legs))
+    coarse = route_layer(encoded_routes(simplify_to_budget(driver_paths, int(max_vertices * COARSE_FRACTION)), route_colors, walk_legs))
+    mymap.add_child(fine)
+    mymap.add_child(coarse)
+
+    markers = [[round(lat, COORD_DECIMALS), round(lon, COORD_DECIMALS), kind, label] for lat, lon, kind, label in markers]
+    FastMarkerCluster(markers, callback=MARKER_CALLBACK, name="Participants").add_to(mymap)
+
+    toggle = MacroElement()
+    toggle._template = Template(ZOOM_TOGGLE)
+    toggle.map_name = mymap.get_name()
+    toggle.coarse_name = coarse.get_name()
+    toggle.fine_name = fine.get_name()
+    toggle.detail_zoom = DETAIL_ZOOM
+    mymap.add_child(toggle)
@@ -0,0 +1,177 @@
+import random
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import constraints as constraints_mod
+import cost_matrix
+import scoring
+
+UNASSIGNED_PENALTY_KM = 100.0   # objective cost of leaving a rider without a seat; larger than any walk (kept above 10x the costliest pair)
+DESTROY_FRACTION = 0.2          # share of seated riders removed by one destroy-and-repair move
+CURVE_POINTS = 200              # improvement curve samples kept in the metrics
+
+#*********************************** Cost Matrix Functions ***************************************
+def feasible_costs(matrix: Dict, constraints: Dict = None, weights: Dict[str, float] = None, driver_paths: Dict = None):
+    """Weighted pair cost (scoring.pair_costs) per rider and driver from the cost matrix, keeping only feasible pairs."""
+    scores = scoring.pair_costs(matrix, scoring.resolve_weights(weights), driver_paths)
+    costs = {}
+    nodes = {}
+    for position in np.flatnonzero(matrix['feasible']):
+        driver, companion = cost_matrix.pair(matrix, position)
+        distance = float(matrix['distance_km'][position])
+        if not constraints_mod.fits(constraints, driver, companion, distance, 0.0):
+            continue
+        costs.setdefault(companion, {})[driver] = float(scores[position])
+        nodes[(driver, companion)] = cost_matrix.node(matrix, position)
+    return costs, nodes
+
+def seat_limits(driver_capacity: Dict[str, int], constraints: Dict = None) -> Dict[str, int]:
+    """Seats each driver can fill, capped by how many stops fit in their detour budget."""
+    limits = {}
+    for driver, seats in driver_capacity.items():
+        if constraints:
+            max_detour = constraints_mod.limits_for(constraints, 'drivers', driver)['max_detour_min']
+            seats = min(seats, int(max_detour // constraints_mod.STOP_DWELL_MIN))
+        limits[driver] = max(seats, 0)
+    return limits
+
+#*********************************** Search Functions ***************************************
+def improve(
+    road_distances,
+    driver_capacity: Dict[str, int],
+    assignments: Dict[str, List[Tuple[str, Tuple[float, float]]]],
+    time_budget: float = 1.0,
+    constraints: Dict = None,
+    seed: int = 0,
+    weights: Dict[str, float] = None,
+    driver_paths: Dict = None
+):
+    """Anytime large-neighbourhood search over the cached cost matrix, starting from a greedy plan.
+
+    Moves are relocate (one rider to another driver or out of the plan), swap (two riders exchange
+    drivers) and destroy-and-repair (drop a share of riders, reinsert cheapest first). Each move is
+    scored by its objective delta only, so no route is recomputed. The objective is the matcher's
+    weighted objective (scoring.objective with weights; walk only by default) plus a penalty per
+    rider without a seat; moves that do not make it worse are kept. Its detour term reads each pair's
+    duration and distance from the matrix (scoring.entry_detours); driver_paths feeds the wait term.
+
+    road_distances may be a road-distances dict or a cost_matrix.
+    Returns (assignments, metrics) with the improvement curve as (seconds, objective) points.
+    """
+    rng = random.Random(seed)
+    weights = scoring.resolve_weights(weights)
+    costs, nodes = feasible_costs(cost_matrix.ensure(road_distances), constraints, weights, driver_paths)
+    limits = seat_limits(driver_capacity, constraints)
+    penalty = max([UNASSIGNED_PENALTY_KM] + [10 * cost for options in costs.values() for cost in options.values()])
+
+    seat_of = {}
+    load = {driver: 0 for driver in driver_capacity}
+    for driver, pairs in assignments.items():
+        for companion, _ in pairs:
+            if companion in costs and driver in costs[companion]:
+                seat_of[companion] = driver
+                load[driver] = load.get(driver, 0) + 1
+    riders = sorted(costs)
+
+    def rider_cost(companion, driver):
+        return penalty if driver is None else costs[companion][driver]
+
+    def balance(driver, riders_seated):
+        return float(scoring.balance_cost(riders_seated, driver_capacity.get(driver, 0), weights))
+
+    def load_delta(driver, change):
+        """Balance cost change of adding (1) or removing (-1) one rider from a driver."""
+        return 0.0 if driver is None else balance(driver, load[driver] + change) - balance(driver, load[driver])
+
+    def has_room(driver):
+        return load[driver] < limits.get(driver, 0)
+
+    objective = sum(rider_cost(companion, seat_of.get(companion)) for companion in riders)
+    objective += sum(balance(driver, seats) for driver, seats in load.items())
+    started = time.perf_counter()
+    curve = [(0.0, objective)]
+    initial = objective
+    tried = accepted = 0
+
+    while riders and time.perf_counter() - started < time_budget:
+        tried += 1
+        move = rng.random()
+        if move < 0.45:
+            # Relocate: one rider to another driver with a free seat, or out of the plan
+            companion = rng.choice(riders)
+            current = seat_of.get(companion)
+            options = [driver for driver in costs[companion] if driver != current and has_room(driver)]
+            if not options:
+                continue
+            target = rng.choice(options)
+            delta = costs[companion][target] - rider_cost(companion, current) + load_delta(target, 1) + load_delta(current, -1)
+            if delta <= 0:
+                if current is not None:
+                    load[current] -= 1
+                load[target] += 1
+                seat_of[companion] = target
+                objective += delta
+                accepted += 1
+        elif move < 0.9:
+            # Swap: two seated riders exchange drivers
+            first, second = rng.choice(riders), rng.choice(riders)
+            a, b = seat_of.get(first), seat_of.get(second)
+            if a is None or b is None or a == b or b not in costs[first] or a not in costs[second]:
+                continue
+            delta = costs[first][b] + costs[second][a] - costs[first][a] - costs[second][b]
+            if delta <= 0:
+                seat_of[first], seat_of[second] = b, a
+                objective += delta
+                accepted += 1
+        else:
+            # Destroy and repair: unseat a random share of riders and reinsert them cheapest first
+            removed = rng.sample(riders, max(1, int(len(riders) * DESTROY_FRACTION)))
+            before = {companion: seat_of.get(companion) for companion in removed}
+            touched = dict(load)
+            delta = 0.0
+            for companion in removed:
+                if before[companion] is not None:
+                    load[before[companion]] -= 1
+                    del seat_of[companion]
+            for companion in sorted(removed, key=lambda c: min(costs[c].values())):
+                options = [driver for driver in costs[companion] if has_room(driver)]
+                target = min(options, key=lambda driver: costs[companion][driver] + load_delta(driver, 1)) if options else None
+                if target is not None:
+                    load[target] += 1
+                    seat_of[companion] = target
+                delta += rider_cost(companion, target) - rider_cost(companion, before[companion])
+            delta += sum(balance(driver, load[driver]) - balance(driver, seats) for driver, seats in touched.items() if load[driver] != seats)
+            if delta <= 0:
+                objective += delta
+                accepted += 1
+            else:
+                for companion in removed:
+                    if companion in seat_of:
+                        load[seat_of.pop(companion)] -= 1
+                for companion, driver in before.items():
+                    if driver is not None:
+                        seat_of[companion] = driver
+                        load[driver] += 1
+        if objective < curve[-1][1]:
+            curve.append((time.perf_counter() - started, objective))
+
+    improved = {driver: [] for driver in driver_capacity}
+    for companion in riders:
+        driver = seat_of.get(companion)
+        if driver is not None:
+            improved[driver].append((companion, nodes[(driver, companion)]))
+
+    seconds = time.perf_counter() - started
+    step = max(1, len(curve) // CURVE_POINTS)
+    metrics = {
+        'initial_objective': initial,
+        'final_objective': objective,
+        'moves_tried': tried,
+        'moves_accepted': accepted,
+        'moves_per_second': tried / seconds if seconds else 0.0,
+        'seconds': seconds,
+        'curve': curve[::step] + ([curve[-1]] if (len(curve) - 1) % step else []),
+    }
+    return improved, metrics
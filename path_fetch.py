@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import http_client
+import polyline_codec
+import road_graph
+
+FETCH_WORKERS = 16                                                  # Directions requests in flight at once
+DECODE_BATCH_CHARS = 20000                                          # encoded characters decoded together while requests are still in flight
+DIRECTIONS_URL = "https://maps.googleapis.com/maps/api/directions/json"
+
+#*********************************** Stage Functions ***************************************
+def fetch_route(origin: str, destination: str, api_key: str) -> Tuple[str, float]:
+    """I/O stage: one Directions request, returning the encoded overview polyline and the route's first-leg distance.
+
+    With a compiled road graph configured (see road_graph) the route is computed locally instead.
+    """
+    if road_graph.available():
+        path, km, _ = road_graph.directions(origin, destination, api_key)
+        return polyline_codec.encode(path), round(km, 1)
+    directions = http_client.get_json(DIRECTIONS_URL, {'origin': origin, 'destination': destination, 'key': api_key})
+    route = directions['routes'][0]
+    distance = route['legs'][0]['distance']['text']
+    return route['overview_polyline']['points'], float(distance.split()[0])
+
+def decode_batch(encoded: List[str]) -> List[np.ndarray]:
+    """CPU stage: decode polylines into (n, 2) float64 arrays in one vectorized pass (see polyline_codec)."""
+    coords, offsets = polyline_codec.decode_many(encoded)
+    return [coords[offsets[i]:offsets[i + 1]] for i in range(len(encoded))]
+
+#*********************************** Pipeline Functions ***************************************
+def pack(labels: List[str], arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Concatenate decoded paths into the shared_store layout: one coords array plus offsets in label order."""
+    offsets = np.zeros(len(labels) + 1, dtype=np.int64)
+    np.cumsum([len(arrays[label]) for label in labels], out=offsets[1:])
+    coords = np.concatenate([arrays[label] for label in labels]) if labels else np.empty((0, 2), dtype=np.float64)
+    return {'coords': coords, 'offsets': offsets}
+
+def fetch_paths(
+    routes: Dict[str, Tuple[str, str]],
+    api_key: str,
+    fetch_workers: int = FETCH_WORKERS
+) -> Tuple[List[str], Dict[str, np.ndarray], Dict[str, float]]:
+    """Fetch and decode one route per label ({label: (origin, destination)}) with the two stages overlapped.
+
+    Finished downloads are decoded in batches on the calling thread while the remaining requests are
+    still outstanding; vectorized decoding is far cheaper than shipping batches to another process.
+    Returns the label order, the packed path store (see pack) and each route's distance in km.
+    """
+    labels = list(routes)
+    arrays, distances = {}, {}
+    batch_labels, batch, batch_chars = [], [], 0
+
+    def flush():
+        nonlocal batch_labels, batch, batch_chars
+        if batch:
+            arrays.update(zip(batch_labels, decode_batch(batch)))
+        batch_labels, batch, batch_chars = [], [], 0
+
+    if labels:
+        with ThreadPoolExecutor(max_workers=max(1, min(fetch_workers, len(labels)))) as executor:
+            fetching = {http_client.submit(executor, fetch_route, origin, destination, api_key): label for label, (origin, destination) in routes.items()}
+            for future in as_completed(fetching):
+                http_client.check_cancelled()
+                label = fetching[future]
+                encoded, distances[label] = future.result()
+                batch_labels.append(label)
+                batch.append(encoded)
+                batch_chars += len(encoded)
+                if batch_chars >= DECODE_BATCH_CHARS:
+                    flush()
+        flush()
+    return labels, pack(labels, arrays), distances
+
+def path_lists(labels: List[str], store: Dict[str, np.ndarray]) -> Dict[str, List[Tuple[float, float]]]:
+    """Expand the packed store back into the {label: [(lat, lon), ...]} shape the matchers use."""
+    coords = store['coords'].tolist()
+    offsets = store['offsets'].tolist()
+    return {label: [tuple(point) for point in coords[offsets[i]:offsets[i + 1]]] for i, label in enumerate(labels)}
@@ -0,0 +1,408 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+import http_client
+import path_fetch
+import replay
+import shared_store
+import to_home_google_api
+import to_office_google_api
+
+api_key = to_home_google_api.api_key
+
+GEOCODE_WORKERS = 16    # concurrent geocoding requests while sharding
+PATH_STORE = 'paths'    # shared-memory store holding every driver's decoded route
+
+#*********************************** Sharding Functions ***************************************
+def get_offices(locations: Dict[str, Union[str, Dict[str, str]]]) -> Dict[str, str]:
+    """Return the office label -> address mapping, accepting the single 'office' layout as well."""
+    if 'offices' in locations:
+        return dict(locations['offices'])
+    return {'office': locations['office']}
+
+def geocode_all(places: Dict[str, str], max_workers: int = GEOCODE_WORKERS) -> Dict[str, Tuple[float, float]]:
+    """Geocode label -> address concurrently, once per distinct address."""
+    addresses = list(dict.fromkeys(places.values()))
+    if not addresses:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(addresses))) as executor:
+        futures = [http_client.submit(executor, to_home_google_api.get_lat_lon, address, api_key) for address in addresses]
+        lat_lons = dict(zip(addresses, (future.result() for future in futures)))
+    return {label: lat_lons[place] for label, place in places.items()}
+
+def bearing(origin: Tuple[float, float], point: Tuple[float, float]) -> float:
+    """Initial bearing in degrees (0-360) from origin to point."""
+    lat1, lat2 = to_home_google_api.deg2rad(origin[0]), to_home_google_api.deg2rad(point[0])
+    dLon = to_home_google_api.deg2rad(point[1] - origin[1])
+    x = math.sin(dLon) * math.cos(lat2)
+    y = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dLon)
+    return (math.degrees(math.atan2(x, y)) + 360) % 360
+
+def assign_offices(
+    locations: Dict[str, Union[str, Dict[str, str]]],
+    office_lat_lons: Dict[str, Tuple[float, float]],
+    participant_lat_lons: Dict[str, Tuple[float, float]]
+) -> Dict[str, str]:
+    """Map every driver and companion to an office, using 'office_of' when given and the aerially nearest office otherwise."""
+    office_of = dict(locations.get('office_of', {}))
+    for name in list(locations['drivers']) + list(locations['companions']):
+        if office_of.get(name) in office_lat_lons:
+            continue
+        lat, lon = participant_lat_lons[name]
+        office_of[name] = min(
+            office_lat_lons,
+            key=lambda office: to_home_google_api.calculate_aerial_distance(lat, lon, *office_lat_lons[office])
+        )
+    return office_of
+
+def split_into_clusters(
+    names: List[str],
+    office_lat_lon: Tuple[float, float],
+    participant_lat_lons: Dict[str, Tuple[float, float]],
+    num_clusters: int
+) -> Dict[str, int]:
+    """Split participants of one office into angular sectors of roughly equal size around the office."""
+    if num_clusters <= 1 or len(names) <= 1:
+        return {name: 0 for name in names}
+
+    by_bearing = sorted(names, key=lambda name: bearing(office_lat_lon, participant_lat_lons[name]))
+    # Start the sweep at the widest angular gap so a sector never straddles a dense direction.
+    bearings = [bearing(office_lat_lon, participant_lat_lons[name]) for name in by_bearing]
+    gaps = [(bearings[(i + 1) % len(bearings)] - bearings[i]) % 360 for i in range(len(bearings))]
+    start = (gaps.index(max(gaps)) + 1) % len(by_bearing)
+    by_bearing = by_bearing[start:] + by_bearing[:start]
+
+    size = math.ceil(len(by_bearing) / num_clusters)
+    return {name: i // size for i, name in enumerate(by_bearing)}
+
+def build_shards(
+    locations: Dict[str, Union[str, Dict[str, str]]],
+    capacity: Dict[str, int],
+    clusters_per_office: int = 1,
+    lat_lons: Dict[str, Tuple[float, float]] = None
+) -> List[Dict]:
+    """Partition the roster into independent (office, cluster) sub-problems, each with its members' coordinates.
+
+    lat_lons holds participant coordinates the caller already has (e.g. roster.lat_lons); only the rest are geocoded.
+    """
+    offices = get_offices(locations)
+    multi_office = len(offices) > 1
+    participants = {**locations['drivers'], **locations['companions']}
+
+    # Every participant is geocoded once here; shards carry the coordinates so workers never geocode again
+    known = {name: lat_lon for name, lat_lon in (lat_lons or {}).items() if name in participants}
+    participant_lat_lons = {**geocode_all({name: place for name, place in participants.items() if name not in known}), **known}
+    office_lat_lons = {}
+    if multi_office or clusters_per_office > 1:
+        office_lat_lons = geocode_all(offices)
+
+    if multi_office:
+        office_of = assign_offices(locations, office_lat_lons, participant_lat_lons)
+    else:
+        office_of = {name: next(iter(offices)) for name in participants}
+
+    shards = {}
+    for office, address in offices.items():
+        members = [name for name in participants if office_of[name] == office]
+        if clusters_per_office > 1:
+            cluster_of = split_into_clusters(members, office_lat_lons[office], participant_lat_lons, clusters_per_office)
+        else:
+            cluster_of = {name: 0 for name in members}
+
+        for name in members:
+            shard = shards.setdefault((office, cluster_of[name]), {
+                'office': office,
+                'cluster': cluster_of[name],
+                'locations': {'office': address, 'drivers': {}, 'companions': {}},
+                'capacity': {},
+                'lat_lons': {},
+            })
+            shard['lat_lons'][name] = participant_lat_lons[name]
+            if name in locations['drivers']:
+                shard['locations']['drivers'][name] = locations['drivers'][name]
+                shard['capacity'][name] = capacity.get(name, 0)
+            else:
+                shard['locations']['companions'][name] = locations['companions'][name]
+
+    return list(shards.values())
+
+#*********************************** Path Store Functions ***************************************
+def fetch_driver_paths(direction: str, shards: List[Dict]) -> Tuple[Dict[str, int], Dict[str, np.ndarray]]:
+    """Fetch every driver's route once, in the parent, as one packed store plus driver -> row index.
+
+    The store is the path_fetch.pack layout with each route's distance added as 'distance_km'.
+    """
+    routes = {}
+    for shard in shards:
+        office = shard['locations']['office']
+        for driver, place in shard['locations']['drivers'].items():
+            routes[driver] = (office, place) if direction == 'to_home' else (place, office)
+    labels, store, distances = path_fetch.fetch_paths(routes, api_key)
+    store['distance_km'] = np.array([distances[label] for label in labels], dtype=np.float64)
+    return {label: i for i, label in enumerate(labels)}, store
+
+def shard_driver_paths(direction: str, store: Dict[str, np.ndarray], path_index: Dict[str, int], drivers) -> Dict:
+    """Driver paths of one shard from the packed store, in the shape the direction's helper takes."""
+    driver_paths = {}
+    for driver in drivers:
+        i = path_index[driver]
+        path = [tuple(point) for point in store['coords'][store['offsets'][i]:store['offsets'][i + 1]].tolist()]
+        driver_paths[driver] = (path, float(store['distance_km'][i])) if direction == 'to_home' else path
+    return driver_paths
+
+#*********************************** Solve Functions ***************************************
+def solve_shard(
+    direction: str,
+    shard_locations: Dict[str, Union[str, Dict[str, str]]],
+    shard_capacity: Dict[str, int],
+    constraints: Dict = None,
+    lat_lons: Dict[str, Tuple[float, float]] = None,
+    path_index: Dict[str, int] = None,
+    paths: Dict[str, np.ndarray] = None
+):
+    """Solve one shard with the existing single-office helper; runs inside a worker process.
+
+    lat_lons holds the coordinates build_shards already geocoded. Driver routes are read from paths, or
+    in a worker from the shared PATH_STORE plan_stream published, at the rows path_index gives; without
+    either the helpers fetch them. Returns (assignments, driver_paths, road_distances, timings).
+    """
+    if not shard_locations['drivers'] or not shard_locations['companions']:
+        return {driver: [] for driver in shard_locations['drivers']}, {}, {}, {}
+    companion_lat_lons = None
+    if lat_lons is not None:
+        companion_lat_lons = {name: lat_lons[name] for name in shard_locations['companions']}
+    paths = paths if paths is not None else shared_store.get_shared(PATH_STORE)
+    driver_paths = None
+    if paths is not None and path_index is not None:
+        driver_paths = shard_driver_paths(direction, paths, path_index, shard_locations['drivers'])
+
+    if direction == 'to_home':
+        events = to_home_google_api.helper_stream(
+            shard_locations, shard_capacity, constraints, companion_lat_lons=companion_lat_lons, driver_paths=driver_paths
+        )
+        done = next(event for event in events if event['type'] == 'done')
+        return done['assignments'], done['driver_paths'], done['road_distances'], done['timings']
+
+    # to_office_google_api.helper picks one companion per call, so each companion is scored on its own
+    # against the routes of the drivers that still have a seat, which are fetched at most once.
+    if companion_lat_lons is None:
+        companion_lat_lons = {name: to_office_google_api.get_lat_lon(place, api_key) for name, place in shard_locations['companions'].items()}
+    if driver_paths is None:
+        driver_paths = to_office_google_api.find_best_paths(shard_locations)
+    assignments = {driver: [] for driver in shard_locations['drivers']}
+    road_distances = {}
+    timings = {}
+    for companion, place in shard_locations['companions'].items():
+        open_drivers = {
+            driver: driver_place for driver, driver_place in shard_locations['drivers'].items()
+            if len(assignments[driver]) < shard_capacity.get(driver, 0)
+        }
+        if not open_drivers:
+            break
+        single = {**shard_locations, 'drivers': open_drivers, 'companions': {companion: place}}
+        open_paths = {driver: driver_paths[driver] for driver in open_drivers if driver in driver_paths}
+        events = to_office_google_api.helper_stream(single, constraints, {companion: companion_lat_lons[companion]}, open_paths)
+        done = next(event for event in events if event['type'] == 'done')
+        road_distances.update(done['road_distances'])
+        add_timings(timings, done['timings'])
+        for driver, pairs in done['assignments'].items():
+            if driver is not None:
+                assignments[driver].extend(pairs)
+    return assignments, driver_paths, road_distances, timings
+
+def add_timings(total: Dict[str, float], timings: Dict[str, float]) -> None:
+    """Sum per-stage seconds into a running total."""
+    for stage, seconds in (timings or {}).items():
+        total[stage] = total.get(stage, 0.0) + seconds
+
+def merge_shard(office_plan, shard, assignments, driver_paths, road_distances=None, timings=None) -> None:
+    """Fold one solved shard into its office plan, keeping driver capacity intact."""
+    office_assignments = office_plan['assignments']
+    for driver, pairs in assignments.items():
+        seats = office_assignments.setdefault(driver, [])
+        for companion, node in pairs:
+            if len(seats) < shard['capacity'].get(driver, 0) and companion not in office_plan['assigned']:
+                seats.append((companion, node))
+                office_plan['assigned'].add(companion)
+    office_plan['driver_paths'].update(driver_paths)
+    office_plan['road_distances'].update(road_distances or {})
+    add_timings(office_plan['timings'], timings)
+
+def reconcile(
+    direction: str,
+    office_plan,
+    office_address: str,
+    shards: List[Dict],
+    constraints: Dict = None,
+    path_index: Dict[str, int] = None,
+    paths: Dict[str, np.ndarray] = None
+) -> None:
+    """Re-solve companions left unassigned by their shard against spare seats anywhere in the same office."""
+    drivers = {}
+    companions = {}
+    spare = {}
+    lat_lons = {}
+    for shard in shards:
+        lat_lons.update(shard['lat_lons'])
+        for companion, place in shard['locations']['companions'].items():
+            if companion not in office_plan['assigned']:
+                companions[companion] = place
+        for driver, place in shard['locations']['drivers'].items():
+            seats = shard['capacity'].get(driver, 0) - len(office_plan['assignments'].get(driver, []))
+            if seats > 0:
+                drivers[driver] = place
+                spare[driver] = seats
+
+    if not companions or not drivers:
+        return
+
+    residual = {'office': office_address, 'drivers': drivers, 'companions': companions}
+    assignments, driver_paths, road_distances, timings = solve_shard(direction, residual, spare, constraints, lat_lons, path_index, paths)
+    office_plan['road_distances'].update(road_distances)
+    add_timings(office_plan['timings'], timings)
+    for driver, pairs in assignments.items():
+        added = 0
+        for companion, node in pairs:
+            if added < spare.get(driver, 0) and companion not in office_plan['assigned']:
+                office_plan['assignments'].setdefault(driver, []).append((companion, node))
+                office_plan['assigned'].add(companion)
+                added += 1
+    for driver, path in driver_paths.items():
+        office_plan['driver_paths'].setdefault(driver, path)
+
+def plan(
+    locations: Dict[str, Union[str, Dict[str, str]]],
+    capacity: Dict[str, int],
+    direction: str = 'to_home',
+    clusters_per_office: int = 1,
+    max_workers: int = None,
+    constraints: Dict = None,
+    lat_lons: Dict[str, Tuple[float, float]] = None
+) -> Dict[str, Tuple[Dict, Dict, Dict]]:
+    """Shard the roster by office (and optional cluster), solve shards in a process pool and merge per office.
+
+    Every driver route is fetched once in the parent and published to the workers through shared
+    memory (see shared_store); workers attach to it read-only instead of fetching their own.
+
+    Returns office label -> (locations, assignments, driver_paths), the same triple `helper` returns,
+    so every office plan can be plotted and displayed as before. constraints (see constraints.py) is
+    applied inside every shard and during reconciliation. lat_lons skips geocoding the participants it covers.
+    """
+    results = {}
+    for event in plan_stream(locations, capacity, direction, clusters_per_office, max_workers, constraints, lat_lons):
+        if event['type'] == 'done':
+            results[event['office']] = (event['locations'], event['assignments'], event['driver_paths'])
+    return results
+
+def plan_stream(
+    locations: Dict[str, Union[str, Dict[str, str]]],
+    capacity: Dict[str, int],
+    direction: str = 'to_home',
+    clusters_per_office: int = 1,
+    max_workers: int = None,
+    constraints: Dict = None,
+    lat_lons: Dict[str, Tuple[float, float]] = None
+):
+    """Generator form of plan that emits results as soon as each shard is solved.
+
+    Yields {'type': 'shard', 'office', 'cluster'} when a shard finishes, followed by one
+    {'type': 'assignment', 'office', 'driver', 'companions', 'path'} per driver of that shard. The
+    reconciliation pass may add riders to a driver already emitted; it re-emits that driver, so
+    consumers should treat assignment events as upserts. Each office closes with a {'type': 'done',
+    'office', 'locations', 'assignments', 'driver_paths', 'road_distances', 'companion_lat_lons',
+    'timings'} event, the fields run_store.save_run persists; timings sum the office's shards.
+    """
+    offices = get_offices(locations)
+    started = time.perf_counter()
+    shards = build_shards(locations, capacity, clusters_per_office, lat_lons)
+    sharding_seconds = time.perf_counter() - started
+    plans = {
+        office: {'assignments': {}, 'driver_paths': {}, 'assigned': set(), 'road_distances': {}, 'timings': {'sharding': sharding_seconds}}
+        for office in offices
+    }
+
+    # Largest shards first so the slowest work starts immediately and wall time tracks the largest shard.
+    shards.sort(key=lambda shard: len(shard['locations']['drivers']) * len(shard['locations']['companions']), reverse=True)
+    workers = min(max_workers or os.cpu_count() or 1, max(len(shards), 1))
+
+    started = time.perf_counter()
+    path_index, paths = fetch_driver_paths(direction, shards)
+    for office_plan in plans.values():
+        office_plan['timings']['driver_paths'] = time.perf_counter() - started
+    # Recorded and replayed calls live in this process's archive state (see replay.py), so while either
+    # mode is active shards run on threads here, reading the parent's path store directly
+    in_process = replay.mode() != 'live'
+    segments = []
+    if in_process:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='planner-shard')
+    else:
+        handles = {}
+        handles[PATH_STORE], segments = shared_store.share_arrays(paths)
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=shared_store.init_worker, initargs=(handles,))
+
+    try:
+        with executor:
+            futures = {}
+            for shard in shards:
+                args = (direction, shard['locations'], shard['capacity'], constraints, shard['lat_lons'], path_index)
+                if in_process:
+                    futures[http_client.submit(executor, solve_shard, *args, paths)] = shard
+                else:
+                    futures[executor.submit(solve_shard, *args)] = shard
+            for future in as_completed(futures):
+                shard = futures[future]
+                office_plan = plans[shard['office']]
+                merge_shard(office_plan, shard, *future.result())
+
+                yield {'type': 'shard', 'office': shard['office'], 'cluster': shard['cluster']}
+                for driver in shard['locations']['drivers']:
+                    yield {
+                        'type': 'assignment',
+                        'office': shard['office'],
+                        'driver': driver,
+                        'companions': list(office_plan['assignments'].get(driver, [])),
+                        'path': office_plan['driver_paths'].get(driver, []),
+                    }
+    finally:
+        shared_store.release(segments)
+
+    for office, address in offices.items():
+        office_shards = [shard for shard in shards if shard['office'] == office]
+        office_plan = plans[office]
+        seats_before = {driver: len(pairs) for driver, pairs in office_plan['assignments'].items()}
+        reconcile(direction, office_plan, address, office_shards, constraints, path_index, paths)
+
+        for driver, pairs in office_plan['assignments'].items():
+            if len(pairs) != seats_before.get(driver, 0):
+                yield {
+                    'type': 'assignment',
+                    'office': office,
+                    'driver': driver,
+                    'companions': list(pairs),
+                    'path': office_plan['driver_paths'].get(driver, []),
+                }
+
+        office_locations = {'office': address, 'drivers': {}, 'companions': {}}
+        for shard in office_shards:
+            office_locations['drivers'].update(shard['locations']['drivers'])
+            office_locations['companions'].update(shard['locations']['companions'])
+        for driver in office_locations['drivers']:
+            office_plan['assignments'].setdefault(driver, [])
+        yield {
+            'type': 'done',
+            'office': office,
+            'locations': office_locations,
+            'assignments': office_plan['assignments'],
+            'driver_paths': office_plan['driver_paths'],
+            'road_distances': office_plan['road_distances'],
+            'companion_lat_lons': {
+                name: lat_lon for shard in office_shards for name, lat_lon in shard['lat_lons'].items()
+                if name in shard['locations']['companions']
+            },
+            'timings': office_plan['timings'],
+        }
@@ -1,14 +1,17 @@
 
 import streamlit as st
 import folium
-import requests
 import os
 from dotenv import load_dotenv
-import polyline
 import folium
 from folium.plugins import BeautifyIcon, MarkerCluster
 from branca.element import Template, MacroElement
 
+import cost_matrix
+import http_client
+import map_layers
+import polyline_codec
+
 # Load API Key from environment variables
 load_dotenv()
 api_key = st.secrets['api_key']
@@ -19,9 +22,7 @@ def get_lat_lon(address, api_key):
     """
     url = "https://maps.googleapis.com/maps/api/geocode/json"
     params = {'address': address, 'key': api_key}
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    result = response.json()
+    result = http_client.get_json(url, params)
     location = result['results'][0]['geometry']['location']
     return (location['lat'], location['lng'])
 
@@ -40,25 +41,33 @@ def get_directions(origin, destination, api_key, mode='walking'):
         'key': api_key,
         'mode': mode
     }
-    response = requests.get(url, params=params)
-    
-    directions = response.json()
+    directions = http_client.get_json(url, params)
     
     # Check for successful response and routes
     if directions['status'] == 'OK' and directions['routes']:
         polyline_str = directions['routes'][0]['overview_polyline']['points']
-        decoded_points = polyline.decode(polyline_str)
+        decoded_points = polyline_codec.to_points(polyline_codec.decode(polyline_str))
         return decoded_points
     else:
         # Handle cases where no route is found or API call fails
         print(f"Error fetching directions: {directions['status']}")
         return None
 
-def plot(locations, assignments, driver_paths):
+def plot(locations, assignments, driver_paths, mode='detailed', costs=None, companion_lat_lons=None):
+    """
+    Plots driver routes, companions and meeting points on a folium map.
+    mode='vector' ships the simplified routes as encoded polylines that the browser decodes into
+    canvas layers, plus one marker cluster, which keeps the page payload bounded for large fleets and
+    skips the per-companion walking-directions calls (see map_layers).
+    costs is the solve's cost_matrix; when given, meeting-point tooltips read distance and duration from it
+    instead of querying Directions again. companion_lat_lons is the solve's companion coordinates; companions
+    it covers are placed without geocoding them again.
+    """
 
     office_coords = get_lat_lon(locations["office"], api_key)
+    known = companion_lat_lons or {}
     companion_coords = {
-        companion: get_lat_lon(address, api_key)
+        companion: tuple(known[companion]) if companion in known else get_lat_lon(address, api_key)
         for companion, address in locations["companions"].items()
     }
 
@@ -75,59 +84,66 @@ def plot(locations, assignments, driver_paths):
     # Color palette
     colors = ['blue', 'green', 'purple', 'orange', 'darkred', 'cadetblue']
 
-    # Plot driver paths
-    for i, (driver, coords) in enumerate(driver_paths.items()):
-        color = colors[i % len(colors)]
-        folium.PolyLine(coords, color=color, weight=5, opacity=0.8, tooltip=f"{driver}'s Route").add_to(mymap)
-        folium.Marker(
-            coords[-1],
-            popup=f"Driver: {driver}",
-            tooltip=f"{driver} destination",
-            icon=BeautifyIcon(icon_shape='marker', border_color=color, text_color=color, number=i+1)
-        ).add_to(mymap)
-
-    # Marker cluster for companions
-    companion_cluster = MarkerCluster(name="Companions").add_to(mymap)
-
-    # Plot companion paths and meeting points
-    for driver, companion_list in assignments.items():
-        for companion, meeting_point in companion_list:
-            companion_coord = companion_coords[companion]
-            path = get_directions(companion_coord, meeting_point, api_key)
-            if path:
-                folium.PolyLine(path, color='black', weight=3, opacity=0.6, dash_array='5').add_to(mymap)
-
-            # Get distance and duration
-            url = "https://maps.googleapis.com/maps/api/directions/json"
-            params = {
-                'origin': f"{meeting_point[0]},{meeting_point[1]}",
-                'destination': f"{companion_coord[0]},{companion_coord[1]}",
-                'key': api_key,
-                'mode': 'walking'
-            }
-            response = requests.get(url, params=params).json()
-            if response['status'] == 'OK':
-                leg = response['routes'][0]['legs'][0]
-                distance = leg['distance']['text']
-                duration = leg['duration']['text']
-                tooltip_text = f"{companion} → Meeting Point\n{distance}, {duration}"
-            else:
-                tooltip_text = f"{companion} → Meeting Point"
-
-            folium.Marker(
-                companion_coord,
-                popup=f"Companion: {companion}",
-                tooltip=f"{companion}'s destination",
-                icon=folium.Icon(color='green', icon='user', prefix='fa')
-            ).add_to(companion_cluster)
-
+    if mode == 'vector':
+        map_layers.add_vector_layers(mymap, driver_paths, companion_coords, assignments, driver_end_index=-1, colors=colors)
+    else:
+        # Plot driver paths
+        for i, (driver, coords) in enumerate(driver_paths.items()):
+            color = colors[i % len(colors)]
+            folium.PolyLine(coords, color=color, weight=5, opacity=0.8, tooltip=f"{driver}'s Route").add_to(mymap)
             folium.Marker(
-                meeting_point,
-                popup=f"Droping Point for {companion}",
-                tooltip=tooltip_text,
-                icon=folium.Icon(color='orange', icon='flag', prefix='fa')
+                coords[-1],
+                popup=f"Driver: {driver}",
+                tooltip=f"{driver} destination",
+                icon=BeautifyIcon(icon_shape='marker', border_color=color, text_color=color, number=i+1)
             ).add_to(mymap)
 
+        # Marker cluster for companions
+        companion_cluster = MarkerCluster(name="Companions").add_to(mymap)
+
+        # Plot companion paths and meeting points
+        for driver, companion_list in assignments.items():
+            for companion, meeting_point in companion_list:
+                companion_coord = companion_coords[companion]
+                path = get_directions(companion_coord, meeting_point, api_key)
+                if path:
+                    folium.PolyLine(path, color='black', weight=3, opacity=0.6, dash_array='5').add_to(mymap)
+
+                # Get distance and duration
+                cost = cost_matrix.lookup(costs, driver, companion) if costs is not None else None
+                if cost is not None and cost[1]:
+                    tooltip_text = f"{companion} → Meeting Point\n{cost[0]:.1f} km, {cost[1]}"
+                else:
+                    url = "https://maps.googleapis.com/maps/api/directions/json"
+                    params = {
+                        'origin': f"{meeting_point[0]},{meeting_point[1]}",
+                        'destination': f"{companion_coord[0]},{companion_coord[1]}",
+                        'key': api_key,
+                        'mode': 'walking'
+                    }
+                    response = http_client.get_json(url, params)
+                    if response['status'] == 'OK':
+                        leg = response['routes'][0]['legs'][0]
+                        distance = leg['distance']['text']
+                        duration = leg['duration']['text']
+                        tooltip_text = f"{companion} → Meeting Point\n{distance}, {duration}"
+                    else:
+                        tooltip_text = f"{companion} → Meeting Point"
+
+                folium.Marker(
+                    companion_coord,
+                    popup=f"Companion: {companion}",
+                    tooltip=f"{companion}'s destination",
+                    icon=folium.Icon(color='green', icon='user', prefix='fa')
+                ).add_to(companion_cluster)
+
+                folium.Marker(
+                    meeting_point,
+                    popup=f"Droping Point for {companion}",
+                    tooltip=tooltip_text,
+                    icon=folium.Icon(color='orange', icon='flag', prefix='fa')
+                ).add_to(mymap)
+
     # Add layer control
     folium.LayerControl().add_to(mymap)
 
@@ -159,6 +175,5 @@ def plot(locations, assignments, driver_paths):
     legend._template = Template(legend_html)
     mymap.get_root().add_child(legend)
 
-    mymap.save('map.html')
-    print("The paths have been plotted and saved to map.html.")
+    # The map stays in memory; callers persist it explicitly through artifact_store.save_map
     return mymap
@@ -0,0 +1,74 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+PRECISION = 5   # Google's encoded polyline precision (1e-5 degrees)
+
+#*********************************** Decoding Functions ***************************************
+def decode_many(encoded: Sequence[str], precision: int = PRECISION) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode many encoded polylines in one vectorized pass.
+
+    Returns (coords, offsets) in the shared_store layout: an (n, 2) float64 array of every point and
+    int64 offsets so that polyline i is coords[offsets[i]:offsets[i + 1]].
+    """
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    raw = np.frombuffer(''.join(encoded).encode('ascii'), dtype=np.uint8).astype(np.int64) - 63
+    if not len(raw):
+        return np.empty((0, 2), dtype=np.float64), offsets
+
+    # Every value is a run of 5-bit chunks; the 0x20 bit is set on all chunks but the last
+    ends = np.flatnonzero((raw & 0x20) == 0)
+    if ends[-1] != len(raw) - 1:
+        raise ValueError("Truncated encoded polyline")
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    chunk_position = np.arange(len(raw)) - np.repeat(starts, ends - starts + 1)
+    values = np.add.reduceat((raw & 0x1f) << (5 * chunk_position), starts)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+
+    # Split values back into polylines by where each string ends in the joined buffer
+    string_ends = np.cumsum([len(points) for points in encoded])
+    value_counts = np.diff(np.searchsorted(ends, string_ends, side='left'), prepend=0)
+    if np.any(value_counts % 2):
+        raise ValueError("Encoded polyline with an odd number of values")
+    np.cumsum(value_counts // 2, out=offsets[1:])
+
+    # Points are running sums of deltas that restart at each polyline
+    totals = np.cumsum(deltas.reshape(-1, 2), axis=0)
+    counts = np.diff(offsets)
+    base = np.zeros((len(encoded), 2), dtype=np.int64)
+    nonempty = offsets[:-1] > 0
+    base[nonempty] = totals[offsets[:-1][nonempty] - 1]
+    totals -= np.repeat(base, counts, axis=0)
+    return totals / 10 ** precision, offsets
+
+def decode(encoded: str, precision: int = PRECISION) -> np.ndarray:
+    """Decode one encoded polyline into an (n, 2) float64 array of (lat, lon)."""
+    return decode_many([encoded], precision)[0]
+
+def to_points(coords: np.ndarray) -> List[Tuple[float, float]]:
+    """An (n, 2) array as the list of (lat, lon) tuples the matchers and folium use."""
+    return [tuple(point) for point in np.asarray(coords).tolist()]
+
+#*********************************** Encoding Functions ***************************************
+def encode(coords, precision: int = PRECISION) -> str:
+    """Encode (lat, lon) points (array or list of tuples) as a Google encoded polyline string."""
+    scaled = np.asarray(coords, dtype=np.float64).reshape(-1, 2) * 10 ** precision
+    # Round half away from zero, as the reference encoder does
+    ints = np.trunc(scaled + np.copysign(0.5, scaled)).astype(np.int64)
+    deltas = np.diff(ints, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    if not len(values):
+        return ''
+
+    chunks = np.ones(len(values), dtype=np.int64)
+    rest = values >> 5
+    while np.any(rest):
+        chunks += rest > 0
+        rest >>= 5
+    owner = np.repeat(np.arange(len(values)), chunks)
+    position = np.arange(int(chunks.sum())) - np.repeat(np.cumsum(chunks) - chunks, chunks)
+    out = (values[owner] >> (5 * position)) & 0x1f
+    out |= (position < chunks[owner] - 1) << 5
+    return (out + 63).astype(np.uint8).tobytes().decode('ascii')
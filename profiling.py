@@ -0,0 +1,145 @@
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator
+
+PROFILE_DIR = os.getenv('CARPOOL_PROFILE_DIR', 'profiles')
+SAMPLE_INTERVAL = float(os.getenv('CARPOOL_PROFILE_INTERVAL', '0.005'))   # seconds between stack samples
+TOP_ALLOCATIONS = 25                                                      # tracemalloc sites kept per profile
+TRACEMALLOC_FRAMES = 8                                                    # traceback depth recorded per allocation
+
+# tracemalloc is process-wide: overlapping profiles share one tracing session, and the last one out stops it
+_tracing_lock = threading.Lock()
+_tracing = {'users': 0, 'owned': False}
+
+#*********************************** Sampling Functions ***************************************
+def folded_stack(frame, thread_name: str) -> str:
+    """One stack in collapsed format (root first, ';'-separated), as flamegraph.pl and speedscope read it."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ';'.join(reversed(names))
+
+def _sample(target: int, preexisting: set, stop: threading.Event, counts: Counter, interval: float) -> None:
+    # Samples the profiled thread plus every thread started after profiling began (fetch and trip pools),
+    # so other sessions' solves running in the same process stay out of the profile
+    own = threading.get_ident()
+    while not stop.wait(interval):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (ident != target and ident in preexisting):
+                continue
+            counts[folded_stack(frame, names.get(ident, str(ident)))] += 1
+
+def _start_tracing() -> int:
+    # Returns the traced bytes at entry: a baseline for this profile's peak, since peaks can no longer be reset
+    with _tracing_lock:
+        if _tracing['users'] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            _tracing['owned'] = True
+        _tracing['users'] += 1
+        return tracemalloc.get_traced_memory()[0]
+
+def _stop_tracing(baseline: int) -> Dict:
+    with _tracing_lock:
+        current, peak = tracemalloc.get_traced_memory()
+        stats = {
+            'current_bytes': current, 'peak_bytes': peak, 'growth_bytes': current - baseline,
+            'shared_session': _tracing['users'] > 1, 'top': allocation_stats(tracemalloc.take_snapshot()),
+        }
+        _tracing['users'] -= 1
+        if _tracing['users'] == 0 and _tracing['owned']:
+            tracemalloc.stop()
+            _tracing['owned'] = False
+    return stats
+
+#*********************************** Profile Functions ***************************************
+def profile_dir(run_id: str) -> str:
+    return os.path.join(PROFILE_DIR, run_id)
+
+def allocation_stats(snapshot: tracemalloc.Snapshot, limit: int = TOP_ALLOCATIONS) -> list:
+    """Top allocation sites by size from a tracemalloc snapshot."""
+    snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)))
+    return [
+        {'site': str(stat.traceback[0]), 'size_bytes': stat.size, 'count': stat.count}
+        for stat in snapshot.statistics('lineno')[:limit]
+    ]
+
+def write_profile(run_id: str, name: str, counts: Counter, report: Dict) -> str:
+    """Write <name>.folded (CPU samples) and <name>.json (timings, stages, allocations) under the run's profile dir."""
+    directory = profile_dir(run_id)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{name}.folded"), 'w') as f:
+        for stack, samples in counts.most_common():
+            f.write(f"{stack} {samples}\n")
+    with open(os.path.join(directory, f"{name}.json"), 'w') as f:
+        json.dump(report, f, indent=2)
+    return directory
+
+@contextmanager
+def profiled(run_id: str, name: str, enabled: bool = True, interval: float = SAMPLE_INTERVAL):
+    """Profile the enclosed block: stack samples, wall vs CPU time and tracemalloc top sites.
+
+    Yields the report dict (callers may add to it, e.g. per-stage timings) or None when disabled.
+    Overlapping profiles share tracemalloc, so peak_bytes then covers every traced session.
+    Results are written to PROFILE_DIR/<run_id>/<name>.folded and .json when the block exits.
+    """
+    if not enabled:
+        yield None
+        return
+
+    counts = Counter()
+    stop = threading.Event()
+    preexisting = {thread.ident for thread in threading.enumerate()}
+    sampler = threading.Thread(
+        target=_sample, args=(threading.get_ident(), preexisting, stop, counts, interval),
+        name='carpool-profiler', daemon=True
+    )
+    baseline = _start_tracing()
+    report = {'run_id': run_id, 'name': name, 'sample_interval': interval, 'stages': {}}
+    wall, cpu, process_cpu = time.perf_counter(), time.thread_time(), time.process_time()
+    sampler.start()
+    try:
+        yield report
+    finally:
+        stop.set()
+        sampler.join()
+        report['wall_seconds'] = time.perf_counter() - wall
+        report['cpu_seconds'] = time.thread_time() - cpu
+        report['process_cpu_seconds'] = time.process_time() - process_cpu
+        report['samples'] = sum(counts.values())
+        report['allocations'] = _stop_tracing(baseline)
+        write_profile(run_id, name, counts, report)
+
+def profile_stream(events: Iterable[Dict], run_id: str, name: str = 'solve', interval: float = SAMPLE_INTERVAL) -> Iterator[Dict]:
+    """Pass a helper event stream through unchanged while profiling it.
+
+    Wall, thread CPU and process CPU time spent producing each event are summed per stage (the stage
+    event that ends the work, or 'assignment' and 'done'); the closing event carries the profile dir.
+    """
+    with profiled(run_id, name, interval=interval) as report:
+        iterator = iter(events)
+        while True:
+            wall, cpu, process_cpu = time.perf_counter(), time.thread_time(), time.process_time()
+            try:
+                event = next(iterator)
+            except StopIteration:
+                break
+            stage = report['stages'].setdefault(
+                event['stage'] if event['type'] == 'stage' else event['type'],
+                {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'process_cpu_seconds': 0.0}
+            )
+            stage['wall_seconds'] += time.perf_counter() - wall
+            stage['cpu_seconds'] += time.thread_time() - cpu
+            stage['process_cpu_seconds'] += time.process_time() - process_cpu
+            if event['type'] == 'done':
+                event['profile'] = profile_dir(run_id)
+            yield event
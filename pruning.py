@@ -0,0 +1,135 @@
+import bisect
+import math
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320
+
+CORRIDOR_BUFFER_KM = 2.0   # how far off the driver's polyline a companion may be
+ALONG_ROUTE_OFFSETS_KM = (-0.5, -0.25, 0.25, 0.5)   # meeting points tried up and down the route from the nearest point
+CORRIDOR_CHUNK = 1 << 20   # point-segment distances computed per NumPy pass, bounding temporary memory
+
+#*********************************** Geometry Helpers ***************************************
+def project(lat_lons: np.ndarray, ref_lat: float) -> np.ndarray:
+    """Project an (n, 2) lat-lon array onto a local plane in kilometers (equirectangular)."""
+    return np.column_stack((lat_lons[:, 1] * KM_PER_DEG_LON * math.cos(math.radians(ref_lat)), lat_lons[:, 0] * KM_PER_DEG_LAT))
+
+def corridor_mask(points: np.ndarray, path_xy: np.ndarray, buffer_km: float) -> np.ndarray:
+    """Which projected points of an (n, 2) array lie within buffer_km of a projected (m, 2) polyline, all at once.
+
+    Point-to-segment distances are broadcast over every (point, segment) pair, in chunks of points
+    so at most CORRIDOR_CHUNK distances are held at a time.
+    """
+    if len(path_xy) == 1:
+        return np.hypot(points[:, 0] - path_xy[0, 0], points[:, 1] - path_xy[0, 1]) <= buffer_km
+    ax, ay = path_xy[:-1, 0], path_xy[:-1, 1]
+    dx, dy = path_xy[1:, 0] - ax, path_xy[1:, 1] - ay
+    length_sq = dx * dx + dy * dy
+    length_sq[length_sq == 0] = np.inf   # zero-length segments project onto their start (t = 0)
+    hits = np.zeros(len(points), dtype=bool)
+    step = max(1, CORRIDOR_CHUNK // len(ax))
+    for start in range(0, len(points), step):
+        rx = points[start:start + step, 0, None] - ax
+        ry = points[start:start + step, 1, None] - ay
+        t = np.clip((rx * dx + ry * dy) / length_sq, 0.0, 1.0)
+        rx -= t * dx
+        ry -= t * dy
+        hits[start:start + step] = (rx * rx + ry * ry <= buffer_km * buffer_km).any(axis=1)
+    return hits
+
+def haversine_km(lat_lon: Tuple[float, float], points: np.ndarray) -> np.ndarray:
+    """Great-circle distance in kilometers from one point to every row of an (n, 2) lat-lon array."""
+    lat1, lon1 = np.radians(lat_lon[0]), np.radians(lat_lon[1])
+    lat2, lon2 = np.radians(points[:, 0]), np.radians(points[:, 1])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def cumulative_km(path: List[Tuple[float, float]]) -> List[float]:
+    """Distance along a path in kilometers at each of its points (0 at the first point)."""
+    points = np.asarray(path, dtype=np.float64).reshape(-1, 2)
+    lat1, lat2 = np.radians(points[:-1, 0]), np.radians(points[1:, 0])
+    dLat = lat2 - lat1
+    dLon = np.radians(points[1:, 1] - points[:-1, 1])
+    a = np.sin(dLat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dLon / 2) ** 2
+    steps = 6371 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return np.concatenate(([0.0], np.cumsum(steps))).tolist()
+
+def along_route_indices(cumulative: List[float], index: int, offsets_km=ALONG_ROUTE_OFFSETS_KM) -> List[int]:
+    """Path indices closest to each along-route offset from path[index], found by binary search on cumulative km."""
+    indices = []
+    for offset in offsets_km:
+        target = cumulative[index] + offset
+        if target < 0 or target > cumulative[-1]:
+            continue
+        i = bisect.bisect_left(cumulative, target)
+        if i > 0 and (i == len(cumulative) or target - cumulative[i - 1] <= cumulative[i] - target):
+            i -= 1
+        if i != index and i not in indices:
+            indices.append(i)
+    return indices
+
+def route_candidates(path: List[Tuple[float, float]], cumulative: List[float], distances: List[float], count: int = 5) -> List[Tuple[Tuple[float, float], float]]:
+    """Candidate meeting points for one companion: the nearest path point plus points at fixed offsets along the route.
+
+    distances holds the companion's aerial distance to every path point. Offsets that fall off the path
+    or onto the same point are topped up with the next aerially nearest points, so count stays fixed.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    nearest = int(np.argmin(distances))
+    chosen = [nearest] + along_route_indices(cumulative, nearest)[:count - 1]
+    if len(chosen) < count:
+        for i in np.argsort(distances, kind='stable').tolist():
+            if i not in chosen:
+                chosen.append(i)
+            if len(chosen) == count:
+                break
+    return sorted(((path[i], float(distances[i])) for i in chosen), key=lambda node: node[1])
+
+def route_profile(path: List[Tuple[float, float]], ref_lat: float, buffer_km: float) -> Dict:
+    """Precompute the projected polyline (an (m, 2) array) and its buffered bounding box for one driver."""
+    path_xy = project(np.asarray(path, dtype=np.float64).reshape(-1, 2), ref_lat)
+    low = path_xy.min(axis=0) - buffer_km
+    high = path_xy.max(axis=0) + buffer_km
+    return {
+        'path_xy': path_xy,
+        'bbox': (low[0], low[1], high[0], high[1]),
+    }
+
+#*********************************** Pruning Functions ***************************************
+def prune_driver_companion_pairs(
+    driver_paths: Dict[str, List[Tuple[float, float]]],
+    companion_lat_lons: Dict[str, Tuple[float, float]],
+    buffer_km: float = CORRIDOR_BUFFER_KM
+) -> Set[Tuple[str, str]]:
+    """Drop driver-companion pairs that cannot meet, before any per-point distance scoring.
+
+    A pair is kept when the companion lies within buffer_km of the driver's polyline. Per driver, the
+    buffered route bounding box masks the companion array first, so only the companions inside it reach
+    the vectorized segment test (see corridor_mask). Routes may bend, so the corridor alone decides; no
+    overall direction of travel is assumed.
+    """
+    all_points = [lat_lon for path in driver_paths.values() for lat_lon in path[:1]] + list(companion_lat_lons.values())
+    if not all_points:
+        return set()
+    ref_lat = sum(lat for lat, _ in all_points) / len(all_points)
+
+    names = list(companion_lat_lons)
+    companion_xy = project(np.asarray(list(companion_lat_lons.values()), dtype=np.float64).reshape(-1, 2), ref_lat)
+    plausible = set()
+
+    for driver_label, path in driver_paths.items():
+        if not path:
+            continue
+        profile = route_profile(path, ref_lat, buffer_km)
+        min_x, min_y, max_x, max_y = profile['bbox']
+        inside = np.flatnonzero(
+            (companion_xy[:, 0] >= min_x) & (companion_xy[:, 0] <= max_x) & (companion_xy[:, 1] >= min_y) & (companion_xy[:, 1] <= max_y)
+        )
+        if not len(inside):
+            continue
+        hits = inside[corridor_mask(companion_xy[inside], profile['path_xy'], buffer_km)]
+        plausible.update((driver_label, names[i]) for i in hits.tolist())
+
+    return plausible
@@ -0,0 +1,143 @@
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+import requests
+
+MODE = os.getenv('CARPOOL_HTTP_MODE', 'live')                          # live, record or replay
+ARCHIVE_PATH = os.getenv('CARPOOL_HTTP_ARCHIVE', 'recordings/session.jsonl.gz')
+REPLAY_LATENCY = os.getenv('CARPOOL_REPLAY_LATENCY', 'original')      # original sleeps as long as the recorded call took; zero never sleeps
+SECRET_PARAMS = ('key',)                                               # never written to an archive or part of a request's identity
+
+# Recorded failures are raised again on replay with the same requests exception type
+ERRORS = {
+    'Timeout': requests.exceptions.Timeout,
+    'ConnectionError': requests.exceptions.ConnectionError,
+    'HTTPError': requests.exceptions.HTTPError,
+    'InvalidJSONError': requests.exceptions.InvalidJSONError,
+}
+
+_lock = threading.Lock()
+_state = {'mode': 'live', 'path': None, 'latency': REPLAY_LATENCY, 'entries': [], 'responses': {}, 'served': {}}
+
+#*********************************** Archive Functions ***************************************
+def request_key(url: str, params: Dict = None) -> str:
+    """Identity of a request: the URL plus its parameters in sorted order, without the API key."""
+    visible = sorted((name, str(value)) for name, value in (params or {}).items() if name not in SECRET_PARAMS)
+    return hashlib.sha256(json.dumps([url, visible]).encode('utf-8')).hexdigest()[:32]
+
+def write_archive(entries, path: str) -> None:
+    """Write recorded exchanges as gzip-compressed JSON lines, atomically."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+    os.replace(tmp_path, path)
+
+def read_archive(path: str) -> Dict[str, list]:
+    """Recorded exchanges grouped by request key, in the order they were made."""
+    responses = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            entry = json.loads(line)
+            responses.setdefault(entry['key'], []).append(entry)
+    return responses
+
+#*********************************** Mode Functions ***************************************
+def mode() -> str:
+    return _state['mode']
+
+def start_recording(path: str = ARCHIVE_PATH) -> None:
+    """Capture every request and response from now on; stop() writes them to path."""
+    with _lock:
+        _state.update(mode='record', path=path, entries=[])
+
+def start_replay(path: str = ARCHIVE_PATH, latency: str = REPLAY_LATENCY) -> None:
+    """Serve requests from a recorded archive instead of the network."""
+    if latency not in ('original', 'zero'):
+        raise ValueError(f"latency must be 'original' or 'zero', got {latency!r}")
+    responses = read_archive(path)
+    with _lock:
+        _state.update(mode='replay', path=path, latency=latency, responses=responses, served={})
+
+def stop() -> str:
+    """Return to live mode, writing the archive if recording; returns the archive path or None."""
+    with _lock:
+        mode, path, entries = _state['mode'], _state['path'], _state['entries']
+        _state.update(mode='live', path=None, entries=[], responses={}, served={})
+    if mode == 'record':
+        write_archive(entries, path)
+        return path
+    return None
+
+@contextmanager
+def recording(path: str = ARCHIVE_PATH):
+    start_recording(path)
+    try:
+        yield path
+    finally:
+        stop()
+
+@contextmanager
+def replaying(path: str = ARCHIVE_PATH, latency: str = REPLAY_LATENCY):
+    start_replay(path, latency)
+    try:
+        yield path
+    finally:
+        stop()
+
+#*********************************** Transport Functions ***************************************
+def _record(url: str, params: Dict, fetch: Callable[[], Dict]) -> Dict:
+    started = time.perf_counter()
+    entry = {'key': request_key(url, params), 'url': url, 'params': {name: value for name, value in (params or {}).items() if name not in SECRET_PARAMS}}
+    try:
+        entry['body'] = fetch()
+        return entry['body']
+    except requests.exceptions.RequestException as exc:
+        entry['error'] = next((name for name, kind in ERRORS.items() if isinstance(exc, kind)), 'ConnectionError')
+        entry['message'] = str(exc)
+        raise
+    finally:
+        entry['seconds'] = round(time.perf_counter() - started, 4)
+        with _lock:
+            _state['entries'].append(entry)
+
+def _replay(url: str, params: Dict) -> Dict:
+    key = request_key(url, params)
+    with _lock:
+        recorded = _state['responses'].get(key)
+        if not recorded:
+            raise requests.exceptions.ConnectionError(f"No recorded response for {url} in {_state['path']}")
+        # Repeats of a request are served in recorded order; the last answer repeats after that
+        served = _state['served'].get(key, 0)
+        _state['served'][key] = served + 1
+        entry = recorded[min(served, len(recorded) - 1)]
+        latency = _state['latency']
+    if latency == 'original':
+        time.sleep(entry['seconds'])
+    if 'error' in entry:
+        raise ERRORS[entry['error']](entry['message'])
+    return entry['body']
+
+def intercept(url: str, params: Dict, fetch: Callable[[], Dict]) -> Dict:
+    """Route one API call through the active mode: live calls fetch(), record wraps it, replay never calls it."""
+    mode = _state['mode']
+    if mode == 'replay':
+        return _replay(url, params)
+    if mode == 'record':
+        return _record(url, params, fetch)
+    return fetch()
+
+# CARPOOL_HTTP_MODE switches a whole process (app, CLI or worker) without code changes
+if MODE == 'record':
+    start_recording(ARCHIVE_PATH)
+    atexit.register(stop)
+elif MODE == 'replay':
+    start_replay(ARCHIVE_PATH, REPLAY_LATENCY)
@@ -0,0 +1,263 @@
+import argparse
+import heapq
+import os
+import re
+import struct
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import http_client
+
+MAGIC = b'CPRG'
+VERSION = 2
+ALIGNMENT = 64
+WALKING_KMPH = 5.0   # walking legs are routed by length over the graph and timed at this pace
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+# Section order and dtypes of the compiled artifact; every section is a flat little-endian array
+SECTIONS = [
+    ('node_ids', '<i8'),
+    ('node_lat', '<f8'),
+    ('node_lon', '<f8'),
+    ('indptr', '<i8'),
+    ('indices', '<i4'),
+    ('weights', '<f4'),
+    ('lengths', '<f4'),
+]
+HEADER = struct.Struct('<4sIQQ' + 'Q' * len(SECTIONS))
+
+# Graphs loaded by this process, keyed by artifact path
+_loaded = {}
+
+#*********************************** Artifact Functions ***************************************
+def graph_to_csr(graph, weight: str = 'travel_time') -> Dict[str, np.ndarray]:
+    """Flatten an osmnx/networkx road graph into CSR adjacency with one weight and length per edge.
+
+    Parallel edges of a MultiDiGraph collapse to the cheapest one. Falls back to 'length'
+    when the graph has no travel-time attribute; lengths are in meters.
+    """
+    node_ids = np.fromiter(graph.nodes, dtype=np.int64, count=graph.number_of_nodes())
+    index_of = {node: i for i, node in enumerate(node_ids.tolist())}
+
+    cheapest = {}
+    for u, v, data in graph.edges(data=True):
+        cost = data.get(weight, data.get('length', 1.0))
+        key = (index_of[u], index_of[v])
+        if key not in cheapest or cost < cheapest[key][0]:
+            cheapest[key] = (cost, data.get('length', 0.0))
+
+    edges = sorted(cheapest.items())
+    sources = np.fromiter((u for (u, _), _ in edges), dtype=np.int64, count=len(edges))
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    np.add.at(indptr, sources + 1, 1)
+    np.cumsum(indptr, out=indptr)
+
+    return {
+        'node_ids': node_ids,
+        'node_lat': np.array([graph.nodes[node]['y'] for node in node_ids.tolist()], dtype=np.float64),
+        'node_lon': np.array([graph.nodes[node]['x'] for node in node_ids.tolist()], dtype=np.float64),
+        'indptr': indptr,
+        'indices': np.fromiter((v for (_, v), _ in edges), dtype=np.int32, count=len(edges)),
+        'weights': np.fromiter((cost for _, (cost, _) in edges), dtype=np.float32, count=len(edges)),
+        'lengths': np.fromiter((length for _, (_, length) in edges), dtype=np.float32, count=len(edges)),
+    }
+
+def section_length(name: str, num_nodes: int, num_edges: int) -> int:
+    """Number of elements in a section for a graph of the given size."""
+    if name in ('node_ids', 'node_lat', 'node_lon'):
+        return num_nodes
+    if name == 'indptr':
+        return num_nodes + 1
+    return num_edges
+
+def compile_graph(graph, path: str) -> str:
+    """Write a road graph (networkx graph or graph_to_csr arrays) as a flat binary artifact."""
+    arrays = graph if isinstance(graph, dict) else graph_to_csr(graph)
+    num_nodes = len(arrays['node_ids'])
+    num_edges = len(arrays['indices'])
+
+    offsets = []
+    position = HEADER.size
+    for name, dtype in SECTIONS:
+        position += -position % ALIGNMENT
+        offsets.append(position)
+        position += section_length(name, num_nodes, num_edges) * np.dtype(dtype).itemsize
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, num_nodes, num_edges, *offsets))
+        for (name, dtype), offset in zip(SECTIONS, offsets):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+    os.replace(tmp_path, path)
+    return path
+
+def compile_from_place(place: str, path: str, network_type: str = 'drive') -> str:
+    """Download a drivable OSM graph with osmnx, add travel times and compile it."""
+    import osmnx as ox
+
+    graph = ox.graph_from_place(place, network_type=network_type)
+    graph = ox.routing.add_edge_speeds(graph)
+    graph = ox.routing.add_edge_travel_times(graph)
+    return compile_graph(graph, path)
+
+def load_graph(path: str) -> Dict[str, np.ndarray]:
+    """Memory-map a compiled artifact; only the header is read, sections are paged in on use."""
+    with open(path, 'rb') as f:
+        magic, version, num_nodes, num_edges, *offsets = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a compiled road graph (version {VERSION}).")
+
+    return {
+        name: np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(section_length(name, num_nodes, num_edges),))
+        for (name, dtype), offset in zip(SECTIONS, offsets)
+    }
+
+def graph_path() -> str:
+    """The compiled artifact routing should use (CARPOOL_GRAPH_PATH), or None when unset or missing."""
+    path = os.getenv('CARPOOL_GRAPH_PATH')
+    return path if path and os.path.exists(path) else None
+
+def available() -> bool:
+    """Whether routes come from the local road graph instead of the Directions API."""
+    return graph_path() is not None
+
+def get_graph(path: str = None) -> Dict[str, np.ndarray]:
+    """Graph arrays for routing from the (cached) memory-mapped artifact; processes share its pages through the OS."""
+    path = path or graph_path()
+    if not path:
+        raise ValueError("No road graph available. Set CARPOOL_GRAPH_PATH to a compiled graph artifact.")
+    if path not in _loaded:
+        _loaded[path] = load_graph(path)
+    return _loaded[path]
+
+#*********************************** Routing Functions ***************************************
+def nearest_node(graph: Dict[str, np.ndarray], lat: float, lon: float) -> int:
+    """Index of the graph node closest to a latitude-longitude point."""
+    scale = np.cos(np.radians(lat))
+    d2 = (graph['node_lat'] - lat) ** 2 + ((graph['node_lon'] - lon) * scale) ** 2
+    return int(np.argmin(d2))
+
+def travel_times_from(graph: Dict[str, np.ndarray], source: int, targets: List[int] = None) -> Dict[int, float]:
+    """Single-source Dijkstra over the CSR arrays; stops early once every target is settled."""
+    indptr, indices, weights = graph['indptr'], graph['indices'], graph['weights']
+    remaining = set(targets) if targets is not None else None
+    best = {source: 0.0}
+    settled = {}
+    heap = [(0.0, source)]
+
+    while heap:
+        cost, node = heapq.heappop(heap)
+        if node in settled:
+            continue
+        settled[node] = cost
+        if remaining is not None:
+            remaining.discard(node)
+            if not remaining:
+                break
+        start, end = int(indptr[node]), int(indptr[node + 1])
+        for neighbour, weight in zip(indices[start:end].tolist(), weights[start:end].tolist()):
+            new_cost = cost + weight
+            if new_cost < best.get(neighbour, float('inf')):
+                best[neighbour] = new_cost
+                heapq.heappush(heap, (new_cost, neighbour))
+
+    if targets is None:
+        return settled
+    return {target: settled.get(target, float('inf')) for target in targets}
+
+def shortest_path(graph: Dict[str, np.ndarray], source: int, target: int, weight: str = 'weights') -> Tuple[float, List[int]]:
+    """Cheapest path between two node indices as (cost, node indices); weight='lengths' gives the shortest in meters."""
+    indptr, indices, weights = graph['indptr'], graph['indices'], graph[weight]
+    best = {source: 0.0}
+    previous = {}
+    settled = set()
+    heap = [(0.0, source)]
+
+    while heap:
+        cost, node = heapq.heappop(heap)
+        if node in settled:
+            continue
+        settled.add(node)
+        if node == target:
+            path = [node]
+            while path[-1] != source:
+                path.append(previous[path[-1]])
+            return cost, path[::-1]
+        start, end = int(indptr[node]), int(indptr[node + 1])
+        for neighbour, weight in zip(indices[start:end].tolist(), weights[start:end].tolist()):
+            new_cost = cost + weight
+            if new_cost < best.get(neighbour, float('inf')):
+                best[neighbour] = new_cost
+                previous[neighbour] = node
+                heapq.heappush(heap, (new_cost, neighbour))
+
+    return float('inf'), []
+
+def edge_sum(graph: Dict[str, np.ndarray], nodes: List[int], section: str) -> float:
+    """Sum one edge section along consecutive path nodes."""
+    total = 0.0
+    for u, v in zip(nodes, nodes[1:]):
+        start, end = int(graph['indptr'][u]), int(graph['indptr'][u + 1])
+        edge = start + int(np.flatnonzero(graph['indices'][start:end] == v)[0])
+        total += float(graph[section][edge])
+    return total
+
+def route(
+    graph: Dict[str, np.ndarray],
+    origin: Tuple[float, float],
+    destination: Tuple[float, float],
+    mode: str = 'driving'
+) -> Tuple[List[Tuple[float, float]], float, float]:
+    """Route between two latitude-longitude points as (path lat-lons, distance in km, duration in minutes).
+
+    Driving takes the fastest path; walking the shortest one, timed at WALKING_KMPH. The path is
+    empty when the graph does not connect the two points.
+    """
+    weight = 'lengths' if mode == 'walking' else 'weights'
+    cost, nodes = shortest_path(graph, nearest_node(graph, *origin), nearest_node(graph, *destination), weight)
+    if not nodes:
+        return [], float('inf'), float('inf')
+    path = [(float(graph['node_lat'][node]), float(graph['node_lon'][node])) for node in nodes]
+    km = (cost if mode == 'walking' else edge_sum(graph, nodes, 'lengths')) / 1000
+    minutes = km / WALKING_KMPH * 60 if mode == 'walking' else cost / 60
+    return path, km, minutes
+
+#*********************************** Backend Functions ***************************************
+def place_lat_lon(place, api_key: str) -> Tuple[float, float]:
+    """Coordinates of a place given as a (lat, lon) pair, a 'lat,lon' string or an address (geocoded)."""
+    if not isinstance(place, str):
+        return float(place[0]), float(place[1])
+    match = re.fullmatch(r'\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*', place)
+    if match:
+        return float(match.group(1)), float(match.group(2))
+    location = http_client.get_json(GEOCODE_URL, {'address': place, 'key': api_key})['results'][0]['geometry']['location']
+    return location['lat'], location['lng']
+
+def directions(origin, destination, api_key: str, mode: str = 'driving') -> Tuple[List[Tuple[float, float]], float, float]:
+    """Graph counterpart of a Directions request: (path, km, minutes), or ValueError when no route exists."""
+    path, km, minutes = route(get_graph(), place_lat_lon(origin, api_key), place_lat_lon(destination, api_key), mode)
+    if not path:
+        raise ValueError(f"No route from {origin} to {destination} in the road graph.")
+    return path, km, minutes
+
+def duration_text(minutes: float) -> str:
+    """Minutes formatted the way Directions reports durations, e.g. '1 hour 5 mins'."""
+    hours, mins = divmod(max(1, round(minutes)), 60)
+    text = f"{mins} min{'s' if mins != 1 else ''}"
+    if hours:
+        text = f"{hours} hour{'s' if hours != 1 else ''} {text}" if mins else f"{hours} hour{'s' if hours != 1 else ''}"
+    return text
+
+def main():
+    """Compile a road graph artifact for CARPOOL_GRAPH_PATH (offline stage)."""
+    parser = argparse.ArgumentParser(description="Download an OSM road graph and compile it for local routing.")
+    parser.add_argument('place', help="Area to download, e.g. 'Bangalore, India'.")
+    parser.add_argument('--out', default=os.getenv('CARPOOL_GRAPH_PATH', 'road_graph.bin'))
+    parser.add_argument('--network-type', default='drive')
+    args = parser.parse_args()
+    print(f"Road graph written to {compile_from_place(args.place, args.out, args.network_type)}")
+
+if __name__ == "__main__":
+    main()
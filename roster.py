@@ -0,0 +1,130 @@
+import os
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
+
+import pandas as pd
+
+import http_client
+import to_home_google_api
+
+GEOCODE_WORKERS = 16   # concurrent geocoding requests for the unique address set
+
+COLUMN_ALIASES = {
+    'participant': 'name', 'employee': 'name',
+    'type': 'role', 'kind': 'role',
+    'location': 'address', 'home': 'address', 'place': 'address',
+    'seats': 'capacity',
+}
+ROLE_ALIASES = {'driver': 'driver', 'drivers': 'driver', 'companion': 'companion', 'companions': 'companion', 'rider': 'companion', 'passenger': 'companion'}
+ABBREVIATIONS = {'stn': 'station', 'rd': 'road', 'st': 'street', 'blr': 'bangalore', 'bengaluru': 'bangalore'}
+
+#*********************************** Reading Functions ***************************************
+def read_roster(source) -> pd.DataFrame:
+    """Read a roster from a CSV/Excel path or an uploaded file into name, role, address, capacity columns."""
+    filename = source if isinstance(source, str) else getattr(source, 'name', '')
+    if os.path.splitext(filename)[1].lower() in ('.xlsx', '.xls'):
+        table = pd.read_excel(source, dtype=str)
+    else:
+        table = pd.read_csv(source, dtype=str, skipinitialspace=True)
+
+    table.columns = [COLUMN_ALIASES.get(column.strip().lower(), column.strip().lower()) for column in table.columns]
+    for column in ('name', 'role', 'address', 'capacity'):
+        if column not in table:
+            table[column] = None
+    return table[['name', 'role', 'address', 'capacity']]
+
+def normalize_address(address: str) -> str:
+    """Canonical form used to dedupe addresses: case, punctuation, spacing and common abbreviations."""
+    text = unicodedata.normalize('NFKC', str(address)).casefold()
+    text = re.sub(r'[^\w\s.]|(?<!\d)\.|\.(?!\d)', ' ', text)
+    return ' '.join(ABBREVIATIONS.get(word, word) for word in text.split())
+
+#*********************************** Geocoding Functions ***************************************
+def _geocode(address: str):
+    try:
+        return to_home_google_api.get_lat_lon(address, to_home_google_api.api_key), None
+    except Exception as exc:
+        return None, f"geocoding failed: {exc}"
+
+def geocode_unique(addresses: Dict[str, str], max_workers: int = GEOCODE_WORKERS) -> Dict[str, Tuple]:
+    """Geocode one representative address per normalized key concurrently; key -> ((lat, lon) or None, error)."""
+    keys = list(addresses)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(keys)))) as executor:
+        futures = [http_client.submit(executor, _geocode, addresses[key]) for key in keys]
+        return dict(zip(keys, (future.result() for future in futures)))
+
+#*********************************** Ingestion Functions ***************************************
+def ingest(source, default_capacity: int = 1, max_workers: int = GEOCODE_WORKERS) -> pd.DataFrame:
+    """Read, normalize, dedupe, geocode and validate a roster.
+
+    Returns a compact table with one row per participant: name, role (category), address,
+    address_key, capacity (int16), lat/lon (float64) and error (None for valid rows). Only the
+    unique normalized addresses are geocoded, so colleagues sharing a building cost one request.
+    """
+    table = source if isinstance(source, pd.DataFrame) else read_roster(source)
+    table = table.copy()
+    table['name'] = table['name'].fillna('').astype(str).str.strip()
+    table['address'] = table['address'].fillna('').astype(str).str.strip()
+    table['role'] = table['role'].fillna('').astype(str).str.strip().str.lower().map(ROLE_ALIASES)
+    capacity = pd.to_numeric(table['capacity'], errors='coerce')
+    given = table['capacity'].notna() & (table['capacity'].astype(str).str.strip() != '')
+    table['capacity'] = capacity.where(table['role'] == 'driver', 0).fillna(default_capacity).clip(lower=0).astype('int16')
+    table['address_key'] = table['address'].map(normalize_address)
+
+    errors = pd.Series(None, index=table.index, dtype=object)
+    errors[table['name'] == ''] = 'missing name'
+    errors[errors.isna() & (table['address'] == '')] = 'missing address'
+    errors[errors.isna() & table['role'].isna()] = 'unknown role'
+    errors[errors.isna() & (table['role'] == 'driver') & given & capacity.isna()] = 'invalid capacity'
+    errors[errors.isna() & table['name'].duplicated(keep='first')] = 'duplicate name'
+
+    pending = table[errors.isna()]
+    representatives = pending.groupby('address_key', sort=False)['address'].first().to_dict()
+    geocoded = geocode_unique(representatives, max_workers) if representatives else {}
+    table['lat'] = table['address_key'].map(lambda key: geocoded[key][0][0] if geocoded.get(key, (None,))[0] else float('nan')).astype('float64')
+    table['lon'] = table['address_key'].map(lambda key: geocoded[key][0][1] if geocoded.get(key, (None,))[0] else float('nan')).astype('float64')
+    failed = errors.isna() & table['lat'].isna()
+    errors[failed] = table.loc[failed, 'address_key'].map(lambda key: geocoded.get(key, (None, 'not geocoded'))[1])
+
+    table['error'] = errors
+    table['role'] = table['role'].astype(pd.CategoricalDtype(['driver', 'companion']))
+    return table[['name', 'role', 'address', 'address_key', 'capacity', 'lat', 'lon', 'error']].reset_index(drop=True)
+
+def summary(table: pd.DataFrame) -> Dict[str, int]:
+    """Counts for display: rows, valid drivers and companions, unique addresses geocoded, rejected rows."""
+    valid = table[table['error'].isna()]
+    return {
+        'rows': len(table),
+        'drivers': int((valid['role'] == 'driver').sum()),
+        'companions': int((valid['role'] == 'companion').sum()),
+        'unique_addresses': int(valid['address_key'].nunique()),
+        'rejected': int(table['error'].notna().sum()),
+    }
+
+def places(table: pd.DataFrame) -> Dict[str, str]:
+    """Address -> 'lat,lon' for the geocoded rows, so later solves can skip geocoding them again."""
+    valid = table[table['error'].isna()]
+    return dict(zip(valid['address'], valid['lat'].map('{:.6f}'.format) + ',' + valid['lon'].map('{:.6f}'.format)))
+
+def lat_lons(table: pd.DataFrame, key: str = 'name') -> Dict[str, Tuple[float, float]]:
+    """Name (or address, with key='address') -> (lat, lon) for the geocoded rows, so solves and maps reuse them."""
+    valid = table[table['error'].isna()]
+    return dict(zip(valid[key], zip(valid['lat'].astype(float), valid['lon'].astype(float))))
+
+def to_locations(table: pd.DataFrame, office: str) -> Tuple[Dict, Dict[str, int]]:
+    """The (locations, capacity) pair the helpers take, from the valid rows of an ingested roster.
+
+    Places are passed as 'lat,lon' so the solve routes from the already geocoded coordinates.
+    """
+    valid = table[table['error'].isna()]
+    places = valid['lat'].map('{:.6f}'.format) + ',' + valid['lon'].map('{:.6f}'.format)
+    drivers = valid['role'] == 'driver'
+    locations = {
+        'office': office,
+        'drivers': dict(zip(valid.loc[drivers, 'name'], places[drivers])),
+        'companions': dict(zip(valid.loc[~drivers, 'name'], places[~drivers])),
+    }
+    capacity = dict(zip(valid.loc[drivers, 'name'], valid.loc[drivers, 'capacity'].astype(int)))
+    return locations, capacity
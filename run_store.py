@@ -0,0 +1,164 @@
+import json
+import math
+import os
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+import cost_matrix
+
+RUN_DIR = os.getenv('CARPOOL_RUN_DIR', 'runs')
+
+#*********************************** Encoding Functions ***************************************
+def paths_table(driver_paths: Dict[str, List[Tuple[float, float]]]) -> pa.Table:
+    """One row per driver with the path as two list<float64> columns (one shared offsets buffer each)."""
+    drivers = list(driver_paths)
+    offsets = [0]
+    lats = []
+    lons = []
+    for driver in drivers:
+        for lat, lon in driver_paths[driver] or []:
+            lats.append(lat)
+            lons.append(lon)
+        offsets.append(len(lats))
+    offsets = pa.array(offsets, type=pa.int32())
+    return pa.table({
+        'driver': pa.array(drivers, type=pa.string()),
+        'lat': pa.ListArray.from_arrays(offsets, pa.array(lats, type=pa.float64())),
+        'lon': pa.ListArray.from_arrays(offsets, pa.array(lons, type=pa.float64())),
+    })
+
+def costs_table(road_distances) -> pa.Table:
+    """The driver-companion cost matrix (or a road-distances dict) as typed columns; unreachable or failed pairs become NaN."""
+    matrix = cost_matrix.ensure(road_distances)
+    distance = matrix['distance_km'].copy()
+    distance[~np.isfinite(distance)] = np.nan
+    return pa.table({
+        'driver': pa.array(matrix['drivers'], type=pa.string()).take(pa.array(matrix['rows'])),
+        'companion': pa.array(matrix['companions'], type=pa.string()).take(pa.array(matrix['indices'])),
+        'distance_km': pa.array(distance, type=pa.float64()),
+        'duration': pa.array(matrix['duration_text'], type=pa.string()),
+        'node_lat': pa.array(matrix['node_lat'], type=pa.float64()),
+        'node_lon': pa.array(matrix['node_lon'], type=pa.float64()),
+    })
+
+def write_table(table: pa.Table, path: str) -> None:
+    with pa.OSFile(path, 'wb') as sink:
+        with ipc.new_file(sink, table.schema, options=ipc.IpcWriteOptions(compression='zstd')) as writer:
+            writer.write_table(table)
+
+def read_table(path: str) -> pa.Table:
+    with pa.memory_map(path, 'r') as source:
+        return ipc.open_file(source).read_all()
+
+#*********************************** Store Functions ***************************************
+def run_path(run_id: str) -> str:
+    return os.path.join(RUN_DIR, run_id)
+
+def new_run_id(created_at: float = None) -> str:
+    """A sortable, unique run id; taken up front when other artifacts (profiles) must share it."""
+    created_at = created_at or time.time()
+    return f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(created_at))}-{uuid.uuid4().hex[:8]}"
+
+def save_run(
+    direction: str,
+    locations: Dict,
+    capacity: Dict[str, int],
+    assignments: Dict[str, List[Tuple[str, Tuple[float, float]]]],
+    driver_paths: Dict[str, List[Tuple[float, float]]],
+    road_distances: Dict[Tuple[str, str], Tuple] = None,
+    companion_lat_lons: Dict[str, Tuple[float, float]] = None,
+    timings: Dict[str, float] = None,
+    run_id: str = None
+) -> str:
+    """Persist one plan with its inputs, cost matrix and timings; returns the run id.
+
+    Paths and costs go to Arrow IPC files, everything else to meta.json.
+    """
+    created_at = time.time()
+    run_id = run_id or new_run_id(created_at)
+    directory = run_path(run_id)
+    os.makedirs(directory, exist_ok=True)
+
+    write_table(paths_table(driver_paths), os.path.join(directory, 'paths.arrow'))
+    write_table(costs_table(road_distances or {}), os.path.join(directory, 'costs.arrow'))
+
+    meta = {
+        'run_id': run_id,
+        'created_at': created_at,
+        'direction': direction,
+        'locations': locations,
+        'capacity': capacity,
+        'assignments': {driver: [[companion, node] for companion, node in pairs] for driver, pairs in assignments.items()},
+        'companion_lat_lons': companion_lat_lons or {},
+        'timings': timings or {},
+    }
+    tmp_path = os.path.join(directory, 'meta.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, default=list)
+    # meta.json is written last, so a run is only listed once all its files exist
+    os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+    return run_id
+
+def load_run(run_id: str) -> Dict:
+    """Load a persisted run back into the shapes the helpers produce."""
+    directory = run_path(run_id)
+    with open(os.path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
+
+    paths = read_table(os.path.join(directory, 'paths.arrow')).to_pydict()
+    driver_paths = {
+        driver: list(zip(lats, lons))
+        for driver, lats, lons in zip(paths['driver'], paths['lat'], paths['lon'])
+    }
+
+    costs = read_table(os.path.join(directory, 'costs.arrow')).to_pydict()
+    road_distances = {}
+    for i, (driver, companion) in enumerate(zip(costs['driver'], costs['companion'])):
+        node = None if math.isnan(costs['node_lat'][i]) else (costs['node_lat'][i], costs['node_lon'][i])
+        distance = costs['distance_km'][i]
+        road_distances[(driver, companion)] = (float('inf') if math.isnan(distance) else distance, costs['duration'][i], node)
+
+    meta['assignments'] = {
+        driver: [(companion, tuple(node) if node else None) for companion, node in pairs]
+        for driver, pairs in meta['assignments'].items()
+    }
+    meta['companion_lat_lons'] = {name: tuple(lat_lon) for name, lat_lon in meta['companion_lat_lons'].items()}
+    meta['driver_paths'] = driver_paths
+    meta['road_distances'] = road_distances
+    return meta
+
+def list_runs(direction: str = None) -> List[Dict]:
+    """Metadata of stored runs, newest first, optionally for one direction."""
+    if not os.path.isdir(RUN_DIR):
+        return []
+    runs = []
+    for run_id in os.listdir(RUN_DIR):
+        meta_path = os.path.join(RUN_DIR, run_id, 'meta.json')
+        if not os.path.exists(meta_path):
+            continue
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if direction is None or meta['direction'] == direction:
+            runs.append({key: meta[key] for key in ('run_id', 'created_at', 'direction', 'timings')})
+    return sorted(runs, key=lambda run: run['created_at'], reverse=True)
+
+def diff_runs(old: Dict, new: Dict) -> Dict[str, Dict]:
+    """Compare two loaded runs: riders added, dropped, or moved between drivers or meeting points."""
+    def seats(run):
+        return {companion: (driver, node) for driver, pairs in run['assignments'].items() for companion, node in pairs}
+
+    before, after = seats(old), seats(new)
+    return {
+        'added': {companion: after[companion] for companion in after.keys() - before.keys()},
+        'dropped': {companion: before[companion] for companion in before.keys() - after.keys()},
+        'changed': {
+            companion: (before[companion], after[companion])
+            for companion in before.keys() & after.keys()
+            if before[companion] != after[companion]
+        },
+    }
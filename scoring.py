@@ -0,0 +1,199 @@
+import json
+import os
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+import constraints as constraints_mod
+import cost_matrix
+import road_graph
+
+OBJECTIVES = ('walk', 'detour', 'wait', 'balance')
+DEFAULT_WEIGHTS = {'walk': 1.0, 'detour': 0.0, 'wait': 0.0, 'balance': 0.0}   # walk only: the plain greedy matcher
+SCALES = {'walk': 1.0, 'detour': 10.0, 'wait': 10.0, 'balance': 1.0}          # one unit of each objective: km, minutes, minutes, seat share
+WEIGHTS = {**DEFAULT_WEIGHTS, **json.loads(os.getenv('CARPOOL_SCORE_WEIGHTS', '{}'))}   # per-deployment defaults
+PARETO_KEYS = ('unassigned', 'walk_km', 'wait_min', 'max_detour_min', 'load_std')   # lower is better for all
+
+#*********************************** Weight Functions ***************************************
+def resolve_weights(weights: Dict[str, float] = None) -> Dict[str, float]:
+    """Deployment weights (CARPOOL_SCORE_WEIGHTS) overridden by the given ones."""
+    merged = {**WEIGHTS, **(weights or {})}
+    unknown = set(merged) - set(OBJECTIVES)
+    if unknown:
+        raise ValueError(f"Unknown objectives {sorted(unknown)}; expected {list(OBJECTIVES)}")
+    return {name: float(merged[name]) for name in OBJECTIVES}
+
+def is_walk_only(weights: Dict[str, float]) -> bool:
+    """Whether the weights reduce to sorting by walking distance, which the plain greedy matcher does faster."""
+    return weights['walk'] > 0 and all(weights[name] == 0 for name in OBJECTIVES if name != 'walk')
+
+#*********************************** Objective Functions ***************************************
+def entry_etas(matrix: Dict, driver_paths: Dict[str, List[Tuple[float, float]]]) -> np.ndarray:
+    """Minutes after departure at which each entry's driver reaches its meeting node (NaN without a node or path)."""
+    etas = np.full(len(matrix['indices']), np.nan)
+    nodes = np.column_stack((matrix['node_lat'], matrix['node_lon']))
+    for row, driver in enumerate(matrix['drivers']):
+        start, end = matrix['indptr'][row], matrix['indptr'][row + 1]
+        path = (driver_paths or {}).get(driver)
+        if start == end or not path:
+            continue
+        points = np.asarray(path, dtype=np.float64)
+        # Meeting nodes are path points, so the nearest point is the node itself
+        offsets = nodes[start:end, None, :] - points[None, :, :]
+        nearest = np.argmin((offsets ** 2).sum(axis=2), axis=1)
+        row_etas = np.asarray(constraints_mod.path_etas(path))[nearest]
+        row_etas[np.isnan(nodes[start:end, 0])] = np.nan
+        etas[start:end] = row_etas
+    return etas
+
+def static_scores(matrix: Dict, weights: Dict[str, float], etas: np.ndarray) -> np.ndarray:
+    """The per-pair part of the weighted cost: walking distance and time until the driver reaches the meeting point."""
+    score = weights['walk'] * matrix['distance_km'] / SCALES['walk']
+    if weights['wait']:
+        score = score + weights['wait'] * np.nan_to_num(etas, nan=0.0) / SCALES['wait']
+    return score
+
+def entry_detours(matrix: Dict) -> np.ndarray:
+    """Minutes each entry's match adds to the trip: the driver's stop plus the rider's leg to or from the meeting point.
+
+    The leg is the matrix's duration_min, or its distance_km at walking pace where no duration was
+    returned; entries with neither (infeasible pairs) are inf.
+    """
+    leg = np.array(matrix['duration_min'], dtype=np.float64)
+    missing = np.isnan(leg)
+    leg[missing] = np.asarray(matrix['distance_km'], dtype=np.float64)[missing] / road_graph.WALKING_KMPH * 60
+    return constraints_mod.STOP_DWELL_MIN + leg
+
+def pair_costs(matrix: Dict, weights: Dict[str, float], driver_paths: Dict[str, List[Tuple[float, float]]] = None) -> np.ndarray:
+    """Weighted cost of seating each entry's pair on its own: walk, wait and the stop's detour."""
+    score = static_scores(matrix, weights, entry_etas(matrix, driver_paths) if weights['wait'] else None)
+    if weights['detour']:
+        score = score + weights['detour'] * entry_detours(matrix) / SCALES['detour']
+    return score
+
+def balance_cost(load, capacity, weights: Dict[str, float]):
+    """Weighted balance cost of a driver carrying load riders: each seat costs the share it brings the car to, as iter_assign scores it."""
+    return weights['balance'] * load * (load + 1) / 2 / np.maximum(capacity, 1) / SCALES['balance']
+
+def objective(road_distances, assignments: Dict[str, List], driver_capacity: Dict[str, int], weights: Dict[str, float] = None, driver_paths: Dict = None) -> float:
+    """The weighted objective of a plan: pair costs of every seated rider plus each driver's balance cost (lower is better)."""
+    costs = cost_matrix.ensure(road_distances)
+    weights = resolve_weights(weights)
+    scores = pair_costs(costs, weights, driver_paths)
+    positions = [cost_matrix.entry(costs, driver, companion) for driver, seats in assignments.items() for companion, _ in seats]
+    total = float(sum(scores[position] for position in positions if position >= 0))
+    return total + float(sum(balance_cost(len(seats), driver_capacity.get(driver, 0), weights) for driver, seats in assignments.items()))
+
+#*********************************** Matching Functions ***************************************
+def iter_assign(
+    road_distances,
+    driver_capacity: Dict[str, int],
+    constraints: Dict = None,
+    weights: Dict[str, float] = None,
+    driver_paths: Dict[str, List[Tuple[float, float]]] = None
+) -> Iterator[Tuple[str, List]]:
+    """Greedy matching on the weighted cost, yielding (driver, seats) once a driver's seats are final.
+
+    Each step scores every open pair at once: walk and wait are fixed per pair, while detour (the
+    driver's detour minutes so far plus this match's, see entry_detours) and balance (the driver's seat
+    share after this stop) grow as drivers fill, which spreads riders across cars. Infeasible pairs are
+    never seated; the detour budget in constraints still counts the driver's stop minutes only.
+    """
+    costs = cost_matrix.ensure(road_distances)
+    weights = resolve_weights(weights)
+    rows, columns = costs['rows'], costs['indices']
+    capacity = np.array([driver_capacity.get(driver, 0) for driver in costs['drivers']], dtype=np.float64)
+    load = np.zeros(len(costs['drivers']))
+    used_detour = np.zeros(len(costs['drivers']))
+    trip_detour = np.zeros(len(costs['drivers']))
+    detours = entry_detours(costs)
+    static = static_scores(costs, weights, entry_etas(costs, driver_paths) if weights['wait'] else None)
+    available = costs['feasible'] & (capacity[rows] > 0)
+    assignments = {driver: [] for driver in driver_capacity}
+
+    finalized = set()
+    def newly_final():
+        remaining = np.bincount(rows[available], minlength=len(costs['drivers']))
+        for row in np.flatnonzero(remaining == 0).tolist():
+            driver = costs['drivers'][row]
+            if driver in assignments and driver not in finalized:
+                finalized.add(driver)
+                yield driver, assignments[driver]
+
+    for driver in driver_capacity:
+        if driver not in costs['driver_index']:
+            finalized.add(driver)
+            yield driver, assignments[driver]
+    yield from newly_final()
+
+    while available.any():
+        score = static.copy()
+        if weights['detour']:
+            score += weights['detour'] * (trip_detour[rows] + detours) / SCALES['detour']
+        if weights['balance']:
+            score += weights['balance'] * (load[rows] + 1) / np.maximum(capacity[rows], 1) / SCALES['balance']
+        score[~available] = np.inf
+        position = int(np.argmin(score))
+        row = rows[position]
+        (driver, companion) = cost_matrix.pair(costs, position)
+        available[position] = False
+        if constraints_mod.fits(constraints, driver, companion, float(costs['distance_km'][position]), used_detour[row]):
+            assignments[driver].append((companion, cost_matrix.node(costs, position)))
+            load[row] += 1
+            used_detour[row] += constraints_mod.STOP_DWELL_MIN
+            trip_detour[row] += detours[position]
+            available[columns == columns[position]] = False
+            if load[row] >= capacity[row]:
+                available[rows == row] = False
+        yield from newly_final()
+
+    for driver in driver_capacity:
+        if driver not in finalized:
+            yield driver, assignments[driver]
+
+#*********************************** Report Functions ***************************************
+def plan_stats(road_distances, assignments: Dict[str, List], driver_capacity: Dict[str, int], driver_paths: Dict = None) -> Dict[str, float]:
+    """Objective totals for a plan, one point to compare weight settings on (all lower is better but seated)."""
+    costs = cost_matrix.ensure(road_distances)
+    etas = entry_etas(costs, driver_paths)
+    positions = [cost_matrix.entry(costs, driver, companion) for driver, seats in assignments.items() for companion, _ in seats]
+    positions = np.array([position for position in positions if position >= 0], dtype=np.int64)
+    walk = costs['distance_km'][positions]
+    wait = etas[positions]
+    detour = np.bincount(costs['rows'][positions], weights=entry_detours(costs)[positions], minlength=len(costs['drivers']))
+    stops = np.array([len(assignments.get(driver, [])) for driver, seats in driver_capacity.items() if seats > 0], dtype=np.float64)
+    shares = stops / np.array([seats for seats in driver_capacity.values() if seats > 0], dtype=np.float64) if len(stops) else stops
+    seated = int(len(positions))
+    return {
+        'seated': seated,
+        'unassigned': len(costs['companions']) - seated,
+        'walk_km': float(walk.sum()),
+        'max_walk_km': float(walk.max()) if seated else 0.0,
+        'wait_min': float(np.nansum(wait)),
+        'max_wait_min': float(np.nanmax(wait)) if seated and not np.all(np.isnan(wait)) else 0.0,
+        'detour_min': float(detour.sum()),
+        'max_detour_min': float(detour.max()) if seated else 0.0,
+        'load_std': float(shares.std()) if len(shares) else 0.0,
+        'load_spread': float(shares.max() - shares.min()) if len(shares) else 0.0,
+    }
+
+def pareto_front(points: List[Dict[str, float]], keys=PARETO_KEYS) -> List[int]:
+    """Indices of the points no other point beats on every key (lower is better)."""
+    values = np.array([[point[key] for key in keys] for point in points], dtype=np.float64).reshape(len(points), len(keys))
+    front = []
+    for i in range(len(points)):
+        dominated = np.all(values <= values[i], axis=1) & np.any(values < values[i], axis=1)
+        if not dominated.any():
+            front.append(i)
+    return front
+
+def sweep(road_distances, driver_capacity: Dict[str, int], weight_sets: List[Dict[str, float]], constraints: Dict = None, driver_paths: Dict = None) -> List[Dict]:
+    """Solve once per weight setting and mark which plans are Pareto-optimal, to pick deployment weights."""
+    costs = cost_matrix.ensure(road_distances)
+    results = []
+    for weights in weight_sets:
+        assignments = dict(iter_assign(costs, driver_capacity, constraints, weights, driver_paths))
+        results.append({'weights': resolve_weights(weights), 'stats': plan_stats(costs, assignments, driver_capacity, driver_paths)})
+    for i in pareto_front([result['stats'] for result in results]):
+        results[i]['pareto'] = True
+    return results
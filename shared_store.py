@@ -0,0 +1,54 @@
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Arrays attached by the current worker process, keyed by store name (see init_worker)
+_attached = {}
+
+#*********************************** Shared Memory Functions ***************************************
+def share_arrays(arrays: Dict[str, np.ndarray]) -> Tuple[Dict[str, Dict], List[shared_memory.SharedMemory]]:
+    """Copy arrays into shared memory once and return a picklable handle plus the owning segments.
+
+    The caller keeps the segments alive for as long as workers may attach and passes them to
+    release() afterwards.
+    """
+    handle = {}
+    segments = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+        handle[name] = {'shm': segment.name, 'shape': array.shape, 'dtype': array.dtype.str}
+        segments.append(segment)
+    return handle, segments
+
+def attach_arrays(handle: Dict[str, Dict]) -> Tuple[Dict[str, np.ndarray], List[shared_memory.SharedMemory]]:
+    """Attach to arrays published by share_arrays as read-only views; nothing is copied."""
+    arrays = {}
+    segments = []
+    for name, spec in handle.items():
+        segment = shared_memory.SharedMemory(name=spec['shm'])
+        array = np.ndarray(spec['shape'], dtype=np.dtype(spec['dtype']), buffer=segment.buf)
+        array.flags.writeable = False
+        arrays[name] = array
+        segments.append(segment)
+    return arrays, segments
+
+def release(segments: List[shared_memory.SharedMemory], unlink: bool = True) -> None:
+    """Close shared segments and, for the owner, free them."""
+    for segment in segments:
+        segment.close()
+        if unlink:
+            segment.unlink()
+
+#*********************************** Worker Functions ***************************************
+def init_worker(stores: Dict[str, Dict[str, Dict]]) -> None:
+    """Process-pool initializer: attach every published store once per worker process."""
+    for store_name, handle in (stores or {}).items():
+        _attached[store_name] = attach_arrays(handle)
+
+def get_shared(store_name: str) -> Dict[str, np.ndarray]:
+    """Arrays of a store attached in this worker, or None when the store was not published."""
+    attached = _attached.get(store_name)
+    return attached[0] if attached else None
@@ -0,0 +1,58 @@
+import asyncio
+import json
+import math
+from typing import AsyncIterator, Callable, Dict, Iterator
+
+import numpy as np
+
+_END = object()
+
+#*********************************** Streaming Functions ***************************************
+async def aiter_events(generator_fn: Callable[..., Iterator[Dict]], *args, **kwargs) -> AsyncIterator[Dict]:
+    """Drive a blocking event generator (helper_stream, plan_stream) in a worker thread and re-yield its events.
+
+    Lets an async service endpoint forward each assignment as soon as the pipeline produces it
+    without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def run():
+        try:
+            for event in generator_fn(*args, **kwargs):
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+        except BaseException as exc:
+            loop.call_soon_threadsafe(queue.put_nowait, exc)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _END)
+
+    worker = loop.run_in_executor(None, run)
+    while True:
+        item = await queue.get()
+        if item is _END:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+    await worker
+
+def jsonable(value):
+    """Make an event JSON-safe: tuples become lists, dicts keyed by tuples become [key, value] pairs,
+    and NaN or infinite floats (unreachable pairs) become null."""
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value):
+            return {key: jsonable(item) for key, item in value.items()}
+        return [[jsonable(key), jsonable(item)] for key, item in value.items()]
+    if isinstance(value, (list, tuple)):
+        return [jsonable(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return jsonable(value.tolist())
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+def event_to_json(event: Dict) -> str:
+    """Serialize one pipeline event as a single JSON line."""
+    return json.dumps(jsonable(event), separators=(',', ':'), allow_nan=False)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import streamlit as st
+
+# The helpers read the API key from st.secrets at import time
+st.secrets = {'api_key': 'test-key'}
+
+import http_client
+from fake_maps import FakeMaps
+
+@pytest.fixture
+def fake_maps(monkeypatch):
+    """Serve every map API call from the deterministic fake backend; yields it to inspect the calls."""
+    backend = FakeMaps()
+    monkeypatch.setattr(http_client, '_fetch', backend)
+    return backend
@@ -0,0 +1,35 @@
+import json
+import sys
+
+import cli
+import run_store
+
+ROSTER = {
+    'locations': {
+        'offices': {'north': '12.98,77.60', 'south': '12.86,77.60'},
+        'drivers': {'A': '12.99,77.62', 'B': '12.97,77.63', 'C': '12.85,77.62', 'D': '12.87,77.63'},
+        'companions': {'c1': '12.991,77.621', 'c2': '12.971,77.631', 'c3': '12.851,77.621', 'c4': '12.871,77.631'},
+    },
+    'capacity': {'A': 1, 'B': 1, 'C': 1, 'D': 1},
+}
+
+def run_cli(monkeypatch, tmp_path, capsys, *flags):
+    roster_path = tmp_path / 'roster.json'
+    roster_path.write_text(json.dumps(ROSTER))
+    monkeypatch.setattr(run_store, 'RUN_DIR', str(tmp_path / 'runs'))
+    monkeypatch.setattr(sys, 'argv', ['cli.py', str(roster_path), '--workers', '2', *flags])
+    cli.main()
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+def test_each_office_is_saved_as_its_own_run(fake_maps, monkeypatch, tmp_path, capsys):
+    events = run_cli(monkeypatch, tmp_path, capsys, '--save-run')
+    done = [event for event in events if event['type'] == 'done']
+    assert sorted(event['office'] for event in done) == ['north', 'south']
+    assert len({event['run_id'] for event in done}) == 2
+
+    for event in done:
+        saved = run_store.load_run(event['run_id'])
+        assert set(saved['locations']['drivers']) == set(event['locations']['drivers'])
+        assert saved['road_distances']
+        assert set(saved['companion_lat_lons']) == set(event['locations']['companions'])
+        assert {'sharding', 'driver_paths'} <= set(saved['timings'])
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import cost_matrix
+import to_home_google_api
+import to_office_google_api
+import trip_eval
+
+PATH = [(12.90 + i * 0.01, 77.60 + i * 0.01) for i in range(6)]
+
+def aerial():
+    return {
+        ('A', 'c1', PATH[0]): [(PATH[2], 0.3), (PATH[3], 0.8)],
+        ('A', 'c2', PATH[0]): [(PATH[4], 0.2)],
+        ('B', 'c1', PATH[0]): [(PATH[1], 0.5), (PATH[2], 0.6), (PATH[3], 0.9)],
+    }
+
+def test_candidates_round_trip_and_entries_start_unscored():
+    costs = cost_matrix.from_candidates(aerial(), ['A', 'B'], ['c1', 'c2'])
+    assert cost_matrix.entry(costs, 'B', 'c2') == -1
+    for (driver, companion, _), nodes in aerial().items():
+        position = cost_matrix.entry(costs, driver, companion)
+        assert cost_matrix.candidates(costs, position) == nodes
+        assert not costs['feasible'][position]
+
+def test_set_entry_stores_a_scored_pair():
+    costs = cost_matrix.from_candidates(aerial())
+    position = cost_matrix.entry(costs, 'A', 'c1')
+    cost_matrix.set_entry(costs, position, 0.4, '5 mins', PATH[2])
+    assert cost_matrix.lookup(costs, 'A', 'c1') == (0.4, '5 mins', PATH[2])
+    assert costs['duration_min'][position] == 5 and costs['feasible'][position]
+    cost_matrix.set_entry(costs, position, float('inf'), None, None)
+    assert not costs['feasible'][position] and np.isnan(costs['node_lat'][position])
+
+def test_meeting_points_are_scored_in_the_matrix(fake_maps):
+    companion_lat_lons = {'c1': (12.925, 77.62), 'c2': (12.94, 77.64)}
+    road_distances = to_home_google_api.find_best_intersection_node(None, companion_lat_lons, aerial())
+    assert set(road_distances) == {('A', 'c1'), ('A', 'c2'), ('B', 'c1')}
+    assert fake_maps.count('walking') == 6   # one walk query per stored candidate
+    assert road_distances[('A', 'c1')][2] in (PATH[2], PATH[3])
+
+@pytest.mark.parametrize('module', [to_home_google_api, to_office_google_api])
+def test_done_event_carries_the_scored_matrix(fake_maps, module):
+    locations = {
+        'office': '12.90,77.60',
+        'drivers': {'A': '12.95,77.62', 'B': '12.97,77.64'},
+        'companions': {'c1': '12.951,77.621', 'c2': '12.971,77.641'},
+    }
+    done = [event for event in module.helper_stream(locations, {'A': 1, 'B': 1}) if event['type'] == 'done'][0]
+    costs = done['cost_matrix']
+    assert 'cand_km' in costs
+    assert dict(cost_matrix.items(costs)) == done['road_distances']
+    for driver, pairs in done['assignments'].items():
+        for companion, node in pairs:
+            assert cost_matrix.node(costs, cost_matrix.entry(costs, driver, companion)) == node
+
+def test_trip_stops_are_sequenced_from_the_matrix():
+    costs = cost_matrix.build({('A', 'c1'): (0.3, '4 mins', PATH[4]), ('A', 'c2'): (0.2, '3 mins', PATH[1])})
+    # Assigned nodes that disagree with the path are ignored in favour of the matrix entries
+    pairs = [('c1', None), ('c2', None)]
+    assert trip_eval.matrix_stops(costs, 'A', PATH, pairs) == [('c2', PATH[1]), ('c1', PATH[4])]
+    # A seat missing from the matrix falls back to path order
+    assert trip_eval.matrix_stops(costs, 'A', PATH, [('c3', PATH[3]), ('c2', PATH[1])]) == [('c2', PATH[1]), ('c3', PATH[3])]
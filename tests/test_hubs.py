@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import constraints as constraints_mod
+import hubs
+
+# A straight driver route north along one meridian, about 1.1 km between points
+PATH = [(12.90 + 0.01 * i, 77.60) for i in range(6)]
+HUB_POINTS = [PATH[2], PATH[4]]
+COMPANION = (PATH[4][0], 77.605)   # about 0.55 km east of the second hub
+
+def hub_index(tmp_path, drive_minutes=None, catchment_min=hubs.WALK_CATCHMENT_MIN):
+    points = np.array(HUB_POINTS)
+    minutes = np.full(len(points), catchment_min, dtype=np.float32)
+    built = {
+        'lat': points[:, 0], 'lon': points[:, 1], 'support': np.array([3, 3], dtype=np.int32),
+        'catchment_min': minutes, 'catchment_km': hubs.catchment_km(minutes),
+        'drive_minutes': hubs.drive_minutes(points) if drive_minutes is None else drive_minutes,
+    }
+    return hubs.load_hubs(hubs.save_hubs(built, str(tmp_path / 'hubs.npz')))
+
+def walk_minutes(minutes):
+    return lambda hub, companion: (0.6, f"{minutes} mins")
+
+def resolve(index, walk, constraints=None, direction='to_home'):
+    return hubs.hub_road_distances(index, {'A': PATH}, {'c1': COMPANION}, {('A', 'c1')}, walk, constraints, direction)
+
+def test_build_precomputes_drive_times_and_walking_catchments(monkeypatch):
+    monkeypatch.delenv('CARPOOL_GRAPH_PATH', raising=False)
+    built = hubs.build_hubs(driver_paths={'A': PATH, 'B': PATH})
+    n = len(built['lat'])
+    assert n > 1
+    assert built['drive_minutes'].shape == (n, n)
+    assert np.allclose(built['drive_minutes'], built['drive_minutes'].T)
+    assert np.all(built['catchment_min'] == hubs.WALK_CATCHMENT_MIN)
+    assert np.allclose(built['catchment_km'], hubs.WALK_CATCHMENT_MIN / 60 * 5.0)
+
+def test_catchment_is_walking_time(tmp_path):
+    index = hub_index(tmp_path)
+    assert resolve(index, walk_minutes(8))[('A', 'c1')][2] == PATH[4]
+    # Close enough aerially, but the walk itself takes longer than the catchment allows
+    assert resolve(index, walk_minutes(20)) == {}
+
+def test_hub_eta_chains_drive_times(tmp_path):
+    drive = np.array([[0.0, 30.0], [30.0, 0.0]], dtype=np.float32)
+    index = hub_index(tmp_path, drive_minutes=drive)
+    etas = constraints_mod.path_etas(PATH)
+    arrival = hubs.hub_etas(index, {0: (2, PATH[2]), 1: (4, PATH[4])}, etas)
+    assert arrival == {0: etas[2], 1: pytest.approx(etas[2] + 30.0)}
+
+def test_time_window_applies_to_hub_pairs(tmp_path):
+    drive = np.array([[0.0, 30.0], [30.0, 0.0]], dtype=np.float32)
+    index = hub_index(tmp_path, drive_minutes=drive)
+    constraints = {'drivers': {'A': {'departure': '08:00'}}, 'riders': {'c1': {'latest': '08:20'}}}
+    # The table puts the second hub 30 minutes past the first, so the driver arrives too late
+    assert resolve(index, walk_minutes(8), constraints) == {}
+    constraints['riders']['c1']['latest'] = '09:00'
+    assert ('A', 'c1') in resolve(index, walk_minutes(8), constraints)
+
+def test_to_office_rider_must_reach_hub_in_time(tmp_path):
+    index = hub_index(tmp_path, drive_minutes=np.zeros((2, 2), dtype=np.float32))
+    driver_minutes = constraints_mod.path_etas(PATH)[2]   # drive table of zeros: the second hub is reached with the first
+    late = driver_minutes + constraints_mod.max_wait_min(constraints_mod.limits_for(None, 'drivers', 'A')) + 1
+    assert resolve(index, walk_minutes(int(late) + 1), direction='to_office') == {}
+    assert ('A', 'c1') in resolve(index, walk_minutes(int(late) + 1), direction='to_home')
+    assert ('A', 'c1') in resolve(index, walk_minutes(1), direction='to_office')
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import cli
+import constraints as constraints_mod
+import optimizer
+import road_graph
+import run_store
+import scoring
+
+NODE = (12.95, 77.6)
+
+def spread_plan():
+    """Two riders a little closer to A than to B; A and B have two seats each."""
+    road_distances = {
+        ('A', 'c1'): (0.5, '6 mins', NODE), ('B', 'c1'): (0.6, '7 mins', NODE),
+        ('A', 'c2'): (0.5, '6 mins', NODE), ('B', 'c2'): (0.6, '7 mins', NODE),
+    }
+    return road_distances, {'A': 2, 'B': 2}
+
+def loads(assignments):
+    return sorted(len(seats) for seats in assignments.values())
+
+def test_walk_only_optimizer_packs_the_closer_driver():
+    road_distances, capacity = spread_plan()
+    greedy = {'A': [('c1', NODE)], 'B': [('c2', NODE)]}
+    improved, metrics = optimizer.improve(road_distances, capacity, greedy, time_budget=0.05)
+    assert improved == {'A': [('c1', NODE), ('c2', NODE)], 'B': []}
+    assert metrics['final_objective'] == pytest.approx(1.0)
+
+def test_weighted_optimizer_keeps_the_balanced_plan():
+    road_distances, capacity = spread_plan()
+    weights = {'walk': 1.0, 'balance': 2.0}
+    greedy = dict(scoring.iter_assign(road_distances, capacity, weights=weights))
+    assert loads(greedy) == [1, 1]
+    improved, metrics = optimizer.improve(road_distances, capacity, greedy, time_budget=0.05, weights=weights)
+    assert loads(improved) == [1, 1]
+    assert metrics['final_objective'] == pytest.approx(scoring.objective(road_distances, improved, capacity, weights))
+
+def test_weighted_optimizer_never_worsens_the_objective():
+    road_distances = {(driver, f'c{i}'): (0.2 + 0.1 * ((i * 7 + ord(driver)) % 5), '5 mins', NODE) for driver in 'ABC' for i in range(9)}
+    capacity = {'A': 4, 'B': 4, 'C': 2}
+    weights = {'walk': 1.0, 'balance': 0.5, 'detour': 0.3}
+    greedy = dict(scoring.iter_assign(road_distances, capacity, weights=weights))
+    improved, metrics = optimizer.improve(road_distances, capacity, greedy, time_budget=0.1, weights=weights)
+    assert scoring.objective(road_distances, improved, capacity, weights) <= scoring.objective(road_distances, greedy, capacity, weights) + 1e-9
+    assert metrics['final_objective'] <= metrics['initial_objective']
+
+def test_cli_weights_survive_optimization(fake_maps, monkeypatch, tmp_path, capsys):
+    # A passes right by both riders and B a few hundred meters off, so a walk-only search packs A
+    roster = {
+        'locations': {
+            'office': '12.90,77.60',
+            'drivers': {'A': '12.96,77.601', 'B': '12.96,77.596'},
+            'companions': {'c1': '12.92,77.601', 'c2': '12.94,77.601'},
+        },
+        'capacity': {'A': 2, 'B': 2},
+    }
+    roster_path = tmp_path / 'roster.json'
+    roster_path.write_text(json.dumps(roster))
+    monkeypatch.setattr(run_store, 'RUN_DIR', str(tmp_path / 'runs'))
+    monkeypatch.setattr('sys.argv', ['cli.py', str(roster_path), '--weights', '{"walk": 1, "balance": 5}', '--optimize', '0.2'])
+    cli.main()
+    done = [json.loads(line) for line in capsys.readouterr().out.splitlines()][-1]
+    assert done['type'] == 'done'
+    assert loads(done['assignments']) == [1, 1]
+    assert done['optimizer']['final_objective'] <= done['optimizer']['initial_objective']
+
+def test_detour_term_reads_matrix_durations():
+    # Equal-ish walks, but the leg from A's meeting point takes four times as long
+    road_distances = {('A', 'c1'): (0.5, '20 mins', NODE), ('B', 'c1'): (0.6, '5 mins', NODE)}
+    capacity = {'A': 1, 'B': 1}
+    greedy = {'A': [('c1', NODE)], 'B': []}
+    assert optimizer.improve(road_distances, capacity, greedy, time_budget=0.05)[0] == greedy
+    improved, _ = optimizer.improve(road_distances, capacity, greedy, time_budget=0.05, weights={'walk': 1.0, 'detour': 1.0})
+    assert improved == {'A': [], 'B': [('c1', NODE)]}
+
+def test_detour_stats_come_from_the_matrix():
+    road_distances = {('A', 'c1'): (0.5, '20 mins', NODE), ('A', 'c2'): (1.0, None, NODE), ('B', 'c3'): (0.4, '4 mins', NODE)}
+    capacity = {'A': 2, 'B': 1}
+    plan = {'A': [('c1', NODE), ('c2', NODE)], 'B': [('c3', NODE)]}
+    stats = scoring.plan_stats(road_distances, plan, capacity)
+    walk_minutes = 1.0 / road_graph.WALKING_KMPH * 60   # no duration returned for c2: its distance at walking pace
+    a_detour = 2 * constraints_mod.STOP_DWELL_MIN + 20 + walk_minutes
+    assert stats['max_detour_min'] == pytest.approx(a_detour)
+    assert stats['detour_min'] == pytest.approx(a_detour + constraints_mod.STOP_DWELL_MIN + 4)
@@ -0,0 +1,47 @@
+import planner
+
+def roster(offices=None):
+    locations = {
+        'office': '12.90,77.60',
+        'drivers': {'A': '12.95,77.62', 'B': '12.97,77.64', 'C': '12.99,77.66'},
+        'companions': {'c1': '12.951,77.621', 'c2': '12.971,77.641', 'c3': '12.972,77.642', 'c4': '12.973,77.643'},
+    }
+    if offices:
+        locations['offices'] = offices
+    return locations
+
+def seats_used(assignments):
+    return {driver: len(pairs) for driver, pairs in assignments.items()}
+
+def test_to_office_respects_capacity(fake_maps):
+    capacity = {'A': 1, 'B': 1, 'C': 0}
+    results = planner.plan(roster(), capacity, direction='to_office', max_workers=1)
+    _, assignments, _ = results['office']
+    assert all(seats_used(assignments)[driver] <= seats for driver, seats in capacity.items())
+    assert sum(seats_used(assignments).values()) == 2
+
+def test_to_office_shard_skips_full_drivers(fake_maps):
+    locations = roster()
+    del locations['drivers']['C']
+    assignments, _, _, _ = planner.solve_shard('to_office', locations, {'A': 1, 'B': 1})
+    assert seats_used(assignments) == {'A': 1, 'B': 1}
+
+def test_to_home_respects_capacity_across_clusters(fake_maps):
+    capacity = {'A': 1, 'B': 1, 'C': 1}
+    results = planner.plan(roster(), capacity, direction='to_home', clusters_per_office=2, max_workers=2)
+    _, assignments, _ = results['office']
+    assert all(seats_used(assignments)[driver] <= seats for driver, seats in capacity.items())
+    seated = [companion for pairs in assignments.values() for companion, _ in pairs]
+    assert len(seated) == len(set(seated))
+
+def test_reconcile_fills_only_spare_seats():
+    office_plan = {'assignments': {'A': [('c1', (1.0, 1.0))]}, 'driver_paths': {}, 'assigned': {'c1'}, 'road_distances': {}, 'timings': {}}
+    shard = {'locations': {'drivers': {'A': 'a'}, 'companions': {'c1': 'x', 'c2': 'y', 'c3': 'z'}}, 'capacity': {'A': 2}, 'lat_lons': {}}
+    solved = ({'A': [('c2', (2.0, 2.0)), ('c3', (3.0, 3.0))]}, {}, {}, {})
+    original = planner.solve_shard
+    planner.solve_shard = lambda *args, **kwargs: solved
+    try:
+        planner.reconcile('to_office', office_plan, 'office', [shard])
+    finally:
+        planner.solve_shard = original
+    assert [companion for companion, _ in office_plan['assignments']['A']] == ['c1', 'c2']
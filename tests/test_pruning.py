@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+
+import pruning
+
+KM_LAT = 1 / pruning.KM_PER_DEG_LAT   # degrees of latitude per km
+
+def bent_route():
+    # 10 km north from the office, then 20 km east, one point per km
+    office = (12.9, 77.6)
+    km_lon = 1 / (pruning.KM_PER_DEG_LON * 0.9744)   # degrees of longitude per km near 12.9N
+    north = [(office[0] + i * KM_LAT, office[1]) for i in range(11)]
+    east = [(north[-1][0], office[1] + i * km_lon) for i in range(1, 21)]
+    return north + east, km_lon
+
+def test_bent_route_keeps_companions_on_both_legs():
+    path, km_lon = bent_route()
+    companions = {
+        'on_route_north': (path[5][0], path[5][1] + 0.05 * km_lon),
+        'on_route_far_east': (path[-1][0] + 0.05 * KM_LAT, path[-1][1]),
+        'off_route': (path[0][0], path[0][1] + 15 * km_lon),
+    }
+    pairs = pruning.prune_driver_companion_pairs({'driver': path}, companions)
+    assert pairs == {('driver', 'on_route_north'), ('driver', 'on_route_far_east')}
+
+def test_reversed_route_gives_same_pairs():
+    path, km_lon = bent_route()
+    companions = {'on_route_north': (path[5][0], path[5][1] + 0.05 * km_lon)}
+    assert pruning.prune_driver_companion_pairs({'driver': path[::-1]}, companions) == {('driver', 'on_route_north')}
+
+def brute_force_pairs(driver_paths, companions, buffer_km=pruning.CORRIDOR_BUFFER_KM):
+    """Reference: every companion against every segment, one at a time."""
+    points = list(companions.values()) + [path[0] for path in driver_paths.values()]
+    ref_lat = sum(lat for lat, _ in points) / len(points)
+    pairs = set()
+    for driver, path in driver_paths.items():
+        path_xy = pruning.project(np.array(path), ref_lat).tolist()
+        for name, lat_lon in companions.items():
+            p = pruning.project(np.array([lat_lon]), ref_lat)[0].tolist()
+            for a, b in zip(path_xy, path_xy[1:] or path_xy):
+                dx, dy = b[0] - a[0], b[1] - a[1]
+                length_sq = dx * dx + dy * dy
+                t = 0.0 if length_sq == 0 else max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length_sq))
+                if math.hypot(p[0] - a[0] - t * dx, p[1] - a[1] - t * dy) <= buffer_km:
+                    pairs.add((driver, name))
+                    break
+    return pairs
+
+def random_roster(seed, drivers=40, companions=200):
+    rng = np.random.default_rng(seed)
+    office = np.array([12.95, 77.60])
+    paths = {}
+    for d in range(drivers):
+        turn = office + rng.uniform(-0.1, 0.1, 2)
+        end = turn + rng.uniform(-0.1, 0.1, 2)
+        points = np.vstack([np.linspace(office, turn, 15), np.linspace(turn, end, 15)[1:]])
+        paths[f'd{d}'] = [tuple(p) for p in points.tolist()]
+    paths['parked'] = [(12.95, 77.60)]                       # a one-point path
+    paths['stuttering'] = [(12.95, 77.60)] * 3 + [(12.96, 77.61)]   # zero-length segments
+    return paths, {f'c{i}': tuple((office + rng.uniform(-0.2, 0.2, 2)).tolist()) for i in range(companions)}
+
+def test_vectorized_corridor_matches_brute_force():
+    paths, companions = random_roster(7)
+    pairs = pruning.prune_driver_companion_pairs(paths, companions)
+    assert pairs == brute_force_pairs(paths, companions)
+    assert 0 < len(pairs) < len(paths) * len(companions)
+
+def test_corridor_chunks_give_same_pairs(monkeypatch):
+    paths, companions = random_roster(11)
+    expected = pruning.prune_driver_companion_pairs(paths, companions)
+    monkeypatch.setattr(pruning, 'CORRIDOR_CHUNK', 64)
+    assert pruning.prune_driver_companion_pairs(paths, companions) == expected
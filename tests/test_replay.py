@@ -0,0 +1,47 @@
+import pytest
+import requests
+
+import http_client
+import planner
+import replay
+
+LOCATIONS = {
+    'offices': {'north': '12.98,77.60', 'south': '12.86,77.60'},
+    'drivers': {'A': '12.99,77.62', 'B': '12.97,77.63', 'C': '12.85,77.62', 'D': '12.87,77.63'},
+    'companions': {'c1': '12.991,77.621', 'c2': '12.971,77.631', 'c3': '12.851,77.621', 'c4': '12.871,77.631'},
+}
+CAPACITY = {'A': 1, 'B': 1, 'C': 1, 'D': 1}
+
+def plans(**kwargs):
+    return {office: assignments for office, (_, assignments, _) in planner.plan(LOCATIONS, CAPACITY, max_workers=2, **kwargs).items()}
+
+def offline(url, params=None, timeout=None):
+    raise requests.exceptions.ConnectionError("network disabled in replay test")
+
+@pytest.mark.parametrize('direction', ['to_home', 'to_office'])
+def test_planner_round_trip(fake_maps, monkeypatch, tmp_path, direction):
+    archive = str(tmp_path / 'session.jsonl.gz')
+    with replay.recording(archive):
+        recorded = plans(direction=direction, clusters_per_office=2)
+    calls = len(fake_maps.calls)
+    assert calls > 0
+
+    monkeypatch.setattr(http_client, '_fetch', offline)
+    with replay.replaying(archive, latency='zero'):
+        replayed = plans(direction=direction, clusters_per_office=2)
+    assert replayed == recorded
+    assert replay.mode() == 'live'
+
+def test_missing_response_raises(monkeypatch, tmp_path):
+    archive = str(tmp_path / 'empty.jsonl.gz')
+    replay.write_archive([], archive)
+    with replay.replaying(archive, latency='zero'):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            http_client.get_json('https://maps.googleapis.com/maps/api/geocode/json', {'address': 'x', 'key': 'k'})
+
+def test_archive_excludes_api_key(fake_maps, tmp_path):
+    archive = str(tmp_path / 'key.jsonl.gz')
+    with replay.recording(archive):
+        http_client.get_json('https://maps.googleapis.com/maps/api/geocode/json', {'address': 'x', 'key': 'secret-key'})
+    entries = [entry for group in replay.read_archive(archive).values() for entry in group]
+    assert entries and all('secret-key' not in str(entry) for entry in entries)
@@ -0,0 +1,59 @@
+import networkx as nx
+import numpy as np
+
+import path_fetch
+import road_graph
+import to_home_google_api
+
+SPACING_DEG = 0.01   # grid step, about 1.1 km
+
+def grid(size=4):
+    """A size x size grid of two-way streets; the bottom row is a slow road."""
+    graph = nx.MultiDiGraph()
+    for row in range(size):
+        for col in range(size):
+            graph.add_node(row * size + col, y=12.9 + row * SPACING_DEG, x=77.6 + col * SPACING_DEG)
+    for row in range(size):
+        for col in range(size):
+            node = row * size + col
+            for neighbour in ([node + 1] if col + 1 < size else []) + ([node + size] if row + 1 < size else []):
+                seconds = 600.0 if row == 0 and neighbour == node + 1 else 60.0
+                graph.add_edge(node, neighbour, length=1100.0, travel_time=seconds)
+                graph.add_edge(neighbour, node, length=1100.0, travel_time=seconds)
+    return graph
+
+def compiled(tmp_path, monkeypatch):
+    path = str(tmp_path / 'grid.bin')
+    road_graph.compile_graph(grid(), path)
+    monkeypatch.setenv('CARPOOL_GRAPH_PATH', path)
+    return path
+
+def test_artifact_round_trip(tmp_path):
+    arrays = road_graph.graph_to_csr(grid())
+    loaded = road_graph.load_graph(road_graph.compile_graph(arrays, str(tmp_path / 'grid.bin')))
+    for name, _ in road_graph.SECTIONS:
+        assert np.array_equal(np.asarray(loaded[name]), arrays[name].astype(loaded[name].dtype))
+
+def test_routes_take_the_fastest_roads(tmp_path, monkeypatch):
+    compiled(tmp_path, monkeypatch)
+    path, km, minutes = road_graph.route(road_graph.get_graph(), (12.9, 77.6), (12.9, 77.63))
+    # The bottom row is slow, so the fastest route climbs a row, crosses and comes back down
+    assert len(path) == 6 and km == 5 * 1.1 and minutes == 5.0
+    path, km, minutes = road_graph.route(road_graph.get_graph(), (12.9, 77.6), (12.9, 77.63), mode='walking')
+    assert len(path) == 4 and abs(km - 3.3) < 1e-6 and abs(minutes - 3.3 / road_graph.WALKING_KMPH * 60) < 1e-6
+
+def test_helpers_route_over_the_graph(fake_maps, tmp_path, monkeypatch):
+    compiled(tmp_path, monkeypatch)
+    labels, store, distances = path_fetch.fetch_paths({'A': ('12.9,77.6', '12.92,77.62')}, 'key')
+    assert distances == {'A': 4.4}
+    assert path_fetch.path_lists(labels, store)['A'][-1] == (12.92, 77.62)
+
+    km, duration = to_home_google_api.get_directions_companion('key', (12.9, 77.6), (12.91, 77.6))
+    assert (km, duration) == (1.1, '13 mins')
+    assert fake_maps.calls == []
+
+def test_directions_api_without_artifact(fake_maps, monkeypatch):
+    monkeypatch.delenv('CARPOOL_GRAPH_PATH', raising=False)
+    assert not road_graph.available()
+    to_home_google_api.get_directions_companion('key', (12.9, 77.6), (12.91, 77.6))
+    assert fake_maps.count('walking') == 1
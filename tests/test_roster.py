@@ -0,0 +1,46 @@
+import pandas as pd
+
+import planner
+import plotFrom
+import roster
+import to_home_google_api
+
+OFFICE = 'Office Park'
+
+def ingested():
+    table = pd.DataFrame({
+        'name': ['A', 'B', 'c1', 'c2', 'c3'],
+        'role': ['driver', 'driver', 'companion', 'companion', 'companion'],
+        'address': ['Home A', 'Home B', 'Flat 1', 'Flat 2', 'Flat 2'],
+        'capacity': ['2', '2', None, None, None],
+    })
+    return roster.ingest(table, max_workers=2)
+
+def test_lat_lons_come_from_the_table(fake_maps):
+    table = ingested()
+    lat_lons = roster.lat_lons(table)
+    assert set(lat_lons) == {'A', 'B', 'c1', 'c2', 'c3'}
+    row = table.set_index('name').loc['c1']
+    assert lat_lons['c1'] == (row['lat'], row['lon'])
+    assert roster.lat_lons(table, key='address')['Flat 2'] == lat_lons['c2']
+
+def test_solve_and_plot_reuse_roster_coordinates(fake_maps):
+    table = ingested()
+    locations, capacity = roster.to_locations(table, OFFICE)
+    lat_lons = roster.lat_lons(table)
+    geocoded = fake_maps.count('geocode')
+
+    events = list(to_home_google_api.helper_stream(locations, capacity, companion_lat_lons=lat_lons))
+    done = events[-1]
+    assert fake_maps.count('geocode') == geocoded
+    assert done['companion_lat_lons'] == {name: lat_lons[name] for name in locations['companions']}
+
+    plotFrom.plot(done['locations'], done['assignments'], done['driver_paths'], mode='vector', companion_lat_lons=done['companion_lat_lons'])
+    assert fake_maps.count('geocode') == geocoded + 1   # the office only
+
+def test_planner_skips_known_participants(fake_maps):
+    table = ingested()
+    locations, capacity = roster.to_locations(table, OFFICE)
+    geocoded = fake_maps.count('geocode')
+    planner.plan(locations, capacity, clusters_per_office=2, max_workers=1, lat_lons=roster.lat_lons(table))
+    assert fake_maps.count('geocode') == geocoded + 1   # the office, for clustering
@@ -0,0 +1,43 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+import path_fetch
+import shared_store
+
+def packed_paths():
+    arrays = {'A': np.array([[12.9, 77.6], [12.91, 77.61]]), 'B': np.array([[12.95, 77.62], [12.96, 77.63], [12.97, 77.64]])}
+    return path_fetch.pack(['A', 'B'], arrays)
+
+def worker_path(row):
+    paths = shared_store.get_shared('paths')
+    start, end = paths['offsets'][row], paths['offsets'][row + 1]
+    return paths['coords'][start:end].tolist()
+
+def test_attached_arrays_match_and_are_read_only():
+    paths = packed_paths()
+    handle, segments = shared_store.share_arrays(paths)
+    try:
+        attached, views = shared_store.attach_arrays(handle)
+        for name, array in paths.items():
+            assert np.array_equal(attached[name], array) and attached[name].dtype == array.dtype
+        with pytest.raises(ValueError):
+            attached['coords'][0, 0] = 0.0
+        del attached
+        shared_store.release(views, unlink=False)
+    finally:
+        shared_store.release(segments)
+    with pytest.raises(FileNotFoundError):
+        shared_store.attach_arrays(handle)
+
+def test_workers_read_the_published_store():
+    paths = packed_paths()
+    handle, segments = shared_store.share_arrays(paths)
+    try:
+        with ProcessPoolExecutor(max_workers=2, initializer=shared_store.init_worker, initargs=({'paths': handle},)) as executor:
+            rows = list(executor.map(worker_path, [0, 1]))
+    finally:
+        shared_store.release(segments)
+    assert rows == [paths['coords'][:2].tolist(), paths['coords'][2:].tolist()]
+    assert shared_store.get_shared('paths') is None   # nothing is attached in the parent
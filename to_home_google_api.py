@@ -1,8 +1,20 @@
 import streamlit as st
 import math
-from typing import Dict, List, Tuple,Union
+import time
+from typing import Dict, List, Set, Tuple,Union
 import requests
-import polyline
+import numpy as np
+
+import constraints as constraints_mod
+import cost_matrix
+import optimizer
+import path_fetch
+import polyline_codec
+import http_client
+import hubs as hubs_mod
+import pruning
+import road_graph
+import scoring
 
 from dotenv import load_dotenv
 import os
@@ -19,13 +31,11 @@ def get_directions(origin, destination, api_key):
         'destination': destination,
         'key': api_key
     }
-    response = requests.get(url, params=params)
-    # return response.json()
-    directions = response.json()
+    directions = http_client.get_json(url, params)
     legs = directions['routes'][0]['legs'][0]
     distance = legs['distance']['text']
     polyline_str = directions['routes'][0]['overview_polyline']['points']
-    decoded_points = polyline.decode(polyline_str)
+    decoded_points = polyline_codec.to_points(polyline_codec.decode(polyline_str))
     return decoded_points, float(distance.split()[0])
 
 def get_lat_lon(address, api_key):
@@ -35,8 +45,7 @@ def get_lat_lon(address, api_key):
             'address': address,
             'key': api_key
         }
-        response = requests.get(url, params=params)
-        return response.json()
+        return http_client.get_json(url, params)
 
     result = geocode_address(address, api_key)
 
@@ -46,6 +55,14 @@ def get_lat_lon(address, api_key):
     return lat_lon
 
 def get_directions_companion(api_key, origin, destination, mode='walking'):
+    if road_graph.available():
+        # Route over the local road graph (see road_graph) in the same (km, duration text) shape
+        try:
+            _, km, minutes = road_graph.directions(origin, destination, api_key, mode)
+        except ValueError:
+            return 'ZERO_RESULTS', None
+        return round(km, 1), road_graph.duration_text(minutes)
+
     url = f"https://maps.googleapis.com/maps/api/directions/json"
 
     params = {
@@ -54,10 +71,12 @@ def get_directions_companion(api_key, origin, destination, mode='walking'):
         'mode': mode,
         'key': api_key
     }
-    response = requests.get(url, params=params)
+    try:
+        data = http_client.get_json(url, params)
+    except requests.exceptions.HTTPError:
+        data = None
 
-    if response.status_code == 200:
-        data = response.json()
+    if data is not None:
         # return data
         # Check if any routes were found
         if data['status'] == 'OK':
@@ -81,10 +100,12 @@ def get_eta_waypoints(origin, destination, way_points, api_key):
         'key': api_key,
         'waypoints' : waypoints_str
     }
-    response = requests.get(url, params=params)
+    try:
+        data = http_client.get_json(url, params)
+    except requests.exceptions.HTTPError as exc:
+        data, error = None, exc
     # return response['legs']['duration']['text']
-    if response.status_code == 200:
-        data = response.json()
+    if data is not None:
         
         if data['status'] == 'OK':
             # Extract duration for each leg
@@ -98,7 +119,7 @@ def get_eta_waypoints(origin, destination, way_points, api_key):
             print(f"Error in response: {data['status']}")
             return None, None
     else:
-        print(f"Request failed with status code: {response.status_code}")
+        print(f"Request failed: {error}")
         return None, None
 
 #***********************************Helper Functions************************************************************
@@ -118,39 +139,33 @@ def deg2rad(deg: float) -> float:
 def find_best_paths(locations) -> Dict[str, List[Tuple[Tuple[float, float], float]]]:
     """Compute the shortest paths from drivers to the office based on travel time."""
     office_location = locations['office']
-    
-    paths = {}
-    
-    for label, place in locations['drivers'].items():
-        path = get_directions(office_location, place, api_key)
-        paths[label] = path
-        # if label.startswith('driver'):
-        #     try:
-                
-        #     except nx.NetworkXNoPath:
-        #         paths[label] = []  # No path found
-    
-    return paths
+    routes = {label: (office_location, place) for label, place in locations['drivers'].items()}
+    # Requests run concurrently and decode in batches as they land (see path_fetch)
+    labels, store, distances = path_fetch.fetch_paths(routes, api_key)
+    paths = path_fetch.path_lists(labels, store)
+    return {label: (paths[label], distances[label]) for label in labels}
 
 '''while going to office, our algo will only consider one companion, im considering companion_lat_lons will only contain one companion'''
 def calculate_driver_companion_distances(        
     # driver_paths: List[Tuple[Tuple[float, float], float]],  #path is like a dictionary
     driver_paths: Dict[str, List[Tuple[Tuple[float, float], float]]],
-    companion_lat_lons: Dict[str, Tuple[float, float]]
+    companion_lat_lons: Dict[str, Tuple[float, float]],
+    candidate_pairs: Set[Tuple[str, str]] = None
 ) -> Dict[Tuple[str, str, Tuple[float, float]], List[Tuple[Tuple[float, float], float]]]:
-    """Calculate the top 5 closest nodes for each driver-companion pair based on aerial distance."""
+    """Calculate 5 candidate nodes for each driver-companion pair: the aerially closest path point and
+    points at fixed distances up and down the route from it (see pruning.route_candidates)."""
     aerial_distances = {}
     
     for driver_label, (path, _ ) in driver_paths.items():
         if not path:
             continue
+        cumulative = pruning.cumulative_km(path)
+        points = np.asarray(path, dtype=np.float64)
         for companion_name, companion_lat_lon in companion_lat_lons.items():
-            distances = []
-            for lat_lon in path:
-                distance = calculate_aerial_distance(companion_lat_lon[0], companion_lat_lon[1], lat_lon[0], lat_lon[1])
-                distances.append((lat_lon, distance))
-            
-            top_5_nodes = sorted(distances, key=lambda x: x[1])[:5]
+            if candidate_pairs is not None and (driver_label, companion_name) not in candidate_pairs:
+                continue
+            distances = pruning.haversine_km(companion_lat_lon, points)
+            top_5_nodes = pruning.route_candidates(path, cumulative, distances)
             aerial_distances[(driver_label, companion_name, companion_lat_lon)] = top_5_nodes
     
     return aerial_distances
@@ -161,57 +176,48 @@ def find_best_intersection_node(      #doesn't need driver_paths
     aerial_distances: Dict[Tuple[str, str, Tuple[float, float]], List[Tuple[Tuple[float, float], float]]]
 ) -> Dict[Tuple[str, str], Tuple[float, float, int]]:
     """Find the best intersection node among the top 5 nodes for each driver-companion pair."""
-    road_distances = {}
-    
-    for (driver_label, companion_name, companion_lat_lon), top_5_nodes in aerial_distances.items():
+    costs = cost_matrix.from_candidates(aerial_distances)
+    score_meeting_points(costs, companion_lat_lons)
+    return cost_matrix.to_road_distances(costs)
+
+def score_meeting_points(costs: Dict, companion_lat_lons: Dict[str, Tuple[float, float]], positions=None) -> None:
+    """Walk-query each entry's candidate nodes (cost_matrix.candidates) and store the shortest in the matrix."""
+    for position in (range(len(costs['indices'])) if positions is None else positions):
+        http_client.check_cancelled()   # a cancelled job stops here rather than after every pair
+        _, companion_name = cost_matrix.pair(costs, position)
         shortest_road_distance = float('inf')
-        shortest_road_time = float('inf')
+        shortest_road_time = None
         best_intersection_lat_lon = None
-        
-        for lat_lon, _ in top_5_nodes:
-           
-            road_distance_from_intersection, travel_time_from_intersection = get_directions_companion(api_key, lat_lon, companion_lat_lon)
 
-            if (road_distance_from_intersection < shortest_road_distance):
+        for lat_lon, _ in cost_matrix.candidates(costs, position):
+            road_distance_from_intersection, travel_time_from_intersection = get_directions_companion(api_key, lat_lon, companion_lat_lons[companion_name])
+
+            if isinstance(road_distance_from_intersection, (int, float)) and road_distance_from_intersection < shortest_road_distance:
                 shortest_road_distance = road_distance_from_intersection
                 shortest_road_time = travel_time_from_intersection
                 best_intersection_lat_lon = lat_lon
-        
-        road_distances[(driver_label, companion_name)] = (shortest_road_distance, shortest_road_time, best_intersection_lat_lon) # here i need to handle for multiple companions
 
-    return road_distances
+        cost_matrix.set_entry(costs, position, shortest_road_distance, shortest_road_time, best_intersection_lat_lon)
 
 def get_neighboring_lat_lons(road_distances, driver_paths):
+    """Meeting node of each pair plus the path points 250 m and 500 m up and down the route from it."""
     neighboring_lat_lons = {}
+    cumulative = {}
     for (driver, companion), (short_dist, short_time, intersection) in road_distances.items():
         path = driver_paths[driver][0]
-        distance = driver_paths[driver][1]
-   
-        avg_adj_lat_lon_dist = distance / len(path)
-        no_nodes = int(0.5 // avg_adj_lat_lon_dist)
-        lat_lon_idx = 0
-
-        for i in range(len(driver_paths[driver][0])):
-            if i == intersection:
-                lat_lon_idx = i
-                break
-  
-        neighboring_lat_lon_list = [intersection]
-        
-        if lat_lon_idx - (2 * no_nodes) >= 0:
-            neighboring_lat_lon_list.append(driver_paths[driver][0][lat_lon_idx - (2 * no_nodes)])
-        if lat_lon_idx - no_nodes >= 0:
-            neighboring_lat_lon_list.append(driver_paths[driver][0][lat_lon_idx - no_nodes])
-        if lat_lon_idx + (2 * no_nodes) < len(driver_paths[driver][0]):
-            neighboring_lat_lon_list.append(driver_paths[driver][0][lat_lon_idx + (2 * no_nodes)])
-        if lat_lon_idx + no_nodes < len(driver_paths[driver][0]):
-            neighboring_lat_lon_list.append(driver_paths[driver][0][lat_lon_idx + no_nodes])
+        if intersection is None or intersection not in path:
+            continue
+        if driver not in cumulative:
+            cumulative[driver] = pruning.cumulative_km(path)
 
-        neighboring_lat_lons[(driver, companion)] = neighboring_lat_lon_list
+        lat_lon_idx = path.index(intersection)
+        neighboring_lat_lons[(driver, companion)] = [intersection] + [
+            path[i] for i in pruning.along_route_indices(cumulative[driver], lat_lon_idx)
+        ]
 
     return neighboring_lat_lons
 
-def assign_driver_companion(road_distances, driver_capacity): # matching algo
+def assign_driver_companion(road_distances, driver_capacity, constraints=None, weights=None, driver_paths=None): # matching algo
     # all_distances_list = []
     # for (driver, companion), neighboring_nodes in neighboring_lat_lons.items():
     #     # times_driver = get_eta_waypoints(drivers[driver], office, neighboring_nodes, api_key) # i dont need times in this case ig
@@ -233,16 +239,52 @@ def assign_driver_companion(road_distances, driver_capacity): # matching algo
     #             final_out = i
     
     # return final_out
-    sorted_distances = sorted(road_distances.items(), key=lambda road_distances: road_distances[1][0])
     assignments = {driver : [] for driver in driver_capacity.keys()} # hardcoded driver capacity
+    for driver, seats in iter_assign_driver_companion(road_distances, driver_capacity, constraints, weights, driver_paths):
+        assignments[driver] = seats
+
+    return assignments
+
+def iter_assign_driver_companion(road_distances, driver_capacity, constraints=None, weights=None, driver_paths=None):
+    """Greedy matching that yields (driver, seats) as soon as a driver's seats can no longer change.
+
+    With constraints, a pair is skipped when its walk exceeds the rider's max_walk_km or one more stop
+    would push the driver past max_detour_min (see constraints.fits). road_distances may be a
+    road-distances dict or a cost_matrix. Weights other than walk only (see scoring.py, deployment
+    defaults from CARPOOL_SCORE_WEIGHTS) switch to the multi-objective matcher; driver_paths
+    ({label: path}) then supplies the wait objective.
+    """
+    if not scoring.is_walk_only(scoring.resolve_weights(weights)):
+        yield from scoring.iter_assign(road_distances, driver_capacity, constraints, weights, driver_paths)
+        return
+    costs = cost_matrix.ensure(road_distances)
+    assignments = {driver : [] for driver in driver_capacity.keys()}
     companion_assigned = set()
 
-    for (driver, companion), (_, _, node) in sorted_distances:
-        if len(assignments[driver]) < driver_capacity[driver] and companion not in companion_assigned:
+    # A driver is final once full or once none of its remaining candidate pairs are left to visit
+    pending = {driver : 0 for driver in driver_capacity.keys()}
+    for driver, count in zip(costs['drivers'], np.diff(costs['indptr'])):
+        pending[driver] += int(count)
+    finalized = set()
+    used_detour = {driver : 0.0 for driver in driver_capacity.keys()}
+    for driver in driver_capacity.keys():
+        if pending[driver] == 0 or driver_capacity[driver] <= 0:
+            finalized.add(driver)
+            yield driver, assignments[driver]
+
+    for position in cost_matrix.by_distance(costs):
+        (driver, companion), distance, node = cost_matrix.pair(costs, position), costs['distance_km'][position], cost_matrix.node(costs, position)
+        pending[driver] -= 1
+        if driver in finalized:
+            continue
+        if (len(assignments[driver]) < driver_capacity[driver] and companion not in companion_assigned
+                and constraints_mod.fits(constraints, driver, companion, distance, used_detour[driver])):
             assignments[driver].append((companion, node))
             companion_assigned.add(companion)
-
-    return assignments
+            used_detour[driver] += constraints_mod.STOP_DWELL_MIN
+        if len(assignments[driver]) >= driver_capacity[driver] or pending[driver] == 0:
+            finalized.add(driver)
+            yield driver, assignments[driver]
 
 
 
@@ -251,7 +293,27 @@ def assign_driver_companion(road_distances, driver_capacity): # matching algo
 
 #*******************************Main****************************************
 
-def helper(locations: Dict[str, Union[str, Dict[str, str]]],capacity):
+def helper(locations: Dict[str, Union[str, Dict[str, str]]],capacity, constraints=None, optimize_seconds=0.0, hub_index=None, weights=None, companion_lat_lons=None, driver_paths=None):
+    for event in helper_stream(locations, capacity, constraints, optimize_seconds, hub_index, weights, companion_lat_lons, driver_paths):
+        if event['type'] == 'done':
+            return (event['locations'], event['assignments'], event['driver_paths'])
+
+def helper_stream(locations: Dict[str, Union[str, Dict[str, str]]], capacity, constraints=None, optimize_seconds=0.0, hub_index=None, weights=None, companion_lat_lons=None, driver_paths=None):
+    """Run the pipeline as a generator of events.
+
+    Yields {'type': 'stage', 'stage': ...} as each stage finishes, {'type': 'assignment', 'driver', 'companions', 'path'}
+    as soon as a driver's seats are final, and one closing {'type': 'done', ...} event carrying the same
+    (locations, assignments, driver_paths) that helper returns.
+
+    constraints is an optional constraints model (time windows, walk and detour limits, see constraints.py).
+    With optimize_seconds > 0 the greedy plan is then improved by optimizer.improve for that long; drivers
+    whose seats change are emitted again (treat assignment events as upserts) and the done event carries
+    the optimizer metrics. hub_index (hubs.load_hubs) resolves pairs whose driver passes a hub in the
+    companion's walking catchment with one shared walking query per (companion, hub). weights are the
+    matcher's objective weights (walk, detour, wait, balance; see scoring.py) and the done event
+    carries the plan's objective totals under 'scoring'. companion_lat_lons and driver_paths (as
+    find_best_paths returns them) skip geocoding and route requests when the caller already has them.
+    """
     # locations: Dict[str, Union[str, Dict[str, str]]],capacity
 #     locations = {                #in google maps, im assuming all the locations are in string format
 #     "office": 'Brigade Tech Gardens, Bangalore',
@@ -266,8 +328,22 @@ def helper(locations: Dict[str, Union[str, Dict[str, str]]],capacity):
 #         "Companion 3": 'Singayyanapalya Metro Station, Bangalore'
 #     },
 # }
-    companion_lat_lons = {name : get_lat_lon(companion_place, api_key) for name, companion_place in locations["companions"].items()}
-    driver_paths = find_best_paths(locations)
+    timings = {}
+    started = time.perf_counter()
+    # Known coordinates (e.g. from an ingested roster) are reused; only the rest are geocoded
+    known = companion_lat_lons or {}
+    companion_lat_lons = {
+        name: known[name] if name in known else get_lat_lon(companion_place, api_key)
+        for name, companion_place in locations["companions"].items()
+    }
+    timings['geocoding'] = time.perf_counter() - started
+    yield {'type': 'stage', 'stage': 'geocoding', 'seconds': timings['geocoding']}
+    started = time.perf_counter()
+    if driver_paths is None:
+        driver_paths = find_best_paths(locations)
+    timings['driver_paths'] = time.perf_counter() - started
+    yield {'type': 'stage', 'stage': 'driver_paths', 'seconds': timings['driver_paths']}
+    started = time.perf_counter()
     # print(driver_paths)
     # return
     # capacity = {
@@ -276,15 +352,67 @@ def helper(locations: Dict[str, Union[str, Dict[str, str]]],capacity):
     # }
 
 
-    aerial_distances = calculate_driver_companion_distances(driver_paths, companion_lat_lons)
-    road_distances = find_best_intersection_node(driver_paths, companion_lat_lons, aerial_distances)
+    candidate_pairs = pruning.prune_driver_companion_pairs(
+        {label: path for label, (path, _) in driver_paths.items()}, companion_lat_lons
+    )
+    aerial_distances = calculate_driver_companion_distances(driver_paths, companion_lat_lons, candidate_pairs)
+    # Walk limits and time windows are checked on precomputed values before any per-pair API call
+    aerial_distances = constraints_mod.filter_candidates(
+        aerial_distances, {label: path for label, (path, _) in driver_paths.items()}, constraints
+    )
+    # One cost matrix, indexed here, feeds meeting points, assignment, optimization, sequencing, persistence and plotting
+    costs = cost_matrix.from_candidates(aerial_distances, list(capacity), list(companion_lat_lons))
+    timings['candidate_nodes'] = time.perf_counter() - started
+    yield {'type': 'stage', 'stage': 'candidate_nodes', 'seconds': timings['candidate_nodes']}
+    started = time.perf_counter()
+    pending = range(len(costs['indices']))
+    if hub_index is not None and len(hub_index['lat']):
+        resolved = hubs_mod.hub_road_distances(
+            hub_index, {label: path for label, (path, _) in driver_paths.items()}, companion_lat_lons,
+            {cost_matrix.pair(costs, position) for position in pending},
+            lambda hub, companion_lat_lon: get_directions_companion(api_key, hub, companion_lat_lon), constraints
+        )
+        for (driver, companion), scored in resolved.items():
+            cost_matrix.set_entry(costs, cost_matrix.entry(costs, driver, companion), *scored)
+        pending = [position for position in pending if cost_matrix.pair(costs, position) not in resolved]
+    score_meeting_points(costs, companion_lat_lons, pending)
+    road_distances = cost_matrix.to_road_distances(costs)
+    timings['meeting_points'] = time.perf_counter() - started
+    yield {'type': 'stage', 'stage': 'meeting_points', 'seconds': timings['meeting_points']}
+    started = time.perf_counter()
     # print(road_distances)
-    print(capacity)
     # neighboring_lat_lons = get_neighboring_lat_lons(road_distances, driver_paths)
-    assignments = assign_driver_companion(road_distances, capacity)
     driver_pth={}
     for key, (path,dist) in driver_paths.items():
         driver_pth[key]=path
-    print(driver_pth)
-    return (locations, assignments,driver_pth)
 
+    assignments = {driver : [] for driver in capacity.keys()}
+    for driver, seats in iter_assign_driver_companion(costs, capacity, constraints, weights, driver_pth):
+        assignments[driver] = seats
+        yield {'type': 'assignment', 'driver': driver, 'companions': seats, 'path': driver_pth.get(driver, [])}
+    timings['assignment'] = time.perf_counter() - started
+    optimizer_metrics = None
+    if optimize_seconds > 0:
+        started = time.perf_counter()
+        improved, optimizer_metrics = optimizer.improve(costs, capacity, assignments, optimize_seconds, constraints, weights=weights, driver_paths=driver_pth)
+        for driver, seats in improved.items():
+            if seats != assignments.get(driver):
+                yield {'type': 'assignment', 'driver': driver, 'companions': seats, 'path': driver_pth.get(driver, [])}
+        assignments = improved
+        timings['optimization'] = time.perf_counter() - started
+        yield {'type': 'stage', 'stage': 'optimization', 'seconds': timings['optimization']}
+    yield {
+        'type': 'done',
+        'locations': locations,
+        'assignments': assignments,
+        'driver_paths': driver_pth,
+        'companion_lat_lons': companion_lat_lons,
+        'road_distances': road_distances,
+        'cost_matrix': costs,
+        'timings': timings,
+        'optimizer': optimizer_metrics,
+        'scoring': {
+            'weights': scoring.resolve_weights(weights),
+            'stats': scoring.plan_stats(costs, assignments, capacity, driver_pth),
+        },
+    }
@@ -1,9 +1,19 @@
 #This can handle only one companion
 import streamlit as st
 import math
-from typing import Dict, List, Tuple,Union
+import time
+from typing import Dict, List, Set, Tuple,Union
 import requests
-import polyline
+import numpy as np
+
+import constraints as constraints_mod
+import cost_matrix
+import http_client
+import hubs as hubs_mod
+import path_fetch
+import polyline_codec
+import pruning
+import road_graph
 
 from dotenv import load_dotenv
 import os
@@ -20,12 +30,10 @@ def get_directions(origin, destination, api_key):
         'destination': destination,
         'key': api_key
     }
-    response = requests.get(url, params=params)
-    # return response.json()
-    directions = response.json()
+    directions = http_client.get_json(url, params)
     # print(directions)
     polyline_str = directions['routes'][0]['overview_polyline']['points']
-    decoded_points = polyline.decode(polyline_str)
+    decoded_points = polyline_codec.to_points(polyline_codec.decode(polyline_str))
     return decoded_points
 
 def get_lat_lon(address, api_key):
@@ -35,8 +43,7 @@ def get_lat_lon(address, api_key):
             'address': address,
             'key': api_key
         }
-        response = requests.get(url, params=params)
-        return response.json()
+        return http_client.get_json(url, params)
 
     result = geocode_address(address, api_key)
 
@@ -46,6 +53,14 @@ def get_lat_lon(address, api_key):
     return lat_lon
 
 def get_directions_companion(api_key, origin, destination, mode='walking'):
+    if road_graph.available():
+        # Route over the local road graph (see road_graph) in the same (km, duration text) shape
+        try:
+            _, km, minutes = road_graph.directions(origin, destination, api_key, mode)
+        except ValueError:
+            return 'ZERO_RESULTS', None
+        return round(km, 1), road_graph.duration_text(minutes)
+
     url = f"https://maps.googleapis.com/maps/api/directions/json"
 
     params = {
@@ -54,10 +69,12 @@ def get_directions_companion(api_key, origin, destination, mode='walking'):
         'mode': mode,
         'key': api_key
     }
-    response = requests.get(url, params=params)
+    try:
+        data = http_client.get_json(url, params)
+    except requests.exceptions.HTTPError:
+        data = None
 
-    if response.status_code == 200:
-        data = response.json()
+    if data is not None:
         # return data
         # Check if any routes were found
         if data['status'] == 'OK':
@@ -89,38 +106,31 @@ def deg2rad(deg: float) -> float:
 def find_best_paths(locations) -> Dict[str, List[Tuple[float, float]]]:
     """Compute the shortest paths from drivers to the office based on travel time."""
     office_location = locations['office']
-    
-    paths = {}
-    
-    for label, place in locations['drivers'].items():
-
-        # if label.startswith('driver'):
-        # print(place)
-        # print(office_location)
-        path = get_directions(place, office_location, api_key)
-        paths[label] = path
-    
-
-    return paths
+    routes = {label: (place, office_location) for label, place in locations['drivers'].items()}
+    # Requests run concurrently and decode in batches as they land (see path_fetch)
+    labels, store, _ = path_fetch.fetch_paths(routes, api_key)
+    return path_fetch.path_lists(labels, store)
 
 
 def calculate_driver_companion_distances(
     driver_paths: Dict[str, List[Tuple[float, float]]],
-    companion_lat_lons: Dict[str, Tuple[float, float]]
+    companion_lat_lons: Dict[str, Tuple[float, float]],
+    candidate_pairs: Set[Tuple[str, str]] = None
 ) -> Dict[Tuple[str, str, Tuple[float, float]], List[Tuple[Tuple[float, float], float]]]:
-    """Calculate the top 5 closest nodes for each driver-companion pair based on aerial distance."""
+    """Calculate 5 candidate nodes for each driver-companion pair: the aerially closest path point and
+    points at fixed distances up and down the route from it (see pruning.route_candidates)."""
     aerial_distances = {}
     
     for driver_label, path in driver_paths.items():
         if not path:
             continue
+        cumulative = pruning.cumulative_km(path)
+        points = np.asarray(path, dtype=np.float64)
         for companion_name, companion_lat_lon in companion_lat_lons.items():
-            distances = []
-            for lat_lon in path:
-                distance = calculate_aerial_distance(companion_lat_lon[0], companion_lat_lon[1], lat_lon[0], lat_lon[1])
-                distances.append((lat_lon, distance))
-            
-            top_5_nodes = sorted(distances, key=lambda x: x[1])[:5]
+            if candidate_pairs is not None and (driver_label, companion_name) not in candidate_pairs:
+                continue
+            distances = pruning.haversine_km(companion_lat_lon, points)
+            top_5_nodes = pruning.route_candidates(path, cumulative, distances)
             aerial_distances[(driver_label, companion_name, companion_lat_lon)] = top_5_nodes
     
     return aerial_distances
@@ -128,33 +138,62 @@ def calculate_driver_companion_distances(
 def find_best_intersection_node(
     driver_paths: Dict[str, List[Tuple[float, float]]],
     companion_lat_lons: Dict[str, Tuple[float, float]],
-    aerial_distances: Dict[Tuple[str, str, Tuple[float, float]], List[Tuple[Tuple[float, float], float]]]
+    aerial_distances: Dict[Tuple[str, str, Tuple[float, float]], List[Tuple[Tuple[float, float], float]]],
+    constraints: Dict = None
 ) -> Dict[Tuple[str, str], Tuple[float, float, int]]:
-    """Find the best intersection node among the top 5 nodes for each driver-companion pair."""
-    road_distances = {}
-    buffer_time = 5
-    
-    for (driver_label, companion_name, companion_lat_lon), top_5_nodes in aerial_distances.items():
+    """Find the best intersection node among the top 5 nodes for each driver-companion pair (see score_meeting_points)."""
+    costs = cost_matrix.from_candidates(aerial_distances)
+    score_meeting_points(costs, driver_paths, companion_lat_lons, constraints)
+    return cost_matrix.to_road_distances(costs)
+
+def score_meeting_points(
+    costs: Dict,
+    driver_paths: Dict[str, List[Tuple[float, float]]],
+    companion_lat_lons: Dict[str, Tuple[float, float]],
+    constraints: Dict = None,
+    positions=None
+) -> None:
+    """Query each entry's candidate nodes (cost_matrix.candidates) and store the best reachable one in the matrix.
+
+    The companion must reach the node no later than the driver plus the wait the driver allows
+    (max_detour_min minus the stop itself). The driver's arrival comes from the precomputed path
+    ETAs, and nodes the companion cannot reach in time even at MAX_ACCESS_KMPH are skipped unqueried.
+    """
+    driver_etas = {}
+
+    for position in (range(len(costs['indices'])) if positions is None else positions):
+        http_client.check_cancelled()   # a cancelled job stops here rather than after every pair
+        driver_label, companion_name = cost_matrix.pair(costs, position)
+        companion_lat_lon = companion_lat_lons[companion_name]
         shortest_road_distance = float('inf')
-        shortest_road_time = float('inf')
+        shortest_road_time = None
         best_intersection_lat_lon = None
+        if driver_label not in driver_etas:
+            path = driver_paths[driver_label]
+            driver_etas[driver_label] = dict(zip(path, constraints_mod.path_etas(path)))
+        driver = constraints_mod.limits_for(constraints, 'drivers', driver_label)
+        rider = constraints_mod.limits_for(constraints, 'riders', companion_name)
+        max_wait = constraints_mod.max_wait_min(driver)
 
         
-        for lat_lon, _ in top_5_nodes:
-           
+        for lat_lon, aerial_distance in cost_matrix.candidates(costs, position):
+            driver_minutes = driver_etas[driver_label][lat_lon]
+            if aerial_distance / constraints_mod.MAX_ACCESS_KMPH * 60 > driver_minutes + max_wait:
+                continue
 
             road_distance_companion_intersection, travel_time_companion_intersection = get_directions_companion(api_key, companion_lat_lon, lat_lon,mode="driving")
-            road_distance_driver_intersection, travel_time_driver_intersection = get_directions_companion(api_key,driver_paths[driver_label][0], lat_lon,mode="driving")
-            # print(travel_time_companion_intersection)
+            companion_minutes = constraints_mod.parse_duration_minutes(travel_time_companion_intersection)
+            if companion_minutes is None or not isinstance(road_distance_companion_intersection, (int, float)):
+                continue
+            if rider['max_walk_km'] is not None and road_distance_companion_intersection > rider['max_walk_km']:
+                continue
 
-            if (road_distance_companion_intersection < shortest_road_distance and int(travel_time_companion_intersection.split()[0]) <= int(travel_time_driver_intersection.split()[0]) + buffer_time):
+            if (road_distance_companion_intersection < shortest_road_distance and companion_minutes <= driver_minutes + max_wait):
                 shortest_road_distance = road_distance_companion_intersection
                 shortest_road_time = travel_time_companion_intersection
                 best_intersection_lat_lon = lat_lon
         
-        road_distances[(driver_label, companion_name)] = (shortest_road_distance, shortest_road_time, best_intersection_lat_lon)
-    
-    return road_distances
+        cost_matrix.set_entry(costs, position, shortest_road_distance, shortest_road_time, best_intersection_lat_lon)
 
 #*********************************** Helper Functions ***************************************
 
@@ -162,32 +201,82 @@ def find_best_intersection_node(
 
 #************************* Constants ******************************************************
 
-def helper( locations: Dict[str, Union[str, Dict[str, str]]])-> Tuple[Dict[str, Tuple[float, float]], Dict[str, Tuple[int, int]]]:
-
-    companion_lat_lons = {name : get_lat_lon(companion_place, api_key) for name, companion_place in locations["companions"].items()}
+def helper( locations: Dict[str, Union[str, Dict[str, str]]], constraints=None, companion_lat_lons=None, driver_paths=None, hub_index=None)-> Tuple[Dict[str, Tuple[float, float]], Dict[str, Tuple[int, int]]]:
+    for event in helper_stream(locations, constraints, companion_lat_lons, driver_paths, hub_index):
+        if event['type'] == 'done':
+            return (event['locations'], event['assignments'], event['driver_paths'])
+
+def helper_stream(locations: Dict[str, Union[str, Dict[str, str]]], constraints=None, companion_lat_lons=None, driver_paths=None, hub_index=None):
+    """Run the pipeline as a generator of stage, assignment and closing 'done' events (see to_home_google_api.helper_stream).
+
+    companion_lat_lons and driver_paths skip geocoding and route requests when the caller already has them.
+    hub_index (hubs.load_hubs) resolves pairs whose driver passes a hub the companion can walk to in time.
+    """
+
+    timings = {}
+    started = time.perf_counter()
+    # Known coordinates (e.g. from an ingested roster) are reused; only the rest are geocoded
+    known = companion_lat_lons or {}
+    companion_lat_lons = {
+        name: known[name] if name in known else get_lat_lon(companion_place, api_key)
+        for name, companion_place in locations["companions"].items()
+    }
+    timings['geocoding'] = time.perf_counter() - started
+    yield {'type': 'stage', 'stage': 'geocoding', 'seconds': timings['geocoding']}
+    started = time.perf_counter()
     
-    driver_paths = find_best_paths(locations)
-    aerial_distances = calculate_driver_companion_distances(driver_paths, companion_lat_lons)
-    driver_companion_distances = find_best_intersection_node(driver_paths, companion_lat_lons, aerial_distances)
+    if driver_paths is None:
+        driver_paths = find_best_paths(locations)
+    timings['driver_paths'] = time.perf_counter() - started
+    yield {'type': 'stage', 'stage': 'driver_paths', 'seconds': timings['driver_paths']}
+    started = time.perf_counter()
+    candidate_pairs = pruning.prune_driver_companion_pairs(driver_paths, companion_lat_lons)
+    aerial_distances = calculate_driver_companion_distances(driver_paths, companion_lat_lons, candidate_pairs)
+    aerial_distances = constraints_mod.filter_candidates(aerial_distances, driver_paths, constraints)
+    # One cost matrix, indexed here, feeds meeting points, the pairing and persistence
+    costs = cost_matrix.from_candidates(aerial_distances, list(locations['drivers']), list(companion_lat_lons))
+    timings['candidate_nodes'] = time.perf_counter() - started
+    yield {'type': 'stage', 'stage': 'candidate_nodes', 'seconds': timings['candidate_nodes']}
+    started = time.perf_counter()
+    pending = range(len(costs['indices']))
+    if hub_index is not None and len(hub_index['lat']):
+        resolved = hubs_mod.hub_road_distances(
+            hub_index, driver_paths, companion_lat_lons, {cost_matrix.pair(costs, position) for position in pending},
+            lambda hub, companion_lat_lon: get_directions_companion(api_key, companion_lat_lon, hub), constraints, 'to_office'
+        )
+        for (driver, companion), scored in resolved.items():
+            cost_matrix.set_entry(costs, cost_matrix.entry(costs, driver, companion), *scored)
+        pending = [position for position in pending if cost_matrix.pair(costs, position) not in resolved]
+    score_meeting_points(costs, driver_paths, companion_lat_lons, constraints, pending)
+    driver_companion_distances = cost_matrix.to_road_distances(costs)
+    timings['meeting_points'] = time.perf_counter() - started
+    yield {'type': 'stage', 'stage': 'meeting_points', 'seconds': timings['meeting_points']}
+    started = time.perf_counter()
 
     
-    # Find the best driver-companion pairing
+    # Find the best driver-companion pairing: the feasible entry with the shortest trip to its meeting point
     best_driver = None
-    best_distance = float('inf')
     best_intersection_node = None
-    companions_name = None
-
-    
-    for (driver_label, companion_name), (distance, time, intersection) in driver_companion_distances.items():
-        if distance < best_distance:
-            best_distance = distance
-            best_driver = driver_label
-            best_intersection_node = intersection
-            companion_name = companion_name
-            
-    print(driver_paths)
-            
-    return (locations, {best_driver: [(companion_name, best_intersection_node)]},driver_paths)
+    feasible = np.flatnonzero(costs['feasible'])
+    if len(feasible):
+        best = feasible[np.argmin(costs['distance_km'][feasible])]
+        best_driver, companion_name = cost_matrix.pair(costs, best)
+        best_intersection_node = cost_matrix.node(costs, best)
+
+    assignments = {best_driver: [(companion_name, best_intersection_node)]} if best_driver is not None else {}
+    timings['assignment'] = time.perf_counter() - started
+    if best_driver is not None:
+        yield {'type': 'assignment', 'driver': best_driver, 'companions': assignments[best_driver], 'path': driver_paths[best_driver]}
+    yield {
+        'type': 'done',
+        'locations': locations,
+        'assignments': assignments,
+        'driver_paths': driver_paths,
+        'companion_lat_lons': companion_lat_lons,
+        'road_distances': driver_companion_distances,
+        'cost_matrix': costs,
+        'timings': timings,
+    }
 
 
 
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import requests
+
+import constraints as constraints_mod
+import cost_matrix
+import http_client
+import scoring
+import to_home_google_api
+
+TRIP_WORKERS = 8        # drivers evaluated concurrently
+CACHE_ITEMS = 1024      # stop sequences remembered, so an unchanged trip is never requested twice
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+
+#*********************************** Trip Functions ***************************************
+def ordered_stops(path: List[Tuple[float, float]], pairs: List[Tuple[str, Tuple[float, float]]]) -> List[Tuple[str, Tuple[float, float]]]:
+    """A driver's (companion, meeting point) stops in the order the driver passes them along the path."""
+    position = {lat_lon: i for i, lat_lon in enumerate(path or [])}
+    return sorted((pair for pair in pairs if pair[1] is not None), key=lambda pair: position.get(pair[1], len(position)))
+
+def matrix_stops(costs: Dict, driver: str, path: List[Tuple[float, float]], pairs: List[Tuple[str, Tuple[float, float]]]) -> List[Tuple[str, Tuple[float, float]]]:
+    """ordered_stops from the solve's cost matrix: meeting nodes read from the driver's entries, ordered by the driver's ETA there.
+
+    Falls back to ordered_stops when a seat has no matrix entry.
+    """
+    positions = [cost_matrix.entry(costs, driver, companion) for companion, _ in pairs]
+    if not path or any(position < 0 for position in positions):
+        return ordered_stops(path, pairs)
+    etas = scoring.entry_etas(costs, {driver: path})
+    stops = [(companion, cost_matrix.node(costs, position), etas[position]) for (companion, _), position in zip(pairs, positions)]
+    return [(companion, node) for companion, node, _ in sorted((stop for stop in stops if stop[1] is not None), key=lambda stop: stop[2])]
+
+def evaluate_trip(origin: str, destination: str, stops: List[Tuple[float, float]]) -> Dict:
+    """Per-leg and total minutes for one trip from a single waypoint request, cached by stop sequence."""
+    key = (origin, destination, tuple(stops))
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    try:
+        durations = to_home_google_api.get_eta_waypoints(origin, destination, stops, to_home_google_api.api_key)
+    except requests.exceptions.RequestException as exc:
+        # Timeouts and dropped connections leave this driver out rather than failing the finished solve
+        print(f"Trip request failed: {exc}")
+        return None
+    if not isinstance(durations, list):
+        return None
+    legs = [constraints_mod.parse_duration_minutes(text) for text in durations]
+    trip = {'legs_min': legs, 'leg_text': durations, 'total_min': sum(minutes or 0.0 for minutes in legs)}
+    with _lock:
+        _cache[key] = trip
+        while len(_cache) > CACHE_ITEMS:
+            _cache.popitem(last=False)
+    return trip
+
+def evaluate_trips(
+    direction: str,
+    locations: Dict,
+    assignments: Dict[str, List[Tuple[str, Tuple[float, float]]]],
+    driver_paths: Dict[str, List[Tuple[float, float]]],
+    max_workers: int = TRIP_WORKERS,
+    costs: Dict = None
+) -> Dict[str, Dict]:
+    """True trip times for every driver with companions: one waypoint request per driver, run concurrently.
+
+    to_home trips run office -> stops -> driver's home, to_office trips driver's home -> stops -> office.
+    With the solve's cost matrix, stops are sequenced from it (see matrix_stops).
+    Returns driver -> {'stops': [companion, ...], 'legs_min', 'leg_text', 'total_min'}; drivers whose
+    request failed are left out.
+    """
+    trip_requests = {}
+    for driver, pairs in assignments.items():
+        if not pairs or driver not in locations['drivers']:
+            continue
+        stops = matrix_stops(costs, driver, driver_paths.get(driver), pairs) if costs is not None else ordered_stops(driver_paths.get(driver), pairs)
+        if direction == 'to_home':
+            origin, destination = locations['office'], locations['drivers'][driver]
+        else:
+            origin, destination = locations['drivers'][driver], locations['office']
+        trip_requests[driver] = (origin, destination, stops)
+
+    trips = {}
+    if not trip_requests:
+        return trips
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(trip_requests))) as executor:
+        futures = {
+            driver: http_client.submit(executor, evaluate_trip, origin, destination, [node for _, node in stops])
+            for driver, (origin, destination, stops) in trip_requests.items()
+        }
+        for driver, future in futures.items():
+            trip = future.result()
+            if trip is not None:
+                trips[driver] = {'stops': [companion for companion, _ in trip_requests[driver][2]], **trip}
+    return trips
+
+def with_trip_times(direction: str, events):
+    """Pass a helper_stream's events through, adding a 'trip_times' stage and done['trip_times']."""
+    for event in events:
+        if event['type'] == 'done':
+            started = time.perf_counter()
+            event['trip_times'] = evaluate_trips(direction, event['locations'], event['assignments'], event['driver_paths'], costs=event.get('cost_matrix'))
+            event.setdefault('timings', {})['trip_times'] = time.perf_counter() - started
+            yield {'type': 'stage', 'stage': 'trip_times', 'seconds': event['timings']['trip_times']}
+        yield event
@@ -0,0 +1,132 @@
+import time
+from typing import Dict, Union
+
+import cost_matrix
+import pruning
+import run_store
+import to_home_google_api
+
+api_key = to_home_google_api.api_key
+
+#*********************************** Warm Start Functions ***************************************
+def latest_run(direction: str = 'to_home') -> Dict:
+    """The most recent stored run for a direction, or None."""
+    runs = run_store.list_runs(direction)
+    return run_store.load_run(runs[0]['run_id']) if runs else None
+
+def unchanged(today: Dict[str, str], yesterday: Dict[str, str]):
+    """Participants present in both rosters with the same address."""
+    return {name for name, place in today.items() if yesterday.get(name) == place}
+
+def plan_warm_stream(locations: Dict[str, Union[str, Dict[str, str]]], capacity: Dict[str, int], previous: Dict = None):
+    """Warm-started to_home_google_api.helper_stream: reuse yesterday's paths, geocodes, costs and seats.
+
+    Only changed or new participants are geocoded, routed and scored; kept seats are revalidated
+    against today's roster and capacity, and the remaining riders are matched greedily against the
+    spare seats using the cached cost matrix. Falls back to a cold start without a usable previous run.
+    """
+    previous = previous if previous is not None else latest_run('to_home')
+    if previous is None or previous['locations'].get('office') != locations['office']:
+        yield from to_home_google_api.helper_stream(locations, capacity)
+        return
+
+    timings = {}
+    started = time.perf_counter()
+    old_locations = previous['locations']
+    same_drivers = unchanged(locations['drivers'], old_locations['drivers'])
+    same_drivers &= set(previous['driver_paths'])
+    same_companions = unchanged(locations['companions'], old_locations['companions'])
+    same_companions &= set(previous['companion_lat_lons'])
+
+    companion_lat_lons = {
+        name: previous['companion_lat_lons'][name] if name in same_companions else to_home_google_api.get_lat_lon(place, api_key)
+        for name, place in locations['companions'].items()
+    }
+    timings['geocoding'] = time.perf_counter() - started
+    yield {'type': 'stage', 'stage': 'geocoding', 'seconds': timings['geocoding']}
+    started = time.perf_counter()
+
+    changed = {label: place for label, place in locations['drivers'].items() if label not in same_drivers}
+    fetched = to_home_google_api.find_best_paths({'office': locations['office'], 'drivers': changed})
+    driver_paths = {
+        label: fetched[label] if label in fetched else (previous['driver_paths'][label], None)
+        for label in locations['drivers']
+    }
+    timings['driver_paths'] = time.perf_counter() - started
+    yield {'type': 'stage', 'stage': 'driver_paths', 'seconds': timings['driver_paths']}
+    started = time.perf_counter()
+
+    # Pairs between two unchanged participants keep yesterday's verdict: their cost if they had one,
+    # pruned otherwise. Only pairs touching a changed participant are pruned and scored again.
+    candidate_pairs = pruning.prune_driver_companion_pairs(
+        {label: path for label, (path, _) in driver_paths.items()}, companion_lat_lons
+    )
+    fresh_pairs = {
+        (driver, companion) for driver, companion in candidate_pairs
+        if driver not in same_drivers or companion not in same_companions
+    }
+    aerial_distances = to_home_google_api.calculate_driver_companion_distances(driver_paths, companion_lat_lons, fresh_pairs)
+    timings['candidate_nodes'] = time.perf_counter() - started
+    yield {'type': 'stage', 'stage': 'candidate_nodes', 'seconds': timings['candidate_nodes']}
+    started = time.perf_counter()
+
+    road_distances = {
+        pair: cost for pair, cost in previous['road_distances'].items()
+        if pair[0] in same_drivers and pair[1] in same_companions
+    }
+    road_distances.update(to_home_google_api.find_best_intersection_node(driver_paths, companion_lat_lons, aerial_distances))
+    timings['meeting_points'] = time.perf_counter() - started
+    yield {'type': 'stage', 'stage': 'meeting_points', 'seconds': timings['meeting_points']}
+    started = time.perf_counter()
+
+    # Keep yesterday's seats that are still valid: both people unchanged, a meeting point, and room in today's car
+    assignments = {driver: [] for driver in capacity}
+    seated = set()
+    for driver, pairs in previous['assignments'].items():
+        if driver not in same_drivers or driver not in assignments:
+            continue
+        for companion, node in pairs:
+            cost = road_distances.get((driver, companion))
+            if companion in same_companions and cost and cost[2] is not None and len(assignments[driver]) < capacity[driver]:
+                assignments[driver].append((companion, node))
+                seated.add(companion)
+
+    spare = {driver: capacity[driver] - len(pairs) for driver, pairs in assignments.items()}
+    residual_distances = {
+        (driver, companion): cost for (driver, companion), cost in road_distances.items()
+        if companion not in seated and spare.get(driver, 0) > 0
+    }
+    residual = to_home_google_api.assign_driver_companion(
+        residual_distances, {driver: seats for driver, seats in spare.items() if seats > 0},
+        driver_paths={label: path for label, (path, _) in driver_paths.items()}
+    )
+    for driver, pairs in residual.items():
+        assignments[driver].extend(pairs)
+    timings['assignment'] = time.perf_counter() - started
+
+    driver_pth = {label: path for label, (path, _) in driver_paths.items()}
+    for driver, pairs in assignments.items():
+        yield {'type': 'assignment', 'driver': driver, 'companions': pairs, 'path': driver_pth.get(driver, [])}
+    yield {
+        'type': 'done',
+        'locations': locations,
+        'assignments': assignments,
+        'driver_paths': driver_pth,
+        'companion_lat_lons': companion_lat_lons,
+        'road_distances': road_distances,
+        'cost_matrix': cost_matrix.build(road_distances, list(capacity), list(companion_lat_lons)),
+        'timings': timings,
+        'warm_start': {
+            'previous_run': previous['run_id'],
+            'reused_drivers': len(same_drivers & set(locations['drivers'])),
+            'reused_companions': len(same_companions),
+            'kept_seats': len(seated),
+            'rescored_pairs': len(aerial_distances),
+        },
+    }
+
+def plan_warm(locations: Dict[str, Union[str, Dict[str, str]]], capacity: Dict[str, int], previous: Dict = None):
+    """Same return value as to_home_google_api.helper, warm-started from the previous run."""
+    for event in plan_warm_stream(locations, capacity, previous):
+        if event['type'] == 'done':
+            return (event['locations'], event['assignments'], event['driver_paths'])